@@ -1,130 +1,201 @@
 # app/api/routes.py
 from fastapi import APIRouter, HTTPException
-from ..models import BuildRequest, RecommendRequest, RecommendResponse, RecommendItem
-from ..recommender import preprocessing, content, collaborative, demographic, hybrid, persistence
-from ..config import ARTIFACTS_DIR, DATA_DIR
-import pandas as pd
+from fastapi.responses import PlainTextResponse
+from ..models import (BuildRequest, RecommendRequest, RecommendResponse, RecommendItem, BatchRecommendRequest,
+                      BatchRecommendResponse, SimilarItem, SimilarResponse)
+from ..recommender import neighbours, persistence, serving
+from ..recommender.snapshot import Snapshot
+from ..jobs import BuildJobs, JobLimitError
+from ..cache import ResponseCache, canonical_request
+from .. import metrics
+from ..config import (BUILD_MAX_CONCURRENT, RECOMMEND_BATCH_MAX, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, STARTUP_VERIFY,
+                      STARTUP_WARMUP)
+import threading
+import time
 import numpy as np
-from pathlib import Path
 
 router = APIRouter()
-_cache = {}
-
-@router.post("/build")
-def build_artifacts(req: BuildRequest):
-    
-    # Load & split
-    products, reviews = preprocessing.load_and_prepare()
-
-    persistence.save(products, "products_meta.pkl")
-    persistence.save(reviews, "reviews.pkl")
-
-    # product genome (content vectors)
-    prod_vecs, tfidf, svd, ohe, scaler, prod_index = content.build_product_genome(products.reset_index(), reviews.reset_index(), force=req.force)
+_jobs = BuildJobs(max_concurrent=BUILD_MAX_CONCURRENT)
+_responses = ResponseCache(max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+_snapshot = None
+_snapshot_lock = threading.RLock()   # held by every swap; re-entered when current_snapshot() swaps
+_startup = {'done': False, 'error': None}
+
+def _swap_snapshot(generation=None):
+    global _snapshot
+    with _snapshot_lock:
+        try:
+            with metrics.stage('artifacts', 'load'):
+                snap = Snapshot.load(generation)
+            snap.validate()
+        except Exception:
+            metrics.count('recsys_errors_total', scope='artifact_load')
+            raise
+        metrics.count('recsys_artifact_loads_total')
+        _snapshot = snap  # single reference assignment: readers see the old or the new snapshot, never a mix
+    return snap
+
+def current_snapshot() -> Snapshot:
+    """Current serving snapshot; picks up a generation written by another worker (arrays are mmapped)."""
+    snap = _snapshot
+    current = persistence.current_generation()
+    if current is None:
+        raise FileNotFoundError("no artifact generation")
+    if snap is None or snap.generation != current:
+        with _snapshot_lock:
+            # re-read under the lock: a build may have swapped in a newer generation meanwhile
+            snap, current = _snapshot, persistence.current_generation()
+            if snap is None or snap.generation != current:
+                snap = _swap_snapshot(current)
+    return snap
+
+def startup():
+    """
+    Before serving: load and validate the current generation (checksums too with STARTUP_VERIFY), then run one
+    warm-up query. Without a generation (or with a broken one) the app still starts, not ready until a build lands.
+    """
+    try:
+        gen = persistence.current_generation()
+        if gen is not None:
+            if STARTUP_VERIFY:
+                with metrics.stage('startup', 'verify'):
+                    persistence.verify_generation(gen)
+            snap = current_snapshot()
+            metrics.milestone('artifacts')
+            if STARTUP_WARMUP:
+                with metrics.stage('startup', 'warmup'):
+                    serving.warm_up(snap)
+                metrics.milestone('warm')
+    except Exception as e:
+        metrics.count('recsys_errors_total', scope='startup')
+        _startup['error'] = f"{type(e).__name__}: {e}"
+    _startup['done'] = True
+
+def readiness() -> dict:
+    """Ready once startup finished and the current generation serves, as /recommend would load it (reason when not)."""
+    if not _startup['done']:
+        return {'ready': False, 'reason': 'starting'}
+    try:
+        snap = current_snapshot()
+    except Exception as e:
+        if persistence.current_generation() is None:
+            return {'ready': False, 'reason': _startup['error'] or 'no artifact generation, run /build'}
+        return {'ready': False, 'reason': f"{type(e).__name__}: {e}"}
+    return {'ready': True, 'generation': snap.generation, 'products': len(snap)}
+
+def _timed_build(force, progress):
+    """pipeline.run_build with each stage (and the whole build) recorded in the build histograms."""
+    from ..recommender import pipeline   # build-only: keeps sklearn / openpyxl out of serving imports
+    started = {}
+
+    def report(stage, state, detail=None):
+        progress(stage, state, detail)
+        if state == 'running':
+            started[stage] = time.perf_counter()
+        elif stage in started:
+            metrics.observe('build', stage, time.perf_counter() - started.pop(stage))
 
-    pivot = collaborative.build_user_item_matrix(reviews, min_user_ratings=1)
-    cf_preds = None
     try:
-        cf_preds, svd_cf = collaborative.simple_svd_predict(pivot, n_components=64)
-        persistence.save(cf_preds, "cf_preds.pkl")
+        with metrics.stage('build', 'total'):
+            gen = pipeline.run_build(force=force, progress=report)
     except Exception:
-        cf_preds = None
-
-    pmi_graph, item_counts = collaborative.build_item_pmi(reviews)
-    persistence.save({'pmi': pmi_graph, 'counts': item_counts}, "pmi_graph.pkl")
-    persistence.save(prod_vecs, "product_vectors.pkl")
-
-    _cache.update({
-        'products': products,
-        'reviews': reviews,
-        'product_vectors': prod_vecs,
-        'cf_preds': cf_preds,
-        'pmi_graph': pmi_graph
-    })
-    return {"status": "ok", "message": "Artifacts built and saved."}
-
-@router.post("/recommend", response_model=RecommendResponse)
-def recommend(req: RecommendRequest):
+        metrics.count('recsys_builds_total', status='failed')
+        metrics.count('recsys_errors_total', scope='build')
+        raise
+    metrics.count('recsys_builds_total', status='done')
+    return gen
 
+@router.post("/build", status_code=202)
+def build_artifacts(req: BuildRequest):
+    from ..recommender import pipeline
+    try:
+        job = _jobs.submit(lambda progress: _timed_build(req.force, progress),
+                           stages=pipeline.BUILD_STAGES, on_done=_swap_snapshot)
+    except JobLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return job.to_dict()
+
+@router.get("/build/{job_id}")
+def build_status(job_id: str):
+    job = _jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown build job {job_id}")
+    return job.to_dict()
+
+def _serving_snapshot() -> Snapshot:
     try:
-        if 'product_vectors' not in _cache:
-            _cache['products'] = persistence.load("products_meta.pkl")
-            _cache['reviews'] = persistence.load("reviews.pkl")
-            _cache['product_vectors'] = persistence.load("product_vectors.pkl")
-            pmi_blob = persistence.load("pmi_graph.pkl")
-            _cache['pmi_graph'] = pmi_blob['pmi']
-            _cache['cf_preds'] = persistence.load("cf_preds.pkl") if (ARTIFACTS_DIR / "cf_preds.pkl").exists() else None
+        return current_snapshot()
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Artifacts missing. Run /build first. Err: {e}")
 
-    products = _cache['products']
-    prod_vecs = _cache['product_vectors']
-    reviews = _cache['reviews']
-    pmi_graph = _cache['pmi_graph']
-    cf_preds = _cache.get('cf_preds', None)
-
-    q = req.questionnaire.dict()
-    # intent vector: choose products in favorite categories or explicit_favorites
-    mask = pd.Series(False, index=products.index)
-    if q.get('favorite_categories'):
-        fav = [c.lower() for c in q['favorite_categories']]
-        mask = products['category'].astype(str).str.lower().apply(lambda s: any(f in s for f in fav))
-    if q.get('explicit_favorites'):
-        exp = set([e.lower() for e in q['explicit_favorites']])
-        mask |= products['product_name'].astype(str).str.lower().apply(lambda s: any(e in s for e in exp))
-
-    if mask.sum() == 0:
-        intent_vec = prod_vecs.values.mean(axis=0)
-    else:
-        selected_ids = products.loc[mask].index.tolist()
-        # prod_vecs index: product_id strings
-        # ensure selected_ids exist in prod_vecs index; if not, fallback to mean
-        selected_ids = [sid for sid in selected_ids if sid in prod_vecs.index]
-        if not selected_ids:
-            intent_vec = prod_vecs.values.mean(axis=0)
-        else:
-            intent_vec = prod_vecs.loc[selected_ids].values.mean(axis=0)
-
-    # content scores
-    content_scores = content.content_score_for_user(intent_vec, prod_vecs)
-
-    # collaborative / cf scores
-    if cf_preds is not None:
-        # cf_preds: DataFrame users x items; aggregate to item score by mean predicted rating
-        cf_scores = cf_preds.mean(axis=0)
-        cf_scores = cf_scores.reindex(content_scores.index).fillna(0.0)
-    else:
-        # fallback: use PMI co-occurrence using explicit favorites (match by product name substring)
-        seeds = [s.lower() for s in q.get('explicit_favorites', []) if s.strip()]
-        ex_scores = {}
-        for seed_name in seeds:
-            matched = products[products['product_name'].str.lower().str.contains(seed_name, na=False)]
-            for pid in matched.index:
-                for nbr, w in pmi_graph.get(pid, {}).items():
-                    ex_scores[nbr] = max(ex_scores.get(nbr, 0.0), w)
-        cf_scores = pd.Series(ex_scores)
-        cf_scores = cf_scores.reindex(content_scores.index).fillna(0.0)
-
-    # demographic/compatibility
-    compat = demographic.compatibility_score(q, products)
-
-    # blend
-    blended = hybrid.blend(content_scores, cf_scores, compat, weights=tuple(req.weights))
-    candidates = list(blended.sort_values(ascending=False).index)
-
-    # rerank using MMR with content as relevance
-    mmr_selected = hybrid.mmr(candidates, content_scores, prod_vecs, k=req.top_k, lam=req.mmr_lambda)
-
-    results = []
-    for pid in mmr_selected:
-        meta = products.loc[pid] if pid in products.index else {}
-        results.append(RecommendItem(
-            product_id=str(pid),
-            product_name=str(meta.get('product_name', '')),
-            score=float(blended.get(pid, 0.0)),
-            content=float(content_scores.get(pid, 0.0)),
-            cf=float(cf_scores.get(pid, 0.0)),
-            compatibility=float(compat.get(pid, 0.0))
-        ))
-
-    return RecommendResponse(recommendations=results)
+@router.post("/recommend", response_model=RecommendResponse)
+def recommend(req: RecommendRequest):
+    snap = _serving_snapshot()
+    key, canon = canonical_request(req)
+    items = _responses.get_or_compute(snap.generation, key, lambda: serving.recommend_batch(snap, [canon])[0])
+    return RecommendResponse(recommendations=[RecommendItem(**it) for it in items])
+
+@router.post("/recommend/batch", response_model=BatchRecommendResponse)
+def recommend_batch(req: BatchRecommendRequest):
+    if len(req.requests) > RECOMMEND_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {RECOMMEND_BATCH_MAX} requests per batch")
+    snap = _serving_snapshot()
+    keys, canon = [], {}
+    for r in req.requests:
+        key, c = canonical_request(r)
+        keys.append(key)
+        canon[key] = c
+    # cached requests are served directly; distinct misses are scored together and cached
+    found = _responses.get_many(snap.generation, canon)
+    missing = [k for k in canon if k not in found]
+    computed = dict(zip(missing, serving.recommend_batch(snap, [canon[k] for k in missing])))
+    _responses.put_many(snap.generation, computed.items())
+    found.update(computed)
+    return BatchRecommendResponse(results=[
+        RecommendResponse(recommendations=[RecommendItem(**it) for it in found[k]]) for k in keys
+    ])
+
+@router.get("/similar/{product_id}", response_model=SimilarResponse)
+def similar(product_id: str, k: int = 10, source: str = "all"):
+    """Neighbours of one product from the precomputed table, best content similarity first."""
+    kinds = {'all': neighbours.CONTENT | neighbours.PMI, 'content': neighbours.CONTENT, 'pmi': neighbours.PMI}
+    if source not in kinds:
+        raise HTTPException(status_code=422, detail=f"source must be one of {', '.join(kinds)}")
+    snap = _serving_snapshot()
+    row = snap.row_of.get(product_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Unknown product {product_id}")
+    rows, content, pmi, src = neighbours.row(snap.neighbours, row)
+    keep = np.flatnonzero(src & kinds[source])[:max(k, 0)]
+    return SimilarResponse(product_id=product_id, product_name=snap.name(row), similar=[SimilarItem(
+        product_id=str(snap.ids[rows[i]]),
+        product_name=snap.name(rows[i]),
+        content=float(content[i]),
+        pmi=float(pmi[i]),
+        source=[name for name in ('content', 'pmi') if src[i] & kinds[name]],
+    ) for i in keep])
+
+@router.get("/cache/stats")
+def cache_stats():
+    return _responses.stats()
+
+@router.get("/snapshot")
+def snapshot_info():
+    """Serving snapshot memory footprint per attribute (heap vs memory-mapped bytes)."""
+    return _serving_snapshot().footprint()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics_text():
+    stats = _responses.stats()
+    extra = [(f"recsys_response_cache_{k}_total", 'counter', stats[k], None)
+             for k in ('hits', 'misses', 'coalesced', 'evictions', 'expirations', 'invalidations')]
+    extra.append(('recsys_response_cache_entries', 'gauge', stats['size'], None))
+    try:
+        snap = current_snapshot()
+    except Exception:
+        snap = None
+    if snap is not None:
+        extra.append(('recsys_serving_generation_info', 'gauge', 1, {'generation': snap.generation}))
+        fp = snap.footprint()
+        extra += [('recsys_snapshot_bytes', 'gauge', fp[k], {'kind': k[:-6]}) for k in ('heap_bytes', 'mapped_bytes')]
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
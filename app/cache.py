@@ -0,0 +1,175 @@
+# app/cache.py
+import threading
+import time
+from collections import OrderedDict
+from .models import RecommendRequest
+
+_MISSING = object()
+_DEFAULT_WEIGHTS = (0.45, 0.35, 0.20)
+
+def canonical_request(req: RecommendRequest, digits=3):
+    """
+    Canonical form of a request: lowercased, de-duplicated, sorted lists, rounded floats and
+    sum-normalized weights. Returns (hashable key, equivalent RecommendRequest to compute with),
+    so a cached response is exactly what the canonical request computes.
+    """
+    q = req.questionnaire
+
+    def norm_list(xs):
+        return tuple(sorted(set(x.lower() for x in (xs or []))))
+
+    # blend_matrix normalizes weights by their sum, so proportional weight vectors share one key
+    weights = [float(w) for w in (req.weights if req.weights is not None else _DEFAULT_WEIGHTS)]
+    total = sum(weights)
+    weights = tuple(round(w / total if total > 0 else w, digits) for w in weights)
+    canon = {
+        'questionnaire': {
+            'avg_price_level': (q.avg_price_level or '').lower(),
+            'favorite_categories': list(norm_list(q.favorite_categories)),
+            'preferred_brands': list(norm_list(q.preferred_brands)),
+            'price_sensitivity': round(float(q.price_sensitivity if q.price_sensitivity is not None else 1.0), digits),
+            'prefer_newness': bool(q.prefer_newness),
+            'explicit_favorites': list(norm_list(q.explicit_favorites)),
+        },
+        'top_k': int(req.top_k),
+        'weights': list(weights),
+        'mmr_lambda': round(float(req.mmr_lambda), digits),
+    }
+    cq = canon['questionnaire']
+    key = (cq['avg_price_level'], tuple(cq['favorite_categories']), tuple(cq['preferred_brands']), cq['price_sensitivity'],
+           cq['prefer_newness'], tuple(cq['explicit_favorites']), canon['top_k'], weights, canon['mmr_lambda'])
+    return key, RecommendRequest(**canon)
+
+class _Flight:
+    """One in-progress computation that concurrent identical misses wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+class ResponseCache:
+    """
+    In-process LRU + TTL cache of recommendation responses for one artifact generation.
+    Seeing a new generation drops every entry. Concurrent misses on the same key are coalesced.
+    """
+
+    def __init__(self, max_entries=10000, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._inflight = {}
+        self._generation = None
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.coalesced = 0
+        self.evictions = self.expirations = self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _sync_generation(self, generation):
+        if generation != self._generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._generation = generation
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _store(self, generation, key, value):
+        if generation != self._generation:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_compute(self, generation, key, compute):
+        if not self.enabled:
+            return compute()
+        with self._lock:
+            self._sync_generation(generation)
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            flight = self._inflight.get((generation, key))
+            leader = flight is None
+            if leader:
+                flight = self._inflight[(generation, key)] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return flight.wait()
+        try:
+            flight.value = compute()
+        except Exception as e:
+            flight.error = e
+            raise
+        else:
+            with self._lock:
+                self._store(generation, key, flight.value)
+            return flight.value
+        finally:
+            with self._lock:
+                self._inflight.pop((generation, key), None)
+            flight.done.set()
+
+    def get_many(self, generation, keys):
+        """Cached values for `keys` (dict of the ones found); misses are counted."""
+        found = {}
+        if not self.enabled:
+            return found
+        with self._lock:
+            self._sync_generation(generation)
+            for key in keys:
+                value = self._lookup(key)
+                if value is _MISSING:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                    found[key] = value
+        return found
+
+    def put_many(self, generation, items):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._sync_generation(generation)
+            for key, value in items:
+                self._store(generation, key, value)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'generation': self._generation,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_ratio': (self.hits / lookups) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
@@ -1,8 +1,10 @@
+import os
 from pathlib import Path
 
 BASE = Path(__file__).resolve().parents[1]
-DATA_DIR = BASE / "data"
-ARTIFACTS_DIR = BASE / "artifacts"
+# data / artifact locations can be redirected (e.g. benchmarks run against a scratch directory)
+DATA_DIR = Path(os.environ.get("RECSYS_DATA_DIR", BASE / "data"))
+ARTIFACTS_DIR = Path(os.environ.get("RECSYS_ARTIFACTS_DIR", BASE / "artifacts"))
 ARTIFACTS_DIR.mkdir(parents=True, exist_ok=True)
 
 PRODUCTS_CSV = DATA_DIR / "amazon_products.csv"
@@ -12,3 +14,80 @@ REVIEWS_CSV = DATA_DIR / "amazon_reviews.csv"
 TFIDF_MAX_FEATURES = 8000
 SVD_DIM = 128
 USER_ITEM_DIM = 64
+
+# genome build for large catalogs: hashed text features, blocked randomized SVD, process pool
+GENOME_STREAMING_MIN_PRODUCTS = 200_000   # catalogs at least this large use it
+GENOME_HASH_FEATURES = 2 ** 20
+GENOME_BLOCK_ROWS = 20_000
+GENOME_N_JOBS = 0   # worker processes, 0 -> all cores
+
+# PMI co-occurrence: neighbours kept per item
+PMI_TOP_N = 50
+
+# item-to-item neighbour table (/similar, seed-based scoring): content neighbours per product from blocked matmuls
+NEIGHBOURS_TOP_N = 50
+NEIGHBOURS_BLOCK_MB = 64   # similarity block per worker thread
+NEIGHBOURS_N_JOBS = 0      # threads, 0 -> all cores
+
+# ANN (IVF) index over the product genome; catalogs up to ANN_EXACT_THRESHOLD use exact search
+ANN_EXACT_THRESHOLD = 20000
+ANN_NLIST = 0      # 0 -> sqrt(n_products)
+ANN_NPROBE = 8     # lists scanned per query: recall / latency knob
+
+# quantized genome for content scoring and MMR: 'none', 'int8' (per-dimension scales) or 'pq' (product quantization);
+# each query's top QUANT_RERANK products are re-scored with the exact float vectors
+GENOME_QUANTIZATION = os.environ.get("RECSYS_GENOME_QUANTIZATION", "none")
+QUANT_RERANK = 200
+PQ_SUBSPACES = 16   # must divide SVD_DIM
+PQ_CENTROIDS = 256
+
+# versioned artifact generations kept on disk (older ones are pruned after a build)
+ARTIFACT_KEEP_GENERATIONS = 3
+
+# background /build jobs allowed to be queued or running at the same time
+BUILD_MAX_CONCURRENT = 1
+
+# incremental builds: share of changed products / reviews above which a stage is refitted from scratch
+GENOME_REFIT_DRIFT = 0.2
+CF_REFIT_DRIFT = 0.2
+
+# ingestion: rows per CSV / Parquet chunk, parsed-source caches kept under ARTIFACTS_DIR/ingest
+INGEST_CHUNK_ROWS = 100_000
+INGEST_CACHE_KEEP = 3
+
+# batch recommendations: queries scored together per matrix pass, max requests per call
+RECOMMEND_BATCH_CHUNK = 64
+RECOMMEND_BATCH_MAX = 5000
+
+# two-stage /recommend: bounded candidate retrieval, then blend + MMR over the candidates only
+RETRIEVAL_MIN_PRODUCTS = int(os.environ.get("RECSYS_RETRIEVAL_MIN_PRODUCTS", 20000))   # smaller catalogs are scored exhaustively
+RETRIEVAL_CONTENT_TOP = 500   # content top-M from the IVF index
+RETRIEVAL_CATEGORY_TOP = 200  # most reviewed products of the favorite categories
+RETRIEVAL_NEIGHBOURS = 200    # explicit favorites and their PMI neighbours
+RETRIEVAL_POPULAR = 100       # most reviewed / highest CF score products
+RERANK_POOL = 300             # best blended candidates handed to MMR
+
+# scoring backend: 'local' (in the request thread) or 'sharded' (shared-memory shards, persistent process pool)
+SCORING_BACKEND = os.environ.get("RECSYS_SCORING_BACKEND", "local")
+SCORING_WORKERS = int(os.environ.get("RECSYS_SCORING_WORKERS", 0))   # 0 -> all cores
+SCORING_SHARDS = 0   # 0 -> one per worker
+
+# startup: the current generation is loaded, validated and warmed up before the app serves (see app/main.py);
+# RECSYS_STARTUP_VERIFY also recomputes every artifact checksum (reads all files once)
+STARTUP_VERIFY = os.environ.get("RECSYS_STARTUP_VERIFY", "0") == "1"
+STARTUP_WARMUP = os.environ.get("RECSYS_STARTUP_WARMUP", "1") == "1"
+
+# offline evaluation (python -m app.recommender.evaluation): cutoff, users per scoring chunk, threads (0 -> all cores)
+EVAL_K = 10
+EVAL_CHUNK_USERS = 256
+EVAL_N_JOBS = 0
+
+# /recommend response cache (per worker): max entries (0 disables) and time to live in seconds
+RESPONSE_CACHE_SIZE = 10000
+RESPONSE_CACHE_TTL = 300
+
+# slow-request profiler (opt-in): requests slower than RECSYS_PROFILE_SLOW_MS dump folded stack samples
+PROFILE_SLOW_MS = float(os.environ.get("RECSYS_PROFILE_SLOW_MS", 0))   # 0 disables
+PROFILE_INTERVAL = 0.005   # seconds between stack samples
+PROFILE_DIR = ARTIFACTS_DIR / "profiles"
+PROFILE_KEEP = 50
@@ -0,0 +1,97 @@
+# app/jobs.py
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+class JobLimitError(RuntimeError):
+    pass
+
+class BuildJob:
+    def __init__(self, stages):
+        self.id = uuid.uuid4().hex
+        self.status = 'queued'   # queued -> running -> done | failed
+        self.created = time.time()
+        self.finished = None
+        self.generation = None
+        self.error = None
+        self.swap_error = None   # the build succeeded (its generation is current) but on_done failed
+        self.stages = {s: {'status': 'pending', 'started': None, 'finished': None} for s in stages}
+
+    def progress(self, stage, state, detail=None):
+        info = self.stages.setdefault(stage, {'status': 'pending', 'started': None, 'finished': None})
+        info['status'] = state
+        info['started' if state == 'running' else 'finished'] = time.time()
+        if detail is not None:
+            info['mode'] = detail
+
+    def fail_running(self):
+        """Mark the stage(s) still running when the build raised as failed."""
+        for info in self.stages.values():
+            if info['status'] == 'running':
+                info['status'] = 'failed'
+                info['finished'] = time.time()
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'created': self.created,
+            'finished': self.finished,
+            'generation': self.generation,
+            'error': self.error,
+            'swap_error': self.swap_error,
+            'stages': {k: dict(v) for k, v in self.stages.items()},
+        }
+
+class BuildJobs:
+    """Background build runner with a cap on concurrently active (queued or running) builds."""
+
+    def __init__(self, max_concurrent=1, history=50):
+        self.max_concurrent = max_concurrent
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="build")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, stages, on_done=None) -> BuildJob:
+        """
+        fn(progress) -> generation; on_done(generation) runs in the build thread after success. An on_done
+        failure leaves the job 'done' (fn already published the generation) and is reported as swap_error.
+        """
+        with self._lock:
+            active = sum(j.status in ('queued', 'running') for j in self._jobs.values())
+            if active >= self.max_concurrent:
+                raise JobLimitError(f"{active} build(s) already in progress")
+            job = BuildJob(stages)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                self._jobs.popitem(last=False)
+        self._executor.submit(self._run, job, fn, on_done)
+        return job
+
+    def _run(self, job, fn, on_done):
+        job.status = 'running'
+        try:
+            job.generation = fn(job.progress)
+        except Exception as e:
+            job.fail_running()
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = 'failed'
+            job.finished = time.time()
+            traceback.print_exc()
+            return
+        try:
+            if on_done:
+                on_done(job.generation)
+        except Exception as e:
+            job.swap_error = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+        job.status = 'done'
+        job.finished = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
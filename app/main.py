@@ -1,9 +1,38 @@
+import time
+_t0 = time.perf_counter()   # before any other import: import time counts from here
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from .api.routes import router as api_router
+from fastapi.responses import JSONResponse
+from .api import routes
+from . import metrics
+
+# Startup: imports cover serving only (build dependencies load with the first /build); the lifespan
+# loads / validates the current artifact generation and runs a warm-up query before the first request.
+# Milestones (imports, artifacts, warm, first_response) are exported as recsys_startup_seconds.
+metrics.mark_started(_t0)
+metrics.milestone('imports')
+
+@asynccontextmanager
+async def lifespan(app):
+    routes.startup()
+    yield
 
-app = FastAPI(title="Product Genome Hybrid Recommender")
-app.include_router(api_router, prefix="/api")
+app = FastAPI(title="Product Genome Hybrid Recommender", lifespan=lifespan)
+app.middleware("http")(metrics.http_middleware)
+app.include_router(routes.router, prefix="/api")
 
 @app.get("/")
 def root():
     return {"status":"ok", "message":"Product Genome Recommender API — POST /api/build then /api/recommend"}
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process serves HTTP."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: 503 until startup finished and an artifact generation is loaded."""
+    state = routes.readiness()
+    return JSONResponse(state, status_code=200 if state['ready'] else 503)
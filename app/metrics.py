@@ -0,0 +1,256 @@
+# app/metrics.py
+import bisect
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from .config import PROFILE_SLOW_MS, PROFILE_INTERVAL, PROFILE_DIR, PROFILE_KEEP
+
+# Always-on, in-process instrumentation:
+# - stage timers feed per (scope, stage) latency histograms (fixed exponential buckets, p50/p95/p99 from the buckets)
+# - labelled counters (artifact loads, CF path taken, errors, requests)
+# - each HTTP request collects its own stage timings (context variable) for the Server-Timing header
+# - startup milestones (imports done, artifacts loaded, warm, first response) in seconds since app.main started importing
+# - opt-in sampling profiler: requests slower than PROFILE_SLOW_MS dump folded stacks (flamegraph.pl / speedscope input)
+# Everything is rendered in the Prometheus text format by render().
+
+BUCKETS = tuple(5e-5 * 2 ** i for i in range(21))   # 50us .. ~52s
+QUANTILES = (0.5, 0.95, 0.99)
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last slot: +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Linear interpolation inside the bucket holding the q-th observation, clamped to the observed range."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                lo = self.buckets[i - 1] if i > 0 else 0.0
+                hi = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return min(max(lo + (hi - lo) * (rank - seen) / c, self.min), self.max)
+            seen += c
+        return self.max
+
+_lock = threading.Lock()
+_histograms = {}   # (scope, stage) -> Histogram
+_counters = Counter()   # (name, ((label, value), ...)) -> count
+_request = contextvars.ContextVar('recsys_request_timings', default=None)
+_started = None    # perf_counter when app.main started importing
+_startup = {}      # milestone -> seconds since _started
+PROBE_PATHS = ('/healthz', '/readyz')   # not a first response
+
+def observe(scope: str, stage: str, seconds: float):
+    with _lock:
+        h = _histograms.get((scope, stage))
+        if h is None:
+            h = _histograms[(scope, stage)] = Histogram()
+        h.observe(seconds)
+    timings = _request.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+def count(name: str, value=1, **labels):
+    with _lock:
+        _counters[(name, tuple(sorted(labels.items())))] += value
+
+def mark_started(t0: float):
+    global _started
+    _started = t0
+
+def milestone(name: str):
+    """Record the first time `name` is reached (seconds since mark_started); later calls are ignored."""
+    if _started is None:
+        return
+    with _lock:
+        _startup.setdefault(name, time.perf_counter() - _started)
+
+def startup_milestones() -> dict:
+    with _lock:
+        return dict(_startup)
+
+@contextmanager
+def stage(scope: str, stage_name: str):
+    """Time a block into the (scope, stage) histogram and the current request's Server-Timing."""
+    timings = _request.get()
+    if timings is not None:
+        timings.threads.add(threading.get_ident())
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(scope, stage_name, time.perf_counter() - t0)
+
+class RequestTimings:
+    """Stage durations of one request (summed when a stage runs more than once, e.g. per batch chunk)."""
+
+    def __init__(self):
+        self.stages = {}
+        self.threads = set()
+
+    def add(self, stage_name, seconds):
+        self.stages[stage_name] = self.stages.get(stage_name, 0.0) + seconds
+
+    def header(self, total=None) -> str:
+        parts = [f"{name};dur={s * 1000.0:.3f}" for name, s in self.stages.items()]
+        if total is not None:
+            parts.append(f"total;dur={total * 1000.0:.3f}")
+        return ', '.join(parts)
+
+def _fold(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class SlowRequestProfiler:
+    """
+    Samples the stacks of threads doing a request's work (the threads its stage timers ran on) every
+    `interval` seconds; requests slower than `threshold_ms` are written as folded stacks ("a;b;c count").
+    """
+
+    def __init__(self, threshold_ms, interval, out_dir, keep=50):
+        self.threshold_ms = threshold_ms
+        self.interval = interval
+        self.out_dir = out_dir
+        self.keep = keep
+        self._active = {}   # id(timings) -> (timings, Counter of folded stacks)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self._active.values())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for timings, stacks in active:
+                for tid in list(timings.threads):
+                    frame = frames.get(tid)
+                    if frame is not None:
+                        stacks[_fold(frame)] += 1
+
+    def start(self, timings):
+        with self._lock:
+            self._active[id(timings)] = (timings, Counter())
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+                self._thread.start()
+
+    def finish(self, timings, seconds, label):
+        with self._lock:
+            _, stacks = self._active.pop(id(timings), (None, None))
+        if not stacks or seconds * 1000.0 < self.threshold_ms:
+            return None
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        slug = label.strip('/').replace('/', '_') or 'root'
+        path = self.out_dir / f"{time.strftime('%Y%m%dT%H%M%S')}-{slug}-{seconds * 1000.0:.0f}ms-{id(timings):x}.folded"
+        path.write_text(''.join(f"{stack} {n}\n" for stack, n in stacks.most_common()))
+        for old in sorted(self.out_dir.glob('*.folded'))[:-self.keep]:
+            old.unlink(missing_ok=True)
+        count('recsys_slow_request_profiles_total', path=label)
+        return path
+
+profiler = SlowRequestProfiler(PROFILE_SLOW_MS, PROFILE_INTERVAL, PROFILE_DIR, PROFILE_KEEP) if PROFILE_SLOW_MS > 0 else None
+
+async def http_middleware(request, call_next):
+    """Request timing, Server-Timing header, request / error counters and the slow-request profiler."""
+    timings = RequestTimings()
+    token = _request.set(timings)
+    if profiler is not None:
+        profiler.start(timings)
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        total = time.perf_counter() - t0
+        _request.reset(token)
+        route = request.scope.get('route')
+        path = getattr(route, 'path', None) or 'unmatched'
+        observe('http', path, total)
+        count('recsys_http_requests_total', path=path, status=str(status))
+        if status >= 500:
+            count('recsys_errors_total', scope='http', path=path)
+        if path not in PROBE_PATHS:
+            milestone('first_response')
+        if profiler is not None:
+            profiler.finish(timings, total, path)
+    response.headers['Server-Timing'] = timings.header(total)
+    return response
+
+def _labels(pairs) -> str:
+    if not pairs:
+        return ''
+    inner = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+    return '{' + inner + '}'
+
+def render(extra=None) -> str:
+    """
+    Prometheus text exposition of all histograms and counters.
+    extra: optional list of (name, type, value, labels dict) samples owned by other modules (e.g. cache stats)
+    """
+    with _lock:
+        hists = {k: (list(h.counts), h.sum, h.count, [h.quantile(q) for q in QUANTILES]) for k, h in _histograms.items()}
+        counters = dict(_counters)
+        startup = dict(_startup)
+    out = [
+        '# HELP recsys_stage_duration_seconds Latency of instrumented stages.',
+        '# TYPE recsys_stage_duration_seconds histogram',
+    ]
+    for (scope, stage_name), (counts, total, n, _) in sorted(hists.items()):
+        labels = (('scope', scope), ('stage', stage_name))
+        cum = 0
+        for le, c in zip(BUCKETS + (float('inf'),), counts):
+            cum += c
+            out.append(f"recsys_stage_duration_seconds_bucket{_labels(labels + (('le', '+Inf' if le == float('inf') else f'{le:.6g}'),))} {cum}")
+        out.append(f"recsys_stage_duration_seconds_sum{_labels(labels)} {total:.9g}")
+        out.append(f"recsys_stage_duration_seconds_count{_labels(labels)} {n}")
+    out += [
+        '# HELP recsys_stage_duration_quantile_seconds p50 / p95 / p99 estimated from the stage histograms.',
+        '# TYPE recsys_stage_duration_quantile_seconds gauge',
+    ]
+    for (scope, stage_name), (_, _, _, qs) in sorted(hists.items()):
+        for q, v in zip(QUANTILES, qs):
+            out.append(f"recsys_stage_duration_quantile_seconds{_labels((('scope', scope), ('stage', stage_name), ('quantile', q)))} {v:.9g}")
+    typed = set()
+    for (name, labels), v in sorted(counters.items()):
+        if name not in typed:
+            out.append(f"# TYPE {name} counter")
+            typed.add(name)
+        out.append(f"{name}{_labels(labels)} {v}")
+    if startup:
+        out += [
+            '# HELP recsys_startup_seconds Seconds from the start of the app import to each startup milestone.',
+            '# TYPE recsys_startup_seconds gauge',
+        ]
+        out += [f"recsys_startup_seconds{_labels((('milestone', k),))} {v:.9g}" for k, v in sorted(startup.items())]
+    for name, kind, value, labels in extra or []:
+        if name not in typed:
+            out.append(f"# TYPE {name} {kind}")
+            typed.add(name)
+        out.append(f"{name}{_labels(tuple(sorted((labels or {}).items())))} {value}")
+    return '\n'.join(out) + '\n'
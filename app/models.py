@@ -1,5 +1,5 @@
 # app/models.py
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 
 class BuildRequest(BaseModel):
@@ -15,9 +15,9 @@ class Questionnaire(BaseModel):
 
 class RecommendRequest(BaseModel):
     questionnaire: Questionnaire
-    top_k: Optional[int] = 10
-    weights: Optional[List[float]] = [0.45, 0.35, 0.20]  # content, cf, demographic
-    mmr_lambda: Optional[float] = 0.7
+    top_k: int = Field(10, ge=1)
+    weights: Optional[List[float]] = Field([0.45, 0.35, 0.20], min_length=3, max_length=3)  # content, cf, demographic
+    mmr_lambda: float = Field(0.7, ge=0, le=1)
 
 class RecommendItem(BaseModel):
     product_id: str
@@ -29,3 +29,21 @@ class RecommendItem(BaseModel):
 
 class RecommendResponse(BaseModel):
     recommendations: List[RecommendItem]
+
+class BatchRecommendRequest(BaseModel):
+    requests: List[RecommendRequest]
+
+class BatchRecommendResponse(BaseModel):
+    results: List[RecommendResponse]
+
+class SimilarItem(BaseModel):
+    product_id: str
+    product_name: Optional[str]
+    content: float   # cosine similarity of the product genomes
+    pmi: float       # co-occurrence PMI weight, 0 when not a PMI neighbour
+    source: List[str]   # "content" and / or "pmi"
+
+class SimilarResponse(BaseModel):
+    product_id: str
+    product_name: Optional[str]
+    similar: List[SimilarItem]
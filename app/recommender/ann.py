@@ -0,0 +1,80 @@
+import numpy as np
+from ..config import ANN_EXACT_THRESHOLD, ANN_NLIST, ANN_NPROBE
+
+# IVF (inverted file) index over unit-normalized vectors, NumPy only:
+# a spherical k-means coarse quantizer splits the catalog into n_lists cells,
+# a query scans only the n_probe cells whose centroids are closest to it.
+# n_probe is the recall/latency knob; n_probe >= n_lists is an exact search.
+
+def normalize_rows(X) -> np.ndarray:
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=-1, keepdims=True)
+    return np.divide(X, norms, out=np.zeros_like(X), where=norms > 0)
+
+def dot_rows(A: np.ndarray, M: np.ndarray) -> np.ndarray:
+    """
+    A @ M.T for a (B, d) query block. BLAS routes single-row products to gemv, whose float32
+    rounding differs from gemm; a lone row is padded to two so a query scores bit-identically
+    whether it runs alone or inside a batch.
+    """
+    if len(A) == 1:
+        return (np.vstack([A, A]) @ M.T)[:1]
+    return A @ M.T
+
+def _assign(X, centroids, block=65536):
+    out = np.empty(len(X), dtype=np.int32)
+    for s in range(0, len(X), block):
+        out[s:s+block] = np.argmax(X[s:s+block] @ centroids.T, axis=1)
+    return out
+
+def build_ivf_index(vectors: np.ndarray, n_lists=ANN_NLIST, n_iter=10, exact_threshold=ANN_EXACT_THRESHOLD, seed=42, centroids=None):
+    """
+    vectors: unit-normalized float32 (n x d).
+    centroids: optional existing coarse quantizer; vectors are only re-assigned to it (incremental builds).
+    returns: dict (centroids, list_offsets, list_rows); centroids is None for catalogs small enough for exact search
+    """
+    n = len(vectors)
+    if n <= exact_threshold:
+        return {'centroids': None, 'list_offsets': None, 'list_rows': None}
+    if centroids is not None:
+        return _inverted_lists(vectors, np.asarray(centroids, dtype=np.float32))
+    n_lists = int(n_lists) if n_lists else max(1, int(np.sqrt(n)))
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(n, size=min(n, 256 * n_lists), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        empty = np.bincount(assign, minlength=n_lists) == 0
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return _inverted_lists(vectors, centroids)
+
+def _inverted_lists(vectors, centroids):
+    n_lists = len(centroids)
+    assign = _assign(vectors, centroids)
+    list_rows = np.argsort(assign, kind='stable').astype(np.int32)
+    list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))]).astype(np.int64)
+    return {'centroids': centroids, 'list_offsets': list_offsets, 'list_rows': list_rows}
+
+def _top(rows, scores, top_m):
+    if len(scores) > top_m:
+        part = np.argpartition(-scores, top_m - 1)[:top_m]
+        rows, scores = rows[part], scores[part]
+    order = np.argsort(-scores, kind='stable')
+    return rows[order], scores[order]
+
+def search(index, vectors: np.ndarray, query: np.ndarray, top_m=100, n_probe=ANN_NPROBE):
+    """
+    Top-m rows of `vectors` by cosine similarity to `query`.
+    returns: (rows, scores), best first
+    """
+    q = normalize_rows(query.reshape(1, -1)).ravel()
+    centroids = index['centroids']
+    if centroids is None or n_probe >= len(centroids):
+        return _top(np.arange(len(vectors)), vectors @ q, top_m)
+    probe = np.argpartition(-(centroids @ q), n_probe - 1)[:n_probe]
+    offsets = index['list_offsets']
+    rows = np.concatenate([index['list_rows'][offsets[c]:offsets[c+1]] for c in probe])
+    return _top(rows, vectors[rows] @ q, top_m)
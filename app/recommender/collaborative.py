@@ -1,60 +1,190 @@
 import pandas as pd
 import numpy as np
-from collections import defaultdict, Counter
-import math
+from scipy.sparse import csr_matrix
+from ..config import PMI_TOP_N
 
 # NOTE: This file contains two approaches:
-# 1) Simple explicit matrix MF (SVD-init) - light baseline using sklearn TruncatedSVD on user-item rating matrix.
+# 1) Simple explicit MF - TruncatedSVD fitted directly on the sparse user-item rating matrix;
+#    only the user / item factors are kept and scores are computed on demand.
 # 2) PMI co-occurrence fallback if data is sparse.
 
 def build_user_item_matrix(reviews: pd.DataFrame, min_user_ratings=1):
     """
-    Build explicit user-item matrix (sparse) for users who rated items.
-    returns: user_index, item_index, R (DataFrame: users x items, with NaN for missing)
+    Build explicit user-item rating matrix (scipy.sparse CSR, duplicate ratings averaged).
+    returns: R (csr: users x items, missing entries are implicit zeros), user_ids, item_ids
     """
-    df = reviews[['user_id','product_id','rating']].copy()
-    pivot = df.pivot_table(index='user_id', columns='product_id', values='rating', aggfunc='mean')
-    # Optionally filter users/items
-    user_counts = pivot.notna().sum(axis=1)
-    item_counts = pivot.notna().sum(axis=0)
-    pivot = pivot.loc[user_counts >= min_user_ratings, item_counts[item_counts >= 1].index]
-    return pivot
+    df = reviews[['user_id','product_id','rating']].dropna(subset=['rating'])
+    ratings = df.groupby(['user_id','product_id'], sort=False)['rating'].mean()
+    user_codes, user_ids = pd.factorize(ratings.index.get_level_values(0), sort=True)
+    item_codes, item_ids = pd.factorize(ratings.index.get_level_values(1), sort=True)
+    R = csr_matrix((ratings.values.astype(np.float32), (user_codes, item_codes)),
+                   shape=(len(user_ids), len(item_ids)))
+    # Optionally filter users
+    if min_user_ratings > 1:
+        keep = np.flatnonzero(np.diff(R.indptr) >= min_user_ratings)
+        R, user_ids = R[keep], user_ids[keep]
+    return R, np.asarray(user_ids, dtype=object), np.asarray(item_ids, dtype=object)
 
-def simple_svd_predict(pivot_df, n_components=64):
+def fit_svd_factors(R, user_ids, item_ids, n_components=64):
     """
-    Very simple baseline: fill NaN with zeros, run TruncatedSVD, reconstruct scores.
-    (Be careful: zeros imply negative signal; this is a baseline only.)
+    Fit TruncatedSVD on the sparse rating matrix and keep only the factor matrices.
+    (Missing ratings act as zeros: this is a baseline only.)
+    returns: dict with user_factors (users x k, scaled by singular values), item_factors (items x k),
+             singular_values and ids
     """
     from sklearn.decomposition import TruncatedSVD
-    X = pivot_df.fillna(0.0).values
     svd = TruncatedSVD(n_components=n_components, random_state=42)
-    U = svd.fit_transform(X)   # users x k
-    Vt = svd.components_       # k x items
-    X_hat = U.dot(Vt)          # approx matrix
-    preds = pd.DataFrame(X_hat, index=pivot_df.index, columns=pivot_df.columns)
-    return preds, svd
+    U = svd.fit_transform(R)   # users x k
+    return {
+        'user_factors': U.astype(np.float32),
+        'item_factors': svd.components_.T.astype(np.float32),  # items x k
+        'singular_values': svd.singular_values_.astype(np.float32),
+        'user_ids': user_ids,
+        'item_ids': item_ids,
+    }
+
+def rows_of(sorted_ids, keys):
+    """Positions of `keys` in the sorted id array; -1 where absent."""
+    sorted_ids = np.asarray(sorted_ids, dtype=object)
+    keys = np.asarray(keys, dtype=object)
+    pos = np.searchsorted(sorted_ids, keys)
+    found = pos < len(sorted_ids)
+    found[found] = sorted_ids[pos[found]] == keys[found]
+    return np.where(found, pos, -1)
+
+def update_svd_factors(prev, R, user_ids, item_ids, changed_users):
+    """
+    Fold new ratings into existing factors instead of refitting.
+    R, user_ids, item_ids: the full (updated) rating matrix from build_user_item_matrix.
+    Unchanged users and known items keep their factors; changed or new users get u = r_u V over the
+    known items, new items then get v = U^T r_i / sigma^2 from those users, and the changed users are
+    folded once more to include the new items.
+    """
+    U_prev, V_prev = prev['user_factors'], prev['item_factors']
+    sigma2 = np.square(prev['singular_values']).astype(np.float64)
+    sigma2[sigma2 == 0] = 1.0
+
+    ipos = rows_of(prev['item_ids'], item_ids)
+    V = np.zeros((len(item_ids), V_prev.shape[1]), dtype=np.float32)
+    V[ipos >= 0] = V_prev[ipos[ipos >= 0]]
+
+    upos = rows_of(prev['user_ids'], user_ids)
+    upos[np.isin(user_ids, np.asarray(list(changed_users), dtype=object))] = -1
+    U = np.zeros((len(user_ids), U_prev.shape[1]), dtype=np.float32)
+    U[upos >= 0] = U_prev[upos[upos >= 0]]
+
+    # new items are only rated by changed users: fold those first (new items' V rows are still zero)
+    refold = np.flatnonzero(upos < 0)
+    new_items = np.flatnonzero(ipos < 0)
+    if len(refold):
+        U[refold] = R[refold] @ V
+    if len(new_items):
+        V[new_items] = (R[:, new_items].T @ U) / sigma2
+        if len(refold):
+            U[refold] = R[refold] @ V
+    return {
+        'user_factors': U,
+        'item_factors': V,
+        'singular_values': prev['singular_values'],
+        'user_ids': user_ids,
+        'item_ids': item_ids,
+    }
+
+def item_scores(factors, user_rows=None) -> pd.Series:
+    """
+    Predicted rating per item, averaged over `user_rows` (all users when None).
+    Same as the mean of the reconstructed users x items matrix without materializing it.
+    """
+    U = factors['user_factors']
+    u = U.mean(axis=0) if user_rows is None else U[np.asarray(user_rows)].mean(axis=0)
+    return pd.Series(factors['item_factors'].dot(u), index=factors['item_ids'])
+
+def user_scores(factors, item_rows) -> pd.Series:
+    """Predicted rating of `item_rows` (averaged) for every user."""
+    v = factors['item_factors'][np.asarray(item_rows)].mean(axis=0)
+    return pd.Series(factors['user_factors'].dot(v), index=factors['user_ids'])
 
 # PMI co-occurrence across users (items co-rated by same users)
-def build_item_pmi(reviews: pd.DataFrame):
-    user_items = reviews.groupby('user_id')['product_id'].apply(lambda s: set(s.tolist()))
-    item_counts = Counter()
-    co_counts = defaultdict(int)
-    n_users = len(user_items)
-    for items in user_items:
-        items = sorted(items)
-        for i in items:
-            item_counts[i] += 1
-        for i in range(len(items)):
-            for j in range(i+1, len(items)):
-                a, b = items[i], items[j]
-                co_counts[(a,b)] += 1
-                co_counts[(b,a)] += 1
-    pmi = {}
-    for (a,b), c in co_counts.items():
-        p_a = item_counts[a] / n_users
-        p_b = item_counts[b] / n_users
-        p_ab = c / n_users
-        val = math.log((p_ab / (p_a * p_b)) + 1e-12)
-        if val > 0:
-            pmi.setdefault(a, {})[b] = val
-    return pmi, item_counts
+def _indicator(reviews: pd.DataFrame):
+    pairs = reviews[['user_id','product_id']].drop_duplicates()
+    user_codes, user_ids = pd.factorize(pairs['user_id'], sort=True)
+    item_codes, item_ids = pd.factorize(pairs['product_id'], sort=True)
+    X = csr_matrix((np.ones(len(pairs), dtype=np.float32), (user_codes, item_codes)), shape=(len(user_ids), len(item_ids)))
+    return X, np.asarray(user_ids, dtype=object), np.asarray(item_ids, dtype=object)
+
+def build_item_cooccurrence(reviews: pd.DataFrame):
+    """
+    Sparse user x item indicator X and item co-occurrence counts X^T X (diagonal = item counts).
+    returns: dict (indicator, user_ids, item_ids: both sorted, cooc: csr items x items)
+    """
+    X, user_ids, item_ids = _indicator(reviews)
+    return {'indicator': X, 'user_ids': user_ids, 'item_ids': item_ids, 'cooc': (X.T @ X).tocsr()}
+
+def _remap(M, row_map, col_map, shape):
+    M = M.tocoo()
+    rows = M.row if row_map is None else row_map[M.row]
+    return csr_matrix((M.data, (rows, col_map[M.col])), shape=shape)
+
+def update_item_cooccurrence(prev, reviews: pd.DataFrame, changed_users):
+    """
+    Incremental build_item_cooccurrence: only the baskets of `changed_users` are
+    subtracted (old) and added back (new) instead of recomputing X^T X over every user.
+    """
+    X, user_ids, item_ids = _indicator(reviews)
+    items = np.union1d(prev['item_ids'], item_ids)
+    old_map, new_map = np.searchsorted(items, prev['item_ids']), np.searchsorted(items, item_ids)
+    n = len(items)
+
+    changed = np.asarray(sorted(set(changed_users)), dtype=object)
+    old_rows = rows_of(prev['user_ids'], changed)
+    new_rows = rows_of(user_ids, changed)
+    Xo = _remap(prev['indicator'][old_rows[old_rows >= 0]], None, old_map, (int((old_rows >= 0).sum()), n))
+    Xn = _remap(X[new_rows[new_rows >= 0]], None, new_map, (int((new_rows >= 0).sum()), n))
+
+    C = _remap(prev['cooc'], old_map, old_map, (n, n)) - (Xo.T @ Xo) + (Xn.T @ Xn)
+    C = C.tocsr()[new_map][:, new_map]
+    C.eliminate_zeros()
+    return {'indicator': X, 'user_ids': user_ids, 'item_ids': item_ids, 'cooc': C}
+
+def pmi_from_cooccurrence(cooc, top_n=PMI_TOP_N):
+    """
+    PMI on the nonzeros of the co-occurrence counts, top_n neighbours per item.
+    returns: graph dict (adj: csr items x items of positive PMI, item_ids: sorted product_id per row)
+    """
+    X, C, item_ids = cooc['indicator'], cooc['cooc'].tocoo(), cooc['item_ids']
+    n_users, n_items = X.shape
+    counts = cooc['cooc'].diagonal().astype(np.float64)
+
+    off = C.row != C.col
+    a, b, c = C.row[off], C.col[off], C.data[off].astype(np.float64)
+    val = np.log(c * n_users / (counts[a] * counts[b]) + 1e-12)
+    pos = val > 0
+    a, b, val = a[pos], b[pos], val[pos]
+
+    # keep the top_n strongest neighbours per item
+    order = np.lexsort((-val, a))
+    a, b, val = a[order], b[order], val[order]
+    starts = np.searchsorted(a, np.arange(n_items))
+    keep = (np.arange(len(a)) - starts[a]) < top_n
+    adj = csr_matrix((val[keep].astype(np.float32), (a[keep], b[keep])), shape=(n_items, n_items))
+    return {'adj': adj, 'item_ids': item_ids}
+
+def build_item_pmi(reviews: pd.DataFrame, top_n=PMI_TOP_N):
+    """
+    Co-occurrence as a sparse indicator product (X^T X), PMI on the nonzeros, top_n neighbours per item.
+    returns: graph dict (adj: csr items x items of positive PMI, item_ids: sorted product_id per row), item_counts
+    """
+    cooc = build_item_cooccurrence(reviews)
+    counts = cooc['cooc'].diagonal().astype(np.int64)
+    return pmi_from_cooccurrence(cooc, top_n=top_n), pd.Series(counts, index=cooc['item_ids'])
+
+def pmi_neighbour_scores(graph, product_ids) -> pd.Series:
+    """Max PMI weight from any of `product_ids` to every item of the graph."""
+    rows = rows_of(graph['item_ids'], list(product_ids))
+    rows = rows[rows >= 0]
+    adj = graph['adj']
+    scores = np.zeros(adj.shape[1], dtype=np.float32)
+    if len(rows):
+        sub = adj[rows]
+        np.maximum.at(scores, sub.indices, sub.data)
+    return pd.Series(scores, index=graph['item_ids'])
@@ -1,37 +1,11 @@
-import joblib
 import numpy as np
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.decomposition import TruncatedSVD
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from scipy.sparse import hstack, csr_matrix
-from ..config import ARTIFACTS_DIR, TFIDF_MAX_FEATURES, SVD_DIM
-from pathlib import Path
+from ..config import TFIDF_MAX_FEATURES, SVD_DIM, ANN_NPROBE, GENOME_STREAMING_MIN_PRODUCTS
+from . import ann, persistence
 
-ART_TFIDF = ARTIFACTS_DIR / "tfidf_joblib.pkl"
-ART_SVD = ARTIFACTS_DIR / "svd_joblib.pkl"
-ART_OHE = ARTIFACTS_DIR / "ohe_categories.pkl"
-ART_PROD_VEC = ARTIFACTS_DIR / "product_vectors.pkl"
-ART_PRODUCT_INDEX = ARTIFACTS_DIR / "product_index.pkl"
-ART_SCALER = ARTIFACTS_DIR / "scaler_num.pkl"
-
-def build_product_genome(products: pd.DataFrame, reviews: pd.DataFrame, force=False):
-    """
-    Build product genome: text TF-IDF + SVD, category OHE, numeric features (price, discount, rating, sentiment)
-    Returns: product_vectors (DataFrame indexed by product_id)
-    """
-    if not force and ART_PROD_VEC.exists():
-        prod_vecs = joblib.load(ART_PROD_VEC)
-        tfidf = joblib.load(ART_TFIDF)
-        svd = joblib.load(ART_SVD)
-        ohe = joblib.load(ART_OHE)
-        scaler = joblib.load(ART_SCALER)
-        index = joblib.load(ART_PRODUCT_INDEX)
-        return prod_vecs, tfidf, svd, ohe, scaler, index
-
-    # 1) Text: product descriptions + aggregated reviews (optionally include review summaries)
-    products = products.copy()
-    reviews = reviews.copy()
+def _genome_frame(products: pd.DataFrame, reviews: pd.DataFrame):
+    """Products indexed by product_id with aggregated review text / sentiment and the combined text."""
     # aggregate reviews text & sentiment per product
     rev_agg = reviews.groupby('product_id').agg({
         'review_text': lambda xs: " ".join(xs.astype(str).tolist()[:30]),
@@ -40,19 +14,48 @@ def build_product_genome(products: pd.DataFrame, reviews: pd.DataFrame, force=Fa
     products = products.set_index('product_id').join(rev_agg, how='left')
     products['reviews_concat'] = products['reviews_concat'].fillna('')
     products['combined_text'] = (products['description'].fillna('') + ' ' + products['reviews_concat']).astype(str)
+    return products
 
-    corpus = products['combined_text'].fillna('').tolist()
-    tfidf = TfidfVectorizer(min_df=3, ngram_range=(1,2), max_features=TFIDF_MAX_FEATURES)
-    X_text = tfidf.fit_transform(corpus)
-
-    # 2) Numeric features
-    num_df = pd.DataFrame({
-        'price': products['price'].fillna(products['price'].median()),
+def _numeric_features(products: pd.DataFrame, price_median: float):
+    return pd.DataFrame({
+        'price': products['price'].fillna(price_median),
         'discount': products['discount'].fillna(0.0),
         'rating': products['rating'].fillna(0.0),
         'rating_count': np.log1p(products['rating_count'].fillna(0).astype(float)),
         'review_sentiment': products.get('review_sentiment', 0.0).fillna(0.0)
     }, index=products.index)
+
+def build_product_genome(products: pd.DataFrame, reviews: pd.DataFrame, force=False):
+    """
+    Build product genome: text TF-IDF + SVD, category OHE, numeric features (price, discount, rating, sentiment)
+    Catalogs of GENOME_STREAMING_MIN_PRODUCTS or more use the parallel, out-of-core build of genome_stream.
+    Returns: product_vectors (DataFrame indexed by product_id), fitted tfidf, svd, ohe, scaler, product index
+    """
+    if not force and persistence.current_generation():
+        # reuse the vectors and transforms of the current artifact generation
+        arrays = persistence.load_generation(mmap=False)['arrays']
+        index = list(arrays['product_ids'])
+        prod_vecs = pd.DataFrame(arrays['vectors'], index=index)
+        tfidf, svd, ohe, scaler = persistence.load_object('genome_transforms')
+        return prod_vecs, tfidf, svd, ohe, scaler, index
+
+    if len(products) >= GENOME_STREAMING_MIN_PRODUCTS:
+        from .genome_stream import build_product_genome_streaming
+        return build_product_genome_streaming(products, reviews)
+
+    # build-only dependencies: serving never fits transforms, so it never imports sklearn
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.decomposition import TruncatedSVD
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+    # 1) Text: product descriptions + aggregated reviews (optionally include review summaries)
+    products = _genome_frame(products, reviews)
+    corpus = products['combined_text'].fillna('').tolist()
+    tfidf = TfidfVectorizer(min_df=3, ngram_range=(1,2), max_features=TFIDF_MAX_FEATURES)
+    X_text = tfidf.fit_transform(corpus)
+
+    # 2) Numeric features
+    num_df = _numeric_features(products, products['price'].median())
     scaler = StandardScaler(with_mean=False)
     X_num = scaler.fit_transform(num_df.values)
 
@@ -73,16 +76,48 @@ def build_product_genome(products: pd.DataFrame, reviews: pd.DataFrame, force=Fa
     prod_index = list(products.index)
     prod_vecs = pd.DataFrame(X_latent, index=prod_index)
 
-    joblib.dump(tfidf, ART_TFIDF)
-    joblib.dump(svd, ART_SVD)
-    joblib.dump(ohe, ART_OHE)
-    joblib.dump(prod_vecs, ART_PROD_VEC)
-    joblib.dump(prod_index, ART_PRODUCT_INDEX)
-    joblib.dump(scaler, ART_SCALER)
-
     return prod_vecs, tfidf, svd, ohe, scaler, prod_index
 
-def content_score_for_user(intent_vec: np.ndarray, product_vectors: pd.DataFrame):
-    from sklearn.metrics.pairwise import cosine_similarity
-    sims = cosine_similarity(product_vectors.values, intent_vec.reshape(1,-1)).ravel()
+def project_products(products: pd.DataFrame, reviews: pd.DataFrame, product_ids, transforms, price_median=None):
+    """
+    Project products into an existing genome space with stored (tfidf, svd, ohe, scaler) transforms.
+    products / reviews: frames as passed to build_product_genome; only `product_ids` are featurized.
+    Returns: DataFrame of vectors indexed by product_id
+    """
+    tfidf, svd, ohe, scaler = transforms
+    if price_median is None:
+        price_median = products['price'].median()
+    ids = pd.Index(product_ids)
+    products = _genome_frame(products[products['product_id'].isin(ids)], reviews[reviews['product_id'].isin(ids)])
+    if products.empty:
+        return pd.DataFrame(np.empty((0, svd.components_.shape[0])), index=products.index)
+    X_text = tfidf.transform(products['combined_text'].fillna('').tolist())
+    X_num = scaler.transform(_numeric_features(products, price_median).values)
+    X_cat = ohe.transform(products['category'].fillna('unknown').astype(str).values.reshape(-1,1))
+    X = hstack([X_text, X_cat, csr_matrix(X_num)], format='csr')
+    return pd.DataFrame(svd.transform(X), index=products.index)
+
+def build_genome_index(product_vectors: pd.DataFrame, centroids=None):
+    """
+    Pre-normalized float32 genome matrix + ANN index over it (optionally re-using existing IVF centroids).
+    returns: dict (ids, genome, ann)
+    """
+    genome = ann.normalize_rows(product_vectors.values)
+    return {
+        'ids': np.asarray(product_vectors.index, dtype=object),
+        'genome': genome,
+        'ann': ann.build_ivf_index(genome, centroids=centroids),
+    }
+
+def top_products(genome_index, intent_vec: np.ndarray, top_m=100, n_probe=ANN_NPROBE) -> pd.Series:
+    """Top-m product ids (index) and cosine scores for an intent vector, best first."""
+    rows, scores = ann.search(genome_index['ann'], genome_index['genome'], intent_vec, top_m=top_m, n_probe=n_probe)
+    return pd.Series(scores, index=genome_index['ids'][rows])
+
+def content_score_for_user(intent_vec: np.ndarray, product_vectors: pd.DataFrame, genome_index=None):
+    if genome_index is not None:
+        # genome rows are already unit-normalized
+        sims = genome_index['genome'] @ ann.normalize_rows(intent_vec.reshape(1,-1)).ravel()
+        return pd.Series(sims, index=genome_index['ids'])
+    sims = ann.normalize_rows(product_vectors.values) @ ann.normalize_rows(intent_vec.reshape(1,-1)).ravel()
     return pd.Series(sims, index=product_vectors.index)
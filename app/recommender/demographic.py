@@ -1,5 +1,8 @@
 import pandas as pd
 import numpy as np
+from . import matching
+
+PRICE_BUCKETS = ('low', 'mid', 'high')
 
 def user_price_bucket(price, breaks=(0,20,100,1000)):
     # returns 'low','mid','high'
@@ -7,34 +10,66 @@ def user_price_bucket(price, breaks=(0,20,100,1000)):
     if price <= breaks[2]: return 'mid'
     return 'high'
 
-def compatibility_score(questionnaire: dict, products_meta: pd.DataFrame) -> pd.Series:
+def price_features(products_meta: pd.DataFrame, breaks=(0,20,100,1000)):
     """
-    Compute compatibility score between user questionnaire and each product.
-    Uses favorite categories, price sensitivity and preferred brands.
+    Per-product price features, computed once at build time.
+    returns: dict (price_bucket: int8 codes into PRICE_BUCKETS, price_norm: min-max normalized price)
+    """
+    price = products_meta['price']
+    filled = price.fillna(price.median()).values.astype(np.float64)
+    bucket = np.where(filled <= breaks[1], 0, np.where(filled <= breaks[2], 1, 2)).astype(np.int8)
+    norm = (filled - price.min()) / (price.max() - price.min() + 1e-9)
+    return {'price_bucket': bucket, 'price_norm': norm.astype(np.float32)}
+
+def compatibility_matrix(questionnaires: list, features: dict, cat_hits: np.ndarray, rows=None) -> np.ndarray:
+    """
+    Compatibility of many questionnaires at once.
+    features: price_features(); cat_hits: (Q, n) bool category matches; rows: optional candidate subset
+    returns: (Q, n) or (Q, len(rows)) scores in [0, 1]
     """
-    q = questionnaire
-    fav_cats = [c.lower() for c in q.get('favorite_categories', [])]
-    pref_brands = [b.lower() for b in q.get('preferred_brands', [])]
-    price_sensitivity = float(q.get('price_sensitivity', 1.0))
+    bucket, norm = features['price_bucket'], features['price_norm']
+    hits = np.atleast_2d(cat_hits)
+    if rows is not None:
+        bucket, norm, hits = bucket[rows], norm[rows], hits[:, rows]
+
+    has_fav = np.array([bool(q.get('favorite_categories')) for q in questionnaires])
+    levels = [(q.get('avg_price_level') or '').lower() for q in questionnaires]
+    has_level = np.array([bool(l) for l in levels])
+    user_bucket = np.array([PRICE_BUCKETS.index(l) if l in PRICE_BUCKETS else -1 for l in levels])
+    ps = np.array([float(q.get('price_sensitivity', 1.0)) for q in questionnaires])
 
     # category match
-    cats = products_meta['category'].fillna('').astype(str).str.lower()
-    cat_score = cats.apply(lambda c: 1.0 if any(fc in c for fc in fav_cats) else (0.6 if fav_cats else 0.8))
+    cat_score = np.where(hits, 1.0, np.where(has_fav, 0.6, 0.8)[:, None])
 
     # price match: if user price level is given, compute similarity
-    if q.get('avg_price_level'):
-        user_bucket = q['avg_price_level'].lower()  
-        price_bucket = products_meta['price'].fillna(products_meta['price'].median()).apply(lambda p: user_price_bucket(p))
-        price_score = price_bucket.apply(lambda pb: 1.0 if pb == user_bucket else (0.7 if (pb=='mid' or user_bucket=='mid') else 0.4))
-    else:
-        price_score = pd.Series(0.8, index=products_meta.index)
-
-    # price sensitivity: if user is price sensitive, boost low-priced items
-    ps = float(price_sensitivity)
-    #normalized rank
-    price_norm = (products_meta['price'].fillna(products_meta['price'].median()) - products_meta['price'].min()) / (products_meta['price'].max() - products_meta['price'].min() + 1e-9)
-    # lower price -> higher match if price sensitivity >1
-    price_sens_score = 1.0 - price_norm * (ps - 1) if ps >= 1 else 1.0 - price_norm * (ps*0.5)
+    same = bucket[None, :] == user_bucket[:, None]
+    mid = (bucket == 1)[None, :] | (user_bucket == 1)[:, None]
+    price_score = np.where(has_level[:, None], np.where(same, 1.0, np.where(mid, 0.7, 0.4)), 0.8)
+
+    # price sensitivity: lower price -> higher match if price sensitivity >1
+    coef = np.where(ps >= 1, ps - 1, ps * 0.5)
+    price_sens_score = 1.0 - norm[None, :] * coef[:, None]
 
     final = 0.5*cat_score + 0.3*price_score + 0.2*price_sens_score
-    return final.clip(0.0, 1.0)
+    return np.clip(final, 0.0, 1.0)
+
+def category_hits(questionnaire: dict, products_meta: pd.DataFrame, match_index=None) -> np.ndarray:
+    fav_cats = [c.lower() for c in questionnaire.get('favorite_categories', [])]
+    if match_index is not None:
+        return matching.category_mask(match_index, fav_cats)
+    cats = products_meta['category'].fillna('').astype(str).str.lower()
+    return cats.apply(lambda c: any(fc in c for fc in fav_cats)).values
+
+def compatibility_score(questionnaire: dict, products_meta: pd.DataFrame, match_index=None, features=None, rows=None) -> pd.Series:
+    """
+    Compute compatibility score between user questionnaire and each product.
+    Uses favorite categories, price sensitivity and preferred brands.
+    match_index / features: optional matching index and price_features() built from products_meta (same row order).
+    rows: optional candidate row subset to score.
+    """
+    if features is None:
+        features = price_features(products_meta)
+    hits = category_hits(questionnaire, products_meta, match_index)
+    scores = compatibility_matrix([questionnaire], features, hits[None, :], rows=rows)[0]
+    index = products_meta.index if rows is None else products_meta.index[rows]
+    return pd.Series(scores, index=index)
@@ -0,0 +1,368 @@
+"""
+Offline evaluation of the recommender blend over every user with a held-out review.
+
+    python -m app.recommender.evaluation --split leave_one_out --k 10 --grid-step 0.25 --lambdas 0.5 0.7 0.9
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from scipy.sparse import csr_matrix
+from . import collaborative, content, demographic, hybrid, matching, retrieval, serving
+from .ann import normalize_rows, dot_rows
+from ..config import EVAL_K, EVAL_CHUNK_USERS, EVAL_N_JOBS, RERANK_POOL, USER_ITEM_DIM
+
+CANDIDATE_DEPTH = 1000   # rows per candidate list of the grid search (see _candidates)
+
+# 1) split reviews: leave-one-out (a random reviewed product per user) or temporal (each user's latest review)
+# 2) item features refitted on the training split, so held-out reviews never reach them: product vectors /
+#    genome as in the build, and the serving CF component (item scores of SVD factors, the same for every user)
+# 3) per-user queries from the training history: intent = mean product vector of the reviewed products,
+#    favorite categories = their categories, price level = their most frequent price bucket
+# 4) users are scored in chunks of EVAL_CHUNK_USERS as (users x products) matrices on a thread pool. A chunk
+#    computes its three component matrices (and their per-user std) once and evaluates every grid point on
+#    them: blend, drop the user's training products, then re-rank on the path serving takes for the snapshot
+#    (serving.scoring_path) with content relevance: MMR over the whole catalog in blend order (exhaustive), or
+#    over the top RERANK_POOL of the blend (sharded / two-stage; every product is blended, so two-stage is
+#    evaluated without its candidate generation)
+# 5) recall@k / NDCG@k from a vectorized (users x k) hit matrix, catalog coverage from the recommended rows
+
+def split_reviews(reviews: pd.DataFrame, method='leave_one_out', time_col=None, seed=0):
+    """
+    Hold out one reviewed product of every user with at least two: a random one (leave_one_out) or the
+    latest by `time_col` (temporal). All reviews of a held-out (user, product) pair leave the training set.
+    returns: (train reviews, held-out pairs DataFrame with user_id / product_id)
+    """
+    if method == 'temporal':
+        if time_col is None:
+            raise ValueError("a temporal split needs time_col")
+        pairs = reviews.groupby(['user_id', 'product_id'], sort=False)[time_col].max().reset_index()
+        pairs = pairs.sort_values(time_col, kind='stable')
+        held = ~pairs.duplicated('user_id', keep='last').values
+    elif method == 'leave_one_out':
+        pairs = reviews[['user_id', 'product_id']].drop_duplicates()
+        pairs = pairs.iloc[np.random.default_rng(seed).permutation(len(pairs))]
+        held = ~pairs.duplicated('user_id', keep='first').values
+    else:
+        raise ValueError(f"unknown split {method!r}")
+    held &= pairs['user_id'].map(pairs['user_id'].value_counts()).values >= 2
+    test = pairs.loc[held, ['user_id', 'product_id']].reset_index(drop=True)
+    is_test = pd.MultiIndex.from_frame(reviews[['user_id', 'product_id']]).isin(pd.MultiIndex.from_frame(test))
+    return reviews[~is_test], test
+
+def user_matrices(snap, train: pd.DataFrame, test: pd.DataFrame):
+    """
+    Training history and held-out products as (users x product rows) CSR indicators, for the users with
+    both inside the snapshot's catalog.
+    returns: (sorted user ids, H, T)
+    """
+    index = pd.Index(snap.ids)
+
+    def pairs(df):
+        df = df[['user_id', 'product_id']].drop_duplicates()
+        rows = index.get_indexer(df['product_id'].astype(str))
+        return np.asarray(df['user_id'], dtype=object)[rows >= 0], rows[rows >= 0]
+
+    (hu, hr), (tu, tr) = pairs(train), pairs(test)
+    users = np.intersect1d(pd.unique(hu), pd.unique(tu)).astype(object)
+
+    def indicator(u, r):
+        code = collaborative.rows_of(users, u)
+        ok = code >= 0
+        return csr_matrix((np.ones(ok.sum(), dtype=np.float32), (code[ok], r[ok])), shape=(len(users), len(snap)))
+
+    return users, indicator(hu, hr), indicator(tu, tr)
+
+def item_features(snap, products: pd.DataFrame, train: pd.DataFrame, refit_genome=True) -> dict:
+    """
+    Item-side inputs fitted on the training split, row-aligned with the snapshot: product vectors and unit genome
+    (refitted as in the build; the snapshot's own, which saw the held-out reviews, unless refit_genome) and the
+    serving CF component, item scores of SVD factors (zeros when they cannot be fitted, as serving's PMI
+    fallback without explicit favorites).
+    returns: dict (vectors, genome, cf, leakage: features built with held-out reviews)
+    """
+    if refit_genome:
+        vecs = content.build_product_genome(products.reset_index(), train.reset_index(), force=True)[0]
+        vectors = vecs.reindex(snap.ids).fillna(0.0).values.astype(np.float32)
+        genome, leakage = normalize_rows(vectors), []
+    else:
+        vectors, genome, leakage = snap.vectors, snap.genome, ['genome']
+    R, user_ids, item_ids = collaborative.build_user_item_matrix(train)
+    try:
+        factors = collaborative.fit_svd_factors(R, user_ids, item_ids, n_components=USER_ITEM_DIM)
+        cf = collaborative.item_scores(factors).reindex(snap.ids).fillna(0.0).values.astype(np.float32)
+    except Exception:
+        cf = np.zeros(len(snap), dtype=np.float32)
+    return {'vectors': vectors, 'genome': genome, 'cf': cf, 'leakage': leakage}
+
+def user_inputs(snap, items: dict, users, H) -> dict:
+    """Query-level inputs of every evaluated user: unit intent vectors, price level, category indicator."""
+    deg = np.asarray(H.sum(axis=1)).ravel()
+    intents = normalize_rows((H @ items['vectors'].astype(np.float64)) / np.maximum(deg, 1)[:, None])
+    buckets = np.eye(len(demographic.PRICE_BUCKETS))[snap.price_features['price_bucket']]
+    level = np.asarray(H @ buckets).argmax(axis=1)
+    codes = snap.match_index['cat_codes']
+    cats = csr_matrix((np.ones(len(codes), dtype=np.float32), (np.arange(len(codes)), codes)),
+                      shape=(len(codes), matching.category_count(snap.match_index)))
+    return {'H': H, 'intents': intents, 'level': level, 'cats': cats}
+
+def weight_grid(step=0.25) -> list:
+    """Blend weights (content, cf, compatibility) on the simplex in increments of `step`."""
+    n = int(round(1 / step))
+    return [(a * step, b * step, (n - a - b) * step) for a in range(n + 1) for b in range(n + 1 - a)]
+
+def hit_metrics(recs: np.ndarray, T, k) -> tuple:
+    """
+    recs: (B, k) recommended rows (-1 padded); T: (B, n) CSR held-out products
+    returns: per user (recall@k, NDCG@k)
+    """
+    n = T.shape[1]
+    B = len(recs)
+    held = np.repeat(np.arange(B, dtype=np.int64), np.diff(T.indptr)) * n + T.indices
+    hits = np.isin(np.arange(B, dtype=np.int64)[:, None] * n + recs, held) & (recs >= 0)
+    n_held = np.diff(T.indptr)
+    discount = 1.0 / np.log2(np.arange(k) + 2.0)
+    ideal = np.cumsum(discount)[np.minimum(n_held, k) - 1]
+    return hits.sum(axis=1) / n_held, (hits @ discount[:hits.shape[1]]) / ideal
+
+def _compatibility(snap, qs, hits):
+    """
+    compatibility_matrix of the chunk's questionnaires, which leave price sensitivity at its default: the score
+    then only depends on (category hit, price bucket), so six values per user are computed and gathered.
+    returns: (B, n) scores, (B, 2, n_buckets) score per (hit, bucket) cell
+    """
+    B = len(demographic.PRICE_BUCKETS)
+    cell_hits = np.repeat([[False, True]], B, axis=1).repeat(len(qs), axis=0)
+    cells = demographic.compatibility_matrix(qs, {'price_bucket': np.tile(np.arange(B, dtype=np.int8), 2),
+                                                  'price_norm': np.zeros(2 * B)}, cell_hits).astype(np.float32)
+    cell = hits * np.int8(B) + snap.price_features['price_bucket'][None, :]
+    return np.take_along_axis(cells, cell, axis=1), cells.reshape(len(qs), 2, B)
+
+def _blend(M, w):
+    blended = w[0] * M[0]
+    for wi, m in zip(w[1:], M[1:]):
+        blended += wi * m
+    return blended
+
+def _blend_top(M, w, seen, pool) -> np.ndarray:
+    """Top `pool` rows of the blend per user, best first (ties by row). seen: (user, row) positions excluded"""
+    blended = _blend(M, w)
+    blended[seen] = -np.inf
+    return retrieval.select_rows(blended, pool)
+
+def _top_depth(m, cols, depth):
+    """Top-`depth` columns of m[:, cols] per user and the smallest score taken (-inf when all were taken)."""
+    d = min(depth, len(cols))
+    if d == 0:
+        return np.empty((len(m), 0), dtype=np.int64), np.full(len(m), -np.inf, dtype=np.float32)
+    sub = m[:, cols]
+    part = np.argpartition(sub, sub.shape[1] - d, axis=1)[:, -d:]
+    low = np.take_along_axis(sub, part, axis=1).min(axis=1)
+    return cols[part], (low if d < len(cols) else np.full(len(m), -np.inf)).astype(np.float32)
+
+def _candidates(M, hits, bucket_of, depth):
+    """
+    Union of the content and CF top-`depth` rows per user, within each price bucket and within the user's
+    category hits (sorted, repeats as -1). A row outside the union in cell (hit, bucket) scores at most the
+    depth-th largest of its lists in content and CF; returns those bounds as (B, 2, n_buckets) per component.
+    """
+    B = len(demographic.PRICE_BUCKETS)
+    n_hits = hits.sum(axis=1)
+    tops, bounds = [], []
+    for m in M[:2]:
+        by_bucket = [_top_depth(m, np.flatnonzero(bucket_of == b), depth) for b in range(B)]
+        # hits first: other rows shifted below every hit (not to -inf, ties would slow the partition down)
+        shifted = np.where(hits, m, m - (m.max() - m.min() + 1.0))
+        in_hits, _ = _top_depth(shifted, np.arange(m.shape[1]), depth)
+        taken = np.arange(in_hits.shape[1]) < n_hits[:, None]
+        order = np.argsort(-np.take_along_axis(shifted, in_hits, axis=1), axis=1)
+        in_hits = np.where(taken, np.take_along_axis(in_hits, order, axis=1), -1)
+        hit_low = np.take_along_axis(m, np.maximum(in_hits, 0), axis=1).min(axis=1, where=taken, initial=np.inf)
+        hit_low = np.where(n_hits > depth, hit_low, -np.inf).astype(np.float32)
+        tops += [t for t, _ in by_bucket] + [in_hits]
+        low = np.stack([l for _, l in by_bucket], axis=1)   # (users, buckets)
+        bounds.append(np.stack([low, np.minimum(low, hit_low[:, None])], axis=1))
+    cand = np.sort(np.concatenate(tops, axis=1), axis=1)
+    cand[:, 1:][cand[:, 1:] == cand[:, :-1]] = -1
+    return cand, bounds
+
+def _score_chunk(args):
+    snap, items, inp, T, s, e, weights, lambdas, k, pool, path = args
+    H = inp['H'][s:e]
+    genome = items['genome']
+    relevance = dot_rows(inp['intents'][s:e], genome)
+    cf = np.repeat(items['cf'][None, :], e - s, axis=0)
+    cat_hits = np.asarray((H @ inp['cats']).todense()) > 0
+    hits = cat_hits[:, snap.match_index['cat_codes']]
+    qs = [{'favorite_categories': [matching.category_path(snap.match_index, i) for i in np.flatnonzero(c)],
+           'avg_price_level': demographic.PRICE_BUCKETS[l]}
+          for c, l in zip(cat_hits, inp['level'][s:e])]
+    compat, cells = _compatibility(snap, qs, hits)
+    # blend_matrix up to a per-user constant (the z-score means), which leaves every ranking unchanged
+    M = [relevance.astype(np.float32, copy=False), cf, compat]
+    for m in M:
+        std = m.std(axis=1, dtype=np.float64)
+        scale = np.where(std > 0, 1.0 / (std + 1e-12), 0.0).astype(np.float32)
+        m *= scale[:, None]
+    cells *= scale[:, None, None]   # same float32 products as the compatibility scores
+    del cf
+    n = len(snap)
+    pool = min(pool, n)
+    rows = np.arange(e - s)
+    seen = H.nonzero()
+
+    # per grid point, blend only the candidate union; a user whose pool-th best candidate does not beat
+    # every cell's bound for the rows outside it gets the full blend. Building the union costs a few full
+    # blends, so small grids blend in full.
+    depth = CANDIDATE_DEPTH if 8 * CANDIDATE_DEPTH < n and pool <= CANDIDATE_DEPTH and len(weights) > 5 else 0
+    if path == 'exhaustive':
+        depth = 0
+        unseen = np.ones((e - s, n), dtype=bool)
+        unseen[seen] = False
+    if depth:
+        cand, bounds = _candidates(M, hits, snap.price_features['price_bucket'], depth)
+        invalid = (cand < 0) | np.isin(rows[:, None] * n + cand, seen[0].astype(np.int64) * n + seen[1])
+        Mc = [np.take_along_axis(m, np.maximum(cand, 0), axis=1) for m in M]
+    out = {}
+    for key in weights:
+        total = sum(key)
+        w = [np.float32(x / total if total > 0 else x) for x in key]   # normalized as in hybrid.blend_matrix
+        if path == 'exhaustive':
+            # every unseen product is a candidate, ties broken by the blend order
+            order = np.argsort(-_blend(M, w), axis=1, kind='stable')
+            for lam in lambdas:
+                recs = hybrid.mmr_indices(relevance, genome, k=k, lam=lam, mask=unseen, order=order)
+                out[(key, lam)] = _hits(recs, T[s:e], k, n)
+            continue
+        if not depth or min(w) < 0:
+            top = _blend_top(M, w, seen, pool)
+        else:
+            blended = _blend(Mc, w)
+            blended[invalid] = -np.inf
+            # candidates are in row order: ties at the cut go to the lowest rows, as in the full blend
+            part = retrieval.select_rows(blended, pool)
+            vals = np.take_along_axis(blended, part, axis=1)
+            top = np.take_along_axis(cand, part, axis=1)
+            # same float32 operations as the blend, so rounding keeps the bound an upper bound; empty lists: -inf
+            with np.errstate(invalid='ignore'):
+                bound = _blend([np.nan_to_num(b, neginf=0.0) for b in bounds] + [cells], w)
+            bound[(bounds[0] == -np.inf) | (bounds[1] == -np.inf)] = -np.inf
+            redo = np.flatnonzero(vals.min(axis=1) <= bound.max(axis=(1, 2)))
+            if len(redo):
+                keep = np.isin(seen[0], redo)
+                top[redo] = _blend_top([m[redo] for m in M], w, (np.searchsorted(redo, seen[0][keep]), seen[1][keep]), pool)
+        vecs = genome[top]
+        rel = np.take_along_axis(relevance, top, axis=1)
+        for lam in lambdas:
+            picks = hybrid.mmr_indices(rel, vecs, k=k, lam=lam,
+                                       sim=lambda best: np.matmul(vecs, vecs[rows, best][:, :, None])[:, :, 0])
+            recs = np.where(picks >= 0, np.take_along_axis(top, np.maximum(picks, 0), axis=1), -1)
+            out[(key, lam)] = _hits(recs, T[s:e], k, n)
+    return out
+
+def _hits(recs, T, k, n):
+    """(recall sum, ndcg sum, recommended rows mask) of a chunk's recommendations"""
+    recall, ndcg = hit_metrics(recs, T, k)
+    shown = np.zeros(n, dtype=bool)
+    shown[recs[recs >= 0]] = True
+    return recall.sum(), ndcg.sum(), shown
+
+def evaluate(snap, products: pd.DataFrame, train: pd.DataFrame, test: pd.DataFrame, weights=((0.45, 0.35, 0.20),),
+             lambdas=(0.7,), k=EVAL_K, pool=RERANK_POOL, chunk=EVAL_CHUNK_USERS, n_jobs=EVAL_N_JOBS, max_users=None,
+             seed=0, refit_genome=True) -> dict:
+    """
+    Grid search over blend weights x MMR lambda on a split from split_reviews().
+    products: the catalog the snapshot was built from; max_users: evaluate a random sample of users (all when None)
+    refit_genome: False scores with the snapshot's genome (faster, but it saw the held-out reviews)
+    returns: report dict; 'path': the serving path evaluated (pool: None when exhaustive), 'results' (recall@k,
+             ndcg@k, coverage per grid point) best NDCG first
+    """
+    t0 = time.perf_counter()
+    users, H, T = user_matrices(snap, train, test)
+    if max_users is not None and len(users) > max_users:
+        keep = np.sort(np.random.default_rng(seed).choice(len(users), size=max_users, replace=False))
+        users, H, T = users[keep], H[keep], T[keep]
+    if not len(users):
+        raise ValueError("no user with both training and held-out products in the catalog")
+    items = item_features(snap, products, train, refit_genome=refit_genome)
+    inp = user_inputs(snap, items, users, H)
+    t_inputs = time.perf_counter() - t0
+
+    weights = [tuple(float(x) for x in w) for w in weights]
+    path = serving.scoring_path(snap)
+    tasks = [(snap, items, inp, T, s, min(s + chunk, len(users)), weights, lambdas, k, pool, path)
+             for s in range(0, len(users), chunk)]
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs > 1 and len(tasks) > 1:
+        # numpy / BLAS release the GIL for the matrix work
+        with ThreadPoolExecutor(max_workers=n_jobs) as ex:
+            parts = list(ex.map(_score_chunk, tasks))
+    else:
+        parts = [_score_chunk(t) for t in tasks]
+
+    results = []
+    for key in itertools.product(weights, lambdas):
+        recall = sum(p[key][0] for p in parts)
+        ndcg = sum(p[key][1] for p in parts)
+        shown = np.logical_or.reduce([p[key][2] for p in parts])
+        results.append({'weights': list(key[0]), 'mmr_lambda': key[1], f"recall@{k}": round(float(recall / len(users)), 6),
+                        f"ndcg@{k}": round(float(ndcg / len(users)), 6), 'coverage': round(float(shown.mean()), 6)})
+    results.sort(key=lambda r: -r[f"ndcg@{k}"])
+    return {
+        'generation': snap.generation,
+        'users': int(len(users)),
+        'products': len(snap),
+        'k': k,
+        'path': path,
+        'pool': None if path == 'exhaustive' else min(pool, len(snap)),
+        'cf': 'item scores (serving), SVD fitted on the training split',
+        'leakage': items['leakage'],
+        'inputs_seconds': round(t_inputs, 3),
+        'seconds': round(time.perf_counter() - t0, 3),
+        'best': results[0],
+        'results': results,
+    }
+
+def main(argv=None):
+    from . import preprocessing
+    from .snapshot import Snapshot
+    p = argparse.ArgumentParser(prog='python -m app.recommender.evaluation', description=__doc__.strip().splitlines()[0])
+    p.add_argument('--split', choices=('leave_one_out', 'temporal'), default='leave_one_out')
+    p.add_argument('--time-col', help="review timestamp column (temporal split)")
+    p.add_argument('--k', type=int, default=EVAL_K)
+    p.add_argument('--weights', nargs='*', help="blend weights as content,cf,compatibility (default: the grid)")
+    p.add_argument('--grid-step', type=float, default=0.25, help="weight grid increment when --weights is not given")
+    p.add_argument('--lambdas', nargs='*', type=float, default=[0.7])
+    p.add_argument('--max-users', type=int, help="evaluate a random sample of users")
+    p.add_argument('--chunk', type=int, default=EVAL_CHUNK_USERS)
+    p.add_argument('--jobs', type=int, default=EVAL_N_JOBS)
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--reuse-genome', action='store_true',
+                   help="score with the snapshot's genome instead of refitting it on the training split (leaks)")
+    p.add_argument('--out', help="write the JSON report here (default: stdout)")
+    args = p.parse_args(argv)
+
+    weights = [tuple(float(x) for x in w.split(',')) for w in args.weights] if args.weights else weight_grid(args.grid_step)
+    if any(len(w) != 3 for w in weights):
+        p.error("--weights takes three comma separated numbers each")
+    snap = Snapshot.load()
+    products, reviews = preprocessing.load_and_split()
+    train, test = split_reviews(reviews, args.split, args.time_col, seed=args.seed)
+    report = evaluate(snap, products, train, test, weights=weights, lambdas=args.lambdas, k=args.k, chunk=args.chunk,
+                      n_jobs=args.jobs, max_users=args.max_users, seed=args.seed, refit_genome=not args.reuse_genome)
+    report['split'] = args.split
+    text = json.dumps(report, indent=1)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
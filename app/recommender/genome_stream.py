@@ -0,0 +1,196 @@
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from ..config import ARTIFACTS_DIR, TFIDF_MAX_FEATURES, SVD_DIM, GENOME_HASH_FEATURES, GENOME_BLOCK_ROWS, GENOME_N_JOBS
+
+# Genome build for large catalogs, same output contract as content.build_product_genome:
+# 1) review text / sentiment aggregated per product with array passes (no per-group Python lambda)
+# 2) text featurized by a stateless hashing vectorizer, one product block per task in a process pool;
+#    blocks are spilled to disk as CSR, only document / term frequencies come back to the parent
+# 3) column selection (min_df, max_features by term frequency) + idf + l2 norm applied per block
+# 4) randomized subspace iteration on X^T X over the spilled row blocks (only d x l matrices are held),
+#    Rayleigh-Ritz for the top SVD_DIM components, then a last pass projects every block
+
+TFIDF_MIN_DF = 3
+REVIEWS_PER_PRODUCT = 30
+OVERSAMPLE = 10
+N_ITER = 7
+
+def _hasher(n_features):
+    # token pattern / lowercasing / (1,2)-grams / raw counts as in the TfidfVectorizer of content.py
+    return HashingVectorizer(n_features=n_features, ngram_range=(1, 2), alternate_sign=False, norm=None, dtype=np.float32)
+
+class HashedTfidf:
+    """Hashing featurizer with fitted column selection and idf; stands in for the fitted TfidfVectorizer."""
+
+    def __init__(self, n_features, columns, idf):
+        self.n_features = n_features
+        self.columns = columns   # kept hashed columns, sorted
+        self.idf = idf
+        self._remap = None
+
+    def select(self, counts):
+        """Hashed count matrix -> l2-normalized tf-idf over the kept columns."""
+        if self._remap is None:
+            self._remap = np.full(self.n_features, -1, dtype=np.int32)
+            self._remap[self.columns] = np.arange(len(self.columns), dtype=np.int32)
+        counts = counts.tocsr()
+        cols = self._remap[counts.indices]
+        keep = cols >= 0
+        rows = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))[keep]
+        vals = counts.data[keep] * self.idf[cols[keep]]
+        X = sparse.csr_matrix((vals, (rows, cols[keep])), shape=(counts.shape[0], len(self.columns)), dtype=np.float32)
+        norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+        X.data /= np.repeat(np.where(norms > 0, norms, 1.0), np.diff(X.indptr)).astype(np.float32)
+        return X
+
+    def transform(self, texts):
+        return self.select(_hasher(self.n_features).transform(texts))
+
+    def __getstate__(self):
+        return {**self.__dict__, '_remap': None}
+
+class BlockSVD:
+    """Fitted right singular vectors; transform() as TruncatedSVD.transform."""
+
+    def __init__(self, components, singular_values):
+        self.components_ = components
+        self.singular_values_ = singular_values
+
+    def transform(self, X):
+        return np.asarray(X @ self.components_.T)
+
+def _aggregate_reviews(product_ids: pd.Index, reviews: pd.DataFrame):
+    """
+    First REVIEWS_PER_PRODUCT review texts per product (frame order) grouped by product row, and mean sentiment.
+    returns: (texts object array ordered by product row, offsets (n+1), mean sentiment (NaN without reviews))
+    """
+    codes = product_ids.get_indexer(reviews['product_id'])
+    n = len(product_ids)
+    known = codes >= 0
+    sentiment = reviews['sentiment'].to_numpy(dtype=float)
+    cnt = np.bincount(codes[known], minlength=n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_sent = np.bincount(codes[known], weights=sentiment[known], minlength=n) / cnt
+    pos = np.flatnonzero(known)
+    order = pos[np.argsort(codes[pos], kind='stable')]
+    sorted_codes = codes[order]
+    starts = np.searchsorted(sorted_codes, np.arange(n))
+    rank = np.arange(len(order)) - starts[sorted_codes]
+    order = order[rank < REVIEWS_PER_PRODUCT]
+    offsets = np.searchsorted(codes[order], np.arange(n + 1))
+    texts = reviews['review_text'].astype(str).to_numpy(dtype=object)[order]
+    return texts, offsets, mean_sent
+
+def _hash_block(args):
+    desc, rev_texts, rev_offsets, n_features, path = args
+    texts = [d + ' ' + ' '.join(rev_texts[a:b]) for d, a, b in zip(desc, rev_offsets[:-1], rev_offsets[1:])]
+    X = _hasher(n_features).transform(texts)
+    sparse.save_npz(path, X, compressed=False)
+    return np.bincount(X.indices, minlength=n_features), np.bincount(X.indices, weights=X.data, minlength=n_features)
+
+def _finish_block(args):
+    counts_path, tfidf, side, path = args
+    X = sparse.hstack([tfidf.select(sparse.load_npz(counts_path)), side], format='csr', dtype=np.float32)
+    sparse.save_npz(path, X, compressed=False)
+    os.remove(counts_path)
+
+def _gram_block(args):
+    path, Z = args
+    X = sparse.load_npz(path)
+    Y = X @ Z
+    return Y.T @ Y, np.asarray(X.T @ Y)
+
+def _project_block(args):
+    path, V = args
+    return np.asarray(sparse.load_npz(path) @ V)
+
+def _fit_transform_blocks(paths, d, n_components, mapper, seed=42):
+    """Randomized subspace iteration on X^T X over row blocks; returns (latent rows, BlockSVD)."""
+    l = min(n_components + OVERSAMPLE, d)
+    rng = np.random.default_rng(seed)
+    Z = np.linalg.qr(rng.standard_normal((d, l)))[0]
+
+    def gram(Z):
+        G, W = np.zeros((l, l)), np.zeros((d, l))
+        for g, w in mapper(_gram_block, [(p, Z) for p in paths]):
+            G += g
+            W += w
+        return G, W
+
+    for _ in range(N_ITER):
+        Z = np.linalg.qr(gram(Z)[1])[0]
+    # Rayleigh-Ritz: eigenpairs of Z^T X^T X Z give the top singular values / right vectors
+    G, _ = gram(Z)
+    lam, E = np.linalg.eigh(G)
+    top = np.argsort(-lam)[:n_components]
+    V = Z @ E[:, top]
+    # deterministic signs: largest-magnitude loading of each component positive
+    V *= np.sign(V[np.abs(V).argmax(axis=0), np.arange(V.shape[1])])
+    latent = np.vstack(list(mapper(_project_block, [(p, V) for p in paths])))
+    return latent, BlockSVD(V.T.copy(), np.sqrt(np.clip(lam[top], 0, None)))
+
+def build_product_genome_streaming(products: pd.DataFrame, reviews: pd.DataFrame, n_jobs=GENOME_N_JOBS,
+                                   block_rows=GENOME_BLOCK_ROWS, n_features=GENOME_HASH_FEATURES):
+    """
+    Same inputs / returns as content.build_product_genome (force=True):
+    product_vectors (DataFrame indexed by product_id), tfidf, svd, ohe, scaler, product index.
+    tfidf / svd are HashedTfidf / BlockSVD, usable by content.project_products.
+    n_jobs: worker processes (0 -> all cores, 1 -> in-process)
+    """
+    from .content import _numeric_features
+    n_jobs = n_jobs or os.cpu_count() or 1
+    products = products.set_index('product_id')
+    ids = products.index
+    n = len(ids)
+    rev_texts, rev_offsets, mean_sent = _aggregate_reviews(ids, reviews)
+    products['review_sentiment'] = mean_sent
+    desc = products['description'].fillna('').astype(str).to_numpy(dtype=object)
+
+    # numeric + category side features are small: fitted in-process
+    scaler = StandardScaler(with_mean=False)
+    X_num = scaler.fit_transform(_numeric_features(products, products['price'].median()).values)
+    ohe = OneHotEncoder(handle_unknown='ignore')
+    X_cat = ohe.fit_transform(products['category'].fillna('unknown').astype(str).values.reshape(-1, 1))
+    side = sparse.hstack([X_cat, sparse.csr_matrix(X_num)], format='csr', dtype=np.float32)
+
+    bounds = [(s, min(s + block_rows, n)) for s in range(0, n, block_rows)]
+    # spawn: builds run in a thread of the (multi-threaded) server, fork would copy its locks mid-use
+    pool = ProcessPoolExecutor(max_workers=n_jobs, mp_context=get_context('spawn')) \
+        if n_jobs > 1 and len(bounds) > 1 else None
+    mapper = pool.map if pool is not None else map
+    ARTIFACTS_DIR.mkdir(parents=True, exist_ok=True)
+    try:
+        with tempfile.TemporaryDirectory(prefix='.genome-', dir=ARTIFACTS_DIR) as tmp:
+            counts_paths = [os.path.join(tmp, f"counts-{i}.npz") for i in range(len(bounds))]
+            df = np.zeros(n_features, dtype=np.int64)
+            tf = np.zeros(n_features)
+            tasks = [(desc[s:e], rev_texts[rev_offsets[s]:rev_offsets[e]], rev_offsets[s:e + 1] - rev_offsets[s], n_features, p)
+                     for (s, e), p in zip(bounds, counts_paths)]
+            for block_df, block_tf in mapper(_hash_block, tasks):
+                df += block_df
+                tf += block_tf
+
+            # min_df, then the max_features most frequent columns; smooth idf as in TfidfVectorizer
+            cand = np.flatnonzero(df >= TFIDF_MIN_DF)
+            if len(cand) > TFIDF_MAX_FEATURES:
+                cand = np.sort(cand[np.argsort(-tf[cand], kind='stable')[:TFIDF_MAX_FEATURES]])
+            idf = (np.log((1 + n) / (1 + df[cand])) + 1).astype(np.float32)
+            tfidf = HashedTfidf(n_features, cand, idf)
+
+            paths = [os.path.join(tmp, f"block-{i}.npz") for i in range(len(bounds))]
+            list(mapper(_finish_block, [(cp, tfidf, side[s:e], p) for (s, e), cp, p in zip(bounds, counts_paths, paths)]))
+            latent, svd = _fit_transform_blocks(paths, len(cand) + side.shape[1], SVD_DIM, mapper)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    prod_index = list(ids)
+    prod_vecs = pd.DataFrame(latent.astype(np.float64), index=prod_index)
+    return prod_vecs, tfidf, svd, ohe, scaler, prod_index
@@ -1,6 +1,6 @@
 import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
+from .ann import normalize_rows, dot_rows
 
 def zscore(s: pd.Series):
     v = s.fillna(0.0).values
@@ -17,23 +17,78 @@ def blend(content_s: pd.Series, cf_s: pd.Series, compat_s: pd.Series, weights=(0
         w = w / w.sum()
     return w[0]*c + w[1]*f + w[2]*d
 
+def zscore_rows(M: np.ndarray):
+    """Row-wise zscore of a (B, n) score matrix (rows with zero spread become zeros)."""
+    M = np.atleast_2d(np.nan_to_num(np.asarray(M, dtype=np.float64)))
+    std = M.std(axis=1, keepdims=True)
+    return np.where(std == 0, 0.0, (M - M.mean(axis=1, keepdims=True)) / (std + 1e-12))
+
+def _blend_weights(weights):
+    w = np.atleast_2d(np.asarray(weights, dtype=float))
+    total = w.sum(axis=1, keepdims=True)
+    return np.where(total > 0, w / np.where(total > 0, total, 1.0), w)
+
+def blend_with_stats(scores, stats, weights):
+    """
+    `blend` of a candidate subset: (content, cf, compat) score vectors z-scored with given
+    catalog-wide (mean, std) pairs instead of statistics over the subset itself.
+    """
+    w = _blend_weights(weights)[0]
+    out = np.zeros(len(scores[0]))
+    for wi, v, (mean, std) in zip(w, scores, stats):
+        if std != 0:
+            out += wi * ((np.nan_to_num(np.asarray(v, dtype=np.float64)) - mean) / (std + 1e-12))
+    return out
+
+def blend_matrix(content_m, cf_m, compat_m, weights):
+    """Batched `blend`: (B, n) (or broadcastable (1, n)) score matrices, weights (B, 3)."""
+    w = _blend_weights(weights)
+    return w[:, [0]]*zscore_rows(content_m) + w[:, [1]]*zscore_rows(cf_m) + w[:, [2]]*zscore_rows(compat_m)
+
+def mmr_indices(relevance: np.ndarray, unit_vecs: np.ndarray, k=10, lam=0.7, mask=None, order=None, sim=None):
+    """
+    Incremental MMR over a pre-normalized candidate matrix, for a batch of queries.
+    relevance: (B, n) or (n,) scores; unit_vecs: (n, d) unit rows; mask: (B, n) valid candidates per query
+    lam: scalar or (B,) per query; order: optional (B, n) candidate order per query, used to break ties
+    sim: optional callable(picked rows (B,)) -> (B, n) similarities, e.g. scored against a quantized copy of unit_vecs
+    Keeps a running max-similarity per candidate (one matrix product per pick) and selects by masked argmax.
+    returns: (B, min(k, n)) picked rows, -1 where a query ran out of candidates
+    """
+    rel = np.atleast_2d(np.asarray(relevance, dtype=np.float64))
+    B, n = rel.shape
+    lam = np.broadcast_to(np.asarray(lam, dtype=np.float64).reshape(-1, 1), (B, 1))
+    avail = np.ones((B, n), dtype=bool) if mask is None else np.atleast_2d(mask).copy()
+    if order is not None:
+        rel = np.take_along_axis(rel, order, axis=1)
+        avail = np.take_along_axis(avail, order, axis=1)
+    rows = np.arange(B)
+    max_sim = np.zeros((B, n))  # no diversity penalty before the first pick
+    picks = np.full((B, min(k, n)), -1, dtype=np.int64)
+    for step in range(picks.shape[1]):
+        val = np.where(avail, lam * rel - (1 - lam) * max_sim, -np.inf)
+        pos = np.argmax(val, axis=1)
+        ok = avail[rows, pos]
+        if not ok.any():
+            break
+        best = pos if order is None else order[rows, pos]
+        picks[ok, step] = best[ok]
+        avail[rows[ok], pos[ok]] = False
+        sims = dot_rows(unit_vecs[best], unit_vecs) if sim is None else sim(best)  # (B, n)
+        if order is not None:
+            sims = np.take_along_axis(sims, order, axis=1)
+        max_sim = sims if step == 0 else np.maximum(max_sim, sims)
+    return picks
+
+def mmr_batch(candidates: list, relevance: list, item_vecs: pd.DataFrame, k=10, lam=0.7):
+    """Batched `mmr`: one candidate list and relevance Series per query, sharing one candidate matrix."""
+    union = pd.unique(np.concatenate([np.asarray(c, dtype=object) for c in candidates])) if candidates else []
+    unit = normalize_rows(item_vecs.reindex(union).fillna(0.0).values)
+    rel = np.vstack([r.reindex(union).fillna(0.0).values for r in relevance])
+    mask = np.vstack([pd.Index(union).isin(c) for c in candidates])
+    picks = mmr_indices(rel, unit, k=k, lam=lam, mask=mask)
+    return [[union[i] for i in row if i >= 0] for row in picks]
+
 def mmr(candidates: list, relevance: pd.Series, item_vecs: pd.DataFrame, k=10, lam=0.7):
-    selected = []
-    pool = list(candidates)
-    while pool and len(selected) < k:
-        best = None
-        best_val = -1e9
-        for pid in pool:
-            rel = float(relevance.get(pid, 0.0))
-            if not selected:
-                div = 0.0
-            else:
-                sims = cosine_similarity(item_vecs.loc[[pid]].values, item_vecs.loc[selected].values).ravel()
-                div = sims.max() if len(sims) else 0.0
-            val = lam * rel - (1-lam) * div
-            if val > best_val:
-                best_val = val
-                best = pid
-        selected.append(best)
-        pool.remove(best)
-    return selected
+    if len(candidates) == 0:
+        return []
+    return mmr_batch([candidates], [relevance], item_vecs, k=k, lam=lam)[0]
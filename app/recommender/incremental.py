@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+from ..config import GENOME_REFIT_DRIFT, CF_REFIT_DRIFT
+
+# Input fingerprints decide which build stages are stale:
+#   genome  - products that are new, changed, or whose reviews changed are re-projected with the
+#             stored transforms; a full refit only when the changed share crosses GENOME_REFIT_DRIFT
+#   collab  - CF factors are folded in and co-occurrence counts updated for the users whose reviews
+#             changed; a full refit only when the changed share crosses CF_REFIT_DRIFT
+# Each stage is 'reuse', 'delta' or 'full'.
+
+PRODUCT_FP_COLUMNS = ['product_name', 'category', 'description', 'price', 'discount', 'rating', 'rating_count']
+REVIEW_FP_COLUMNS = ['user_id', 'product_id', 'rating', 'review_text']
+
+def fingerprint_products(products: pd.DataFrame) -> np.ndarray:
+    cols = [c for c in PRODUCT_FP_COLUMNS if c in products.columns]
+    return pd.util.hash_pandas_object(products[cols], index=True).values
+
+def fingerprint_reviews(reviews: pd.DataFrame) -> np.ndarray:
+    cols = [c for c in REVIEW_FP_COLUMNS if c in reviews.columns]
+    return pd.util.hash_pandas_object(reviews[cols], index=False).values
+
+def fingerprints(products: pd.DataFrame, reviews: pd.DataFrame) -> dict:
+    return {
+        'products': fingerprint_products(products),
+        'reviews': fingerprint_reviews(reviews),
+        'review_users': reviews['user_id'].values,
+        'review_products': reviews['product_id'].values,
+    }
+
+def plan_build(prev, products: pd.DataFrame, reviews: pd.DataFrame, fp: dict, force=False) -> dict:
+    """
+    prev: previous generation (persistence.load_generation output) or None; fp: fingerprints(products, reviews)
+    returns: dict (genome, collab: 'reuse' | 'delta' | 'full', project_ids, changed_users, genome_drift, collab_drift)
+    """
+    plan = {'genome': 'full', 'collab': 'full', 'project_ids': [], 'changed_users': [],
+            'genome_drift': 1.0, 'collab_drift': 1.0}
+    old = prev['arrays'].get('fingerprints') if prev else None
+    if force or old is None or 'cooc' not in prev['arrays']:
+        return plan
+
+    # reviews: added / removed rows by content hash
+    added = ~np.isin(fp['reviews'], old['reviews'])
+    removed = ~np.isin(old['reviews'], fp['reviews'])
+    changed_users = set(fp['review_users'][added]) | set(old['review_users'][removed])
+    review_products = set(fp['review_products'][added]) | set(old['review_products'][removed])
+    plan['changed_users'] = sorted(changed_users)
+    plan['collab_drift'] = float(added.sum() + removed.sum()) / max(len(old['reviews']), 1)
+
+    # products: new / changed rows by hash, plus products whose reviews changed
+    before = pd.Series(old['products'], index=prev['arrays']['product_ids'])
+    now = pd.Series(fp['products'], index=products.index)
+    common = now.index.intersection(before.index)
+    changed = common[before.loc[common].values != now.loc[common].values]
+    stale = now.index.difference(before.index).union(changed)
+    stale = stale.union(now.index.intersection(pd.Index(list(review_products))))
+    n_removed = int((~before.index.isin(now.index)).sum())
+    plan['project_ids'] = list(stale)
+    plan['genome_drift'] = float(len(stale) + n_removed) / max(len(before), 1)
+
+    if plan['genome_drift'] == 0:
+        plan['genome'] = 'reuse'
+    elif plan['genome_drift'] <= GENOME_REFIT_DRIFT:
+        plan['genome'] = 'delta'
+    if plan['collab_drift'] == 0:
+        plan['collab'] = 'reuse'
+    elif plan['collab_drift'] <= CF_REFIT_DRIFT:
+        plan['collab'] = 'delta'
+    return plan
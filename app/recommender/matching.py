@@ -0,0 +1,150 @@
+import re
+import numpy as np
+import pandas as pd
+
+# Match index over the catalog, built once at /build time and shared by the
+# intent mask, the PMI seed lookup and the demographic category score:
+# 1) inverted index over the '|'-separated category path segments
+# 2) character trigram postings over normalized product names (multi-pattern substring matcher)
+# Queries return boolean row masks / row arrays aligned with the products frame.
+# Every array is numeric so a generation maps it instead of decoding it into each worker: strings are
+# utf-8 bytes + int64 offsets (item i is utf8[offsets[i]:offsets[i+1]]) and trigrams are packed into int64.
+
+NGRAM = 3
+
+def _grams(s: str):
+    return {s[i:i+NGRAM] for i in range(len(s) - NGRAM + 1)}
+
+def _gram_code(g: str) -> int:
+    """A trigram packed into one int64, 21 bits per code point (sorted codes keep a binary search)."""
+    code = 0
+    for c in g:
+        code = (code << 21) | ord(c)
+    return code
+
+def _encode(strings):
+    """returns: (utf-8 bytes as uint8, int64 offsets) of a string sequence"""
+    enc = [s.encode('utf-8') for s in strings]
+    offsets = np.concatenate([[0], np.cumsum([len(b) for b in enc], dtype=np.int64)]).astype(np.int64)
+    return np.frombuffer(b''.join(enc), dtype=np.uint8), offsets
+
+def _item(utf8, offsets, i) -> bytes:
+    return bytes(utf8[offsets[i]:offsets[i+1]])
+
+def _containing(utf8, offsets, p: bytes) -> np.ndarray:
+    """Items of an encoded string array containing `p` (sorted), from one scan of the byte buffer."""
+    if not p:
+        return np.arange(len(offsets) - 1)
+    # overlapping matches (lookahead), so a match running across an item boundary hides none inside the next item
+    starts = np.fromiter((m.start() for m in re.finditer(b'(?=' + re.escape(p) + b')', memoryview(utf8))),
+                         dtype=np.int64)
+    items = np.searchsorted(offsets, starts, side='right') - 1
+    return np.unique(items[starts + len(p) <= offsets[items + 1]])
+
+def _postings(keys, rows, n_keys):
+    """CSR postings (indptr, indices) from parallel key / row arrays."""
+    keys = np.asarray(keys, dtype=np.int64)
+    order = np.argsort(keys, kind='stable')
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(keys, minlength=n_keys))]).astype(np.int64)
+    return indptr, np.asarray(rows, dtype=np.int32)[order]
+
+def build_match_index(products: pd.DataFrame):
+    """
+    products: frame indexed by product_id with 'category' and 'product_name'.
+    returns: dict of arrays (category codes / segment postings, name trigram postings, encoded strings)
+    """
+    cats = products['category'].fillna('').astype(str).str.lower()
+    cat_codes, cat_vocab = pd.factorize(cats)
+    segments = {}
+    seg_keys, seg_cats = [], []
+    for code, path in enumerate(cat_vocab):
+        for seg in set(path.split('|')):
+            seg_keys.append(segments.setdefault(seg, len(segments)))
+            seg_cats.append(code)
+    seg_indptr, seg_postings = _postings(seg_keys, seg_cats, len(segments))
+    cat_utf8, cat_offsets = _encode(cat_vocab)
+    seg_utf8, seg_offsets = _encode(segments)
+
+    names = products['product_name'].fillna('').astype(str).str.lower().values
+    grams = {}
+    gram_keys, gram_rows = [], []
+    for row, name in enumerate(names):
+        for g in _grams(name):
+            gram_keys.append(grams.setdefault(_gram_code(g), len(grams)))
+            gram_rows.append(row)
+    # gram ids follow the sorted codes so lookups are a binary search over a plain array
+    gram_codes = np.asarray(sorted(grams), dtype=np.int64)
+    remap = np.empty(len(grams), dtype=np.int64)
+    remap[[grams[g] for g in gram_codes.tolist()]] = np.arange(len(grams))
+    gram_indptr, gram_postings = _postings(remap[np.asarray(gram_keys, dtype=np.int64)], gram_rows, len(grams))
+    names_utf8, names_offsets = _encode(names)
+
+    return {
+        'ids': np.asarray(products.index, dtype=object),
+        'cat_codes': cat_codes.astype(np.int32),
+        'cat_utf8': cat_utf8,
+        'cat_offsets': cat_offsets,
+        'seg_utf8': seg_utf8,
+        'seg_offsets': seg_offsets,
+        'seg_indptr': seg_indptr,
+        'seg_postings': seg_postings,
+        'names_utf8': names_utf8,
+        'names_offsets': names_offsets,
+        'gram_codes': gram_codes,
+        'gram_indptr': gram_indptr,
+        'gram_postings': gram_postings,
+    }
+
+def category_count(index) -> int:
+    return len(index['cat_offsets']) - 1
+
+def category_path(index, code) -> str:
+    """Lowercased category path of a category code."""
+    return _item(index['cat_utf8'], index['cat_offsets'], code).decode('utf-8')
+
+def category_codes(index, patterns) -> np.ndarray:
+    """Category codes whose lowercased path contains any of `patterns` as a substring (sorted)."""
+    codes = set()
+    for p in patterns:
+        p = p.lower().encode('utf-8')
+        if b'|' in p:
+            codes.update(_containing(index['cat_utf8'], index['cat_offsets'], p).tolist())
+            continue
+        indptr, post = index['seg_indptr'], index['seg_postings']
+        for s in _containing(index['seg_utf8'], index['seg_offsets'], p):
+            codes.update(post[indptr[s]:indptr[s+1]].tolist())
+    return np.asarray(sorted(codes), dtype=np.int64)
+
+def category_mask(index, patterns) -> np.ndarray:
+    """Rows whose lowercased category path contains any of `patterns` as a substring."""
+    return np.isin(index['cat_codes'], category_codes(index, patterns))
+
+def name_rows(index, pattern: str) -> np.ndarray:
+    """Rows whose lowercased product name contains `pattern` as a substring (only candidate names are read)."""
+    p = pattern.lower()
+    utf8, offsets = index['names_utf8'], index['names_offsets']
+    if len(p) < NGRAM:
+        return _containing(utf8, offsets, p.encode('utf-8')).astype(np.int64)
+    indptr, post, vocab = index['gram_indptr'], index['gram_postings'], index['gram_codes']
+    lists = []
+    for g in _grams(p):
+        code = _gram_code(g)
+        gid = np.searchsorted(vocab, code)
+        if gid == len(vocab) or vocab[gid] != code:
+            return np.empty(0, dtype=np.int64)
+        lists.append(post[indptr[gid]:indptr[gid+1]])
+    lists.sort(key=len)
+    cand = lists[0]
+    for lst in lists[1:]:
+        cand = np.intersect1d(cand, lst, assume_unique=True)
+        if not len(cand):
+            break
+    p = p.encode('utf-8')
+    return np.asarray([r for r in cand if p in _item(utf8, offsets, r)], dtype=np.int64)
+
+def name_mask(index, patterns) -> np.ndarray:
+    """Rows whose lowercased product name contains any of `patterns`."""
+    mask = np.zeros(len(index['cat_codes']), dtype=bool)
+    for p in patterns:
+        mask[name_rows(index, p)] = True
+    return mask
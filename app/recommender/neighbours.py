@@ -0,0 +1,124 @@
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from . import collaborative
+from ..config import NEIGHBOURS_TOP_N, NEIGHBOURS_BLOCK_MB, NEIGHBOURS_N_JOBS
+
+# Item-to-item neighbour table, built at /build time and shared by /similar and seed-based scoring:
+# 1) top-N content neighbours of every product: blocked float32 genome @ genome.T, row blocks sized to
+#    NEIGHBOURS_BLOCK_MB each, run on a thread pool (BLAS releases the GIL); per row, the k-th largest
+#    similarity within a column sample bounds the true k-th from below, so only the few columns above it are sorted
+# 2) merged with the PMI graph into one CSR table over product rows:
+#    indptr / indices / content cosine / pmi weight (0 when not a PMI neighbour) / source bits,
+#    each row ordered by content cosine
+
+CONTENT, PMI = 1, 2
+PAIR_BLOCK = 65536   # pairs per cosine block in build_table
+SAMPLE_COLUMNS = 4096
+
+def _block_top(args):
+    genome, s, e, k, sample = args
+    sims = genome[s:e] @ genome.T
+    sims[np.arange(e - s), np.arange(s, e)] = -np.inf   # not its own neighbour
+    bound = np.partition(sims[:, sample], -k, axis=1)[:, -k]
+    flat = np.flatnonzero(sims >= bound[:, None])
+    r, c = np.divmod(flat, sims.shape[1])
+    v = sims.ravel()[flat]
+    order = np.argsort(r * 4.0 - v, kind='stable')   # by row, then by cosine (in [-1, 1]) descending
+    r, c, v = r[order], c[order], v[order]
+    keep = np.arange(len(r)) - np.searchsorted(r, np.arange(e - s))[r] < k
+    return (r[keep] + s).astype(np.int32), c[keep].astype(np.int32), v[keep]
+
+def content_neighbours(genome: np.ndarray, top_n=NEIGHBOURS_TOP_N, block_mb=NEIGHBOURS_BLOCK_MB, n_jobs=NEIGHBOURS_N_JOBS):
+    """
+    Top-n rows by cosine for every row of the unit-normalized genome.
+    returns: (source rows, neighbour rows, cosines)
+    """
+    genome = np.asarray(genome, dtype=np.float32)
+    n = len(genome)
+    k = min(top_n, n - 1)
+    if k <= 0:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+    block = max(1, int(block_mb * 2**20) // (4 * n))
+    # k + 1 sampled columns at least: one of them may be the row itself
+    sample = np.unique(np.linspace(0, n - 1, min(n, max(SAMPLE_COLUMNS, 2 * (k + 1)))).astype(np.int64))
+    tasks = [(genome, s, min(s + block, n), k, sample) for s in range(0, n, block)]
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs > 1 and len(tasks) > 1:
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            parts = list(pool.map(_block_top, tasks))
+    else:
+        parts = [_block_top(t) for t in tasks]
+    return tuple(np.concatenate([p[i] for p in parts]) for i in range(3))
+
+def content_pairs(table):
+    """(source rows, neighbour rows, cosines) of the content neighbours held by a table (to reuse them unchanged)."""
+    is_content = (table['source'] & CONTENT) > 0
+    rows = np.repeat(np.arange(len(table['indptr']) - 1, dtype=np.int32), np.diff(table['indptr']))
+    return rows[is_content], table['indices'][is_content], table['content'][is_content]
+
+def build_table(genome: np.ndarray, content: tuple, pmi_graph: dict, ids) -> dict:
+    """
+    Merge content neighbour pairs with the PMI graph (items outside the catalog dropped).
+    ids: product id per genome row
+    returns: CSR table dict (indptr, indices, content, pmi, source)
+    """
+    n = len(genome)
+    adj = pmi_graph['adj'].tocoo()
+    item_rows = collaborative.rows_of(pmi_graph['item_ids'], np.asarray(ids, dtype=object))
+    row_of_item = np.full(adj.shape[0], -1, dtype=np.int64)
+    row_of_item[item_rows[item_rows >= 0]] = np.flatnonzero(item_rows >= 0)
+    pa, pb = row_of_item[adj.row], row_of_item[adj.col]
+    keep = (pa >= 0) & (pb >= 0)
+
+    # PMI pairs need their cosine; content pairs come with it
+    pa, pb = pa[keep], pb[keep]
+    pmi_cos = np.empty(len(pa), dtype=np.float32)
+    for s in range(0, len(pa), PAIR_BLOCK):
+        pmi_cos[s:s+PAIR_BLOCK] = np.einsum('ij,ij->i', genome[pa[s:s+PAIR_BLOCK]], genome[pb[s:s+PAIR_BLOCK]])
+    m = len(content[0])
+    a = np.concatenate([np.asarray(content[0], dtype=np.int64), pa])
+    b = np.concatenate([np.asarray(content[1], dtype=np.int64), pb])
+    cos = np.concatenate([np.asarray(content[2], dtype=np.float32), pmi_cos])
+    src = np.concatenate([np.full(m, CONTENT, np.uint8), np.full(len(pa), PMI, np.uint8)])
+    pmi = np.concatenate([np.zeros(m, np.float32), adj.data[keep].astype(np.float32)])
+
+    # both lists are duplicate free: a pair is at most listed twice, content first after a stable sort
+    order = np.argsort(a * n + b, kind='stable')
+    a, b, cos, src, pmi = a[order], b[order], cos[order], src[order], pmi[order]
+    dup = np.flatnonzero((a[1:] == a[:-1]) & (b[1:] == b[:-1])) + 1
+    src[dup - 1] |= src[dup]
+    pmi[dup - 1] = np.maximum(pmi[dup - 1], pmi[dup])
+    first = np.ones(len(a), dtype=bool)
+    first[dup] = False
+    a, b, cos, src, pmi = a[first], b[first], cos[first], src[first], pmi[first]
+
+    order = np.lexsort((-cos, a))   # stable: ties stay in neighbour row order
+    return {
+        'indptr': np.searchsorted(a[order], np.arange(n + 1)).astype(np.int64),
+        'indices': b[order].astype(np.int32),
+        'content': cos[order],
+        'pmi': pmi[order],
+        'source': src[order],
+    }
+
+def row(table, r):
+    """(neighbour rows, content cosines, pmi weights, source bits) of product row r, best content first."""
+    s, e = table['indptr'][r], table['indptr'][r + 1]
+    return table['indices'][s:e], table['content'][s:e], table['pmi'][s:e], table['source'][s:e]
+
+def seed_scores(table, seed_rows, kind=PMI):
+    """
+    Neighbours of `seed_rows` with the max weight over the seeds: PMI weight (kind=PMI) or content cosine.
+    returns: (rows sorted, scores)
+    """
+    seed_rows = np.asarray(seed_rows, dtype=np.int64)
+    if not len(seed_rows):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    indptr = table['indptr']
+    pos = np.concatenate([np.arange(indptr[r], indptr[r + 1]) for r in seed_rows])
+    pos = pos[(table['source'][pos] & kind) > 0]
+    rows, inv = np.unique(table['indices'][pos], return_inverse=True)
+    scores = np.full(len(rows), -np.inf, dtype=np.float32)
+    np.maximum.at(scores, inv, (table['pmi'] if kind == PMI else table['content'])[pos])
+    return rows.astype(np.int64), scores
@@ -1,12 +1,238 @@
-import joblib
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+import numpy as np
+import pandas as pd
+from scipy import sparse
 from pathlib import Path
-from ..config import ARTIFACTS_DIR
+from ..config import ARTIFACTS_DIR, ARTIFACT_KEEP_GENERATIONS
+
+# save / load: plain joblib pickles in ARTIFACTS_DIR.
+# Build outputs live in versioned generations:
+#   ARTIFACTS_DIR/generations/<generation>/  one .npy file per array (opened with mmap_mode),
+#                                           strings as utf-8 bytes + int64 offsets, CSR as data/indices/indptr,
+#                                           tables (product metadata) as one such file set per column,
+#                                           manifest.json with generation id, shapes, dtypes and sha256 checksums
+#                                           fitted build-time objects (e.g. genome transforms) as joblib files
+#   ARTIFACTS_DIR/CURRENT                   id of the latest complete generation (swapped atomically)
+GENERATIONS_DIR = ARTIFACTS_DIR / "generations"
+CURRENT = ARTIFACTS_DIR / "CURRENT"
+MANIFEST = "manifest.json"
+
+def _joblib():
+    # imported on first use: serving reads generations through this module but never pickles
+    import joblib
+    return joblib
 
 def save(obj, name: str):
     path = ARTIFACTS_DIR / name
-    joblib.dump(obj, path)
+    _joblib().dump(obj, path)
     return str(path)
 
 def load(name: str):
-    path = ARTIFACTS_DIR / name
-    return joblib.load(path)
+    return _joblib().load(ARTIFACTS_DIR / name)
+
+def _sha256(path: Path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _write_npy(root: Path, fname: str, arr, files: dict):
+    np.save(root / fname, np.ascontiguousarray(arr), allow_pickle=False)
+    files[fname] = _sha256(root / fname)
+
+def _write_entry(root: Path, name: str, value, files: dict):
+    if value is None:
+        return {'kind': 'none'}
+    if sparse.issparse(value):
+        value = value.tocsr()
+        for part in ('data', 'indices', 'indptr'):
+            _write_npy(root, f"{name}.{part}.npy", getattr(value, part), files)
+        return {'kind': 'csr', 'shape': list(value.shape)}
+    arr = np.asarray(value)
+    if arr.dtype.kind in 'biuf':
+        _write_npy(root, f"{name}.npy", arr, files)
+        return {'kind': 'ndarray', 'dtype': arr.dtype.str, 'shape': list(arr.shape)}
+    # strings: utf-8 bytes + offsets, nulls kept in a mask
+    null = pd.isna(arr)
+    enc = [b'' if n else str(v).encode('utf-8') for v, n in zip(arr, null)]
+    offsets = np.concatenate([[0], np.cumsum([len(b) for b in enc], dtype=np.int64)]).astype(np.int64)
+    _write_npy(root, f"{name}.offsets.npy", offsets, files)
+    _write_npy(root, f"{name}.utf8.npy", np.frombuffer(b''.join(enc), dtype=np.uint8), files)
+    entry = {'kind': 'strings', 'shape': [len(arr)]}
+    if null.any():
+        _write_npy(root, f"{name}.null.npy", null, files)
+        entry['nulls'] = True
+    return entry
+
+def _flatten(obj, prefix=''):
+    for key, value in obj.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, name + '.')
+        else:
+            yield name, value
+
+def _write_tables(root: Path, tables: dict, files: dict):
+    return {
+        tname: {
+            'index': {'name': df.index.name, **_write_entry(root, f"{tname}.__index__", df.index.values, files)},
+            'columns': {c: _write_entry(root, f"{tname}.{c}", df[c].values, files) for c in df.columns},
+        }
+        for tname, df in tables.items()
+    }
+
+def _read_tables(root: Path, manifest_tables: dict, mmap: bool):
+    tables = {}
+    for tname, t in manifest_tables.items():
+        index = pd.Index(_read_entry(root, f"{tname}.__index__", t['index'], mmap), name=t['index']['name'])
+        cols = {c: _read_entry(root, f"{tname}.{c}", e, mmap) for c, e in t['columns'].items()}
+        tables[tname] = pd.DataFrame(cols, index=index)
+    return tables
+
+def save_tables(root: Path, tables: dict, meta: dict = None):
+    """Write DataFrames column by column into `root` (replaced atomically), e.g. for parse caches."""
+    root = Path(root)
+    tmp = root.with_name(f".{root.name}.{uuid.uuid4().hex[:8]}.tmp")
+    tmp.mkdir(parents=True)
+    files = {}
+    manifest = {'created': time.time(), 'meta': meta or {}, 'files': files}
+    manifest['tables'] = _write_tables(tmp, tables, files)
+    with open(tmp / MANIFEST, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    shutil.rmtree(root, ignore_errors=True)
+    os.replace(tmp, root)
+    return str(root)
+
+def load_tables(root: Path, mmap=False):
+    """Tables written by save_tables, or None when `root` holds no complete table set."""
+    root = Path(root)
+    try:
+        with open(root / MANIFEST) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    return _read_tables(root, manifest['tables'], mmap)
+
+def write_generation(arrays: dict, tables: dict = None, meta: dict = None, objects: dict = None) -> str:
+    """
+    Write a new artifact generation and make it current.
+    arrays: (nested) dict of ndarrays / CSR matrices / string arrays / None
+    tables: dict of DataFrames stored column by column
+    objects: dict of picklable build-time objects (joblib), read back with load_object
+    returns: generation id
+    """
+    gen = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    GENERATIONS_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = GENERATIONS_DIR / f".{gen}.tmp"
+    tmp.mkdir()
+    files = {}
+    manifest = {'generation': gen, 'created': time.time(), 'meta': meta or {}, 'arrays': {}, 'tables': {}, 'files': files}
+    for name, value in _flatten(arrays):
+        manifest['arrays'][name] = _write_entry(tmp, name, value, files)
+    manifest['tables'] = _write_tables(tmp, tables or {}, files)
+    for oname, obj in (objects or {}).items():
+        _joblib().dump(obj, tmp / f"{oname}.joblib")
+        files[f"{oname}.joblib"] = _sha256(tmp / f"{oname}.joblib")
+    manifest['objects'] = sorted(objects or {})
+    with open(tmp / MANIFEST, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, GENERATIONS_DIR / gen)
+
+    pointer = ARTIFACTS_DIR / f".CURRENT.{gen}"
+    pointer.write_text(gen)
+    os.replace(pointer, CURRENT)
+    _prune(keep=ARTIFACT_KEEP_GENERATIONS)
+    return gen
+
+def _prune(keep: int):
+    gens = sorted(p for p in GENERATIONS_DIR.iterdir() if p.is_dir() and not p.name.startswith('.'))
+    current = current_generation()
+    for p in gens[:-keep] if keep > 0 else []:
+        if p.name != current:
+            shutil.rmtree(p, ignore_errors=True)
+
+def current_generation():
+    try:
+        return CURRENT.read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+def read_manifest(gen: str = None) -> dict:
+    gen = gen or current_generation()
+    if gen is None:
+        raise FileNotFoundError("no artifact generation has been built")
+    with open(GENERATIONS_DIR / gen / MANIFEST) as f:
+        return json.load(f)
+
+def load_object(name: str, gen: str = None):
+    """Build-time object stored with a generation (the current one by default)."""
+    gen = gen or current_generation()
+    if gen is None:
+        raise FileNotFoundError("no artifact generation has been built")
+    return _joblib().load(GENERATIONS_DIR / gen / f"{name}.joblib")
+
+def verify_generation(gen: str = None):
+    """Recompute checksums of every file of a generation; raises ValueError on mismatch."""
+    manifest = read_manifest(gen)
+    root = GENERATIONS_DIR / manifest['generation']
+    bad = [fname for fname, digest in manifest['files'].items() if _sha256(root / fname) != digest]
+    if bad:
+        raise ValueError(f"generation {manifest['generation']}: checksum mismatch in {bad}")
+    return manifest
+
+def _read_entry(root: Path, name: str, entry: dict, mmap: bool):
+    mode = 'r' if mmap else None
+    kind = entry['kind']
+    if kind == 'none':
+        return None
+    if kind == 'ndarray':
+        return np.load(root / f"{name}.npy", mmap_mode=mode)
+    if kind == 'csr':
+        parts = [np.load(root / f"{name}.{p}.npy", mmap_mode=mode) for p in ('data', 'indices', 'indptr')]
+        return sparse.csr_matrix(tuple(parts), shape=tuple(entry['shape']), copy=False)
+    offsets = np.load(root / f"{name}.offsets.npy")
+    buf = np.load(root / f"{name}.utf8.npy", mmap_mode=mode).tobytes()
+    out = np.array([buf[a:b].decode('utf-8') for a, b in zip(offsets[:-1], offsets[1:])], dtype=object)
+    if entry.get('nulls'):
+        out[np.load(root / f"{name}.null.npy")] = None
+    return out
+
+def _unflatten(flat: dict):
+    out = {}
+    for name, value in flat.items():
+        *parents, leaf = name.split('.')
+        node = out
+        for p in parents:
+            node = node.setdefault(p, {})
+        node[leaf] = value
+    return out
+
+def _selected(name: str, arrays) -> bool:
+    return arrays is None or any(name == a or name.startswith(a + '.') for a in arrays)
+
+def load_generation(gen: str = None, mmap=True, verify=False, arrays=None, tables=True) -> dict:
+    """
+    Open an artifact generation (the current one by default).
+    Numeric arrays are memory-mapped read-only, so workers share the page cache.
+    arrays: optional names (or dotted prefixes) of the arrays to open, all when None; tables: False skips the tables
+    returns: dict (generation, meta, arrays: nested dict as written, tables: dict of DataFrames)
+    """
+    manifest = verify_generation(gen) if verify else read_manifest(gen)
+    root = GENERATIONS_DIR / manifest['generation']
+    flat = {name: _read_entry(root, name, e, mmap) for name, e in manifest['arrays'].items() if _selected(name, arrays)}
+    tabs = _read_tables(root, manifest['tables'], mmap) if tables else {}
+    return {'generation': manifest['generation'], 'meta': manifest['meta'], 'arrays': _unflatten(flat), 'tables': tabs}
+
+def open_strings(name: str, gen: str = None):
+    """
+    A string array or table column ('table.column') of a generation without decoding it.
+    returns: (utf-8 bytes as a mapped uint8 array, int64 offsets); item i is utf8[offsets[i]:offsets[i+1]]
+    """
+    root = GENERATIONS_DIR / read_manifest(gen)['generation']
+    return np.load(root / f"{name}.utf8.npy", mmap_mode='r'), np.load(root / f"{name}.offsets.npy", mmap_mode='r')
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+from . import preprocessing, content, collaborative, demographic, incremental, matching, persistence, quantize, retrieval, neighbours
+from ..config import USER_ITEM_DIM, GENOME_QUANTIZATION
+
+BUILD_STAGES = ('load', 'genome', 'cf', 'pmi', 'indexes', 'neighbours', 'write')
+
+def _previous_generation():
+    if not persistence.current_generation():
+        return None
+    try:
+        return persistence.load_generation()
+    except Exception:
+        return None
+
+def run_build(force=False, progress=None) -> str:
+    """
+    Artifact build: Excel load, genome, CF, PMI, serving indexes, new artifact generation.
+    Unless `force`, input fingerprints against the current generation decide per stage whether
+    to reuse it, apply a delta (project / fold in only what changed) or refit from scratch.
+    progress: optional callback(stage, state, detail=None) with state in ('running', 'done')
+    returns: generation id
+    """
+    report = progress or (lambda stage, state, detail=None: None)
+
+    # Load & split
+    report('load', 'running')
+    products, reviews = preprocessing.load_and_prepare()
+    fp = incremental.fingerprints(products, reviews)
+    prev = None if force else _previous_generation()
+    plan = incremental.plan_build(prev, products, reviews, fp, force=force)
+    report('load', 'done')
+
+    # product genome (content vectors)
+    report('genome', 'running')
+    if plan['genome'] == 'full':
+        prod_vecs, tfidf, svd, ohe, scaler, prod_index = content.build_product_genome(products.reset_index(), reviews.reset_index(), force=True)
+        transforms = (tfidf, svd, ohe, scaler)
+    else:
+        transforms = persistence.load_object('genome_transforms', prev['generation'])
+        prod_vecs = pd.DataFrame(np.asarray(prev['arrays']['vectors']), index=prev['arrays']['product_ids'])
+        if plan['genome'] == 'delta' and len(plan['project_ids']):   # removals alone only reindex
+            projected = content.project_products(products.reset_index(), reviews.reset_index(), plan['project_ids'],
+                                                 transforms, price_median=products['price'].median())
+            prod_vecs = pd.concat([prod_vecs.drop(projected.index, errors='ignore'), projected])
+        prod_vecs = prod_vecs.reindex(products.index)
+    report('genome', 'done', plan['genome'])
+
+    report('cf', 'running')
+    cf_factors = None
+    prev_cf = prev['arrays']['cf'] if prev else None
+    if plan['collab'] == 'reuse' and prev_cf is not None:
+        cf_factors = prev_cf
+    elif plan['collab'] == 'delta' and prev_cf is not None:
+        R, user_ids, item_ids = collaborative.build_user_item_matrix(reviews, min_user_ratings=1)
+        cf_factors = collaborative.update_svd_factors(prev_cf, R, user_ids, item_ids, plan['changed_users'])
+    else:
+        R, user_ids, item_ids = collaborative.build_user_item_matrix(reviews, min_user_ratings=1)
+        try:
+            cf_factors = collaborative.fit_svd_factors(R, user_ids, item_ids, n_components=USER_ITEM_DIM)
+        except Exception:
+            cf_factors = None
+    report('cf', 'done', plan['collab'])
+
+    report('pmi', 'running')
+    if plan['collab'] == 'reuse':
+        cooc, pmi_graph = prev['arrays']['cooc'], prev['arrays']['pmi']
+    else:
+        if plan['collab'] == 'delta':
+            cooc = collaborative.update_item_cooccurrence(prev['arrays']['cooc'], reviews, plan['changed_users'])
+        else:
+            cooc = collaborative.build_item_cooccurrence(reviews)
+        pmi_graph = collaborative.pmi_from_cooccurrence(cooc)
+    report('pmi', 'done', plan['collab'])
+
+    report('indexes', 'running')
+    centroids = prev['arrays']['ann']['centroids'] if prev and plan['genome'] != 'full' else None
+    genome_index = content.build_genome_index(prod_vecs, centroids=centroids)
+    match_index = matching.build_match_index(products)
+    price = demographic.price_features(products)
+    quant = quantize.build(genome_index['genome'], GENOME_QUANTIZATION)
+    quant_report = quantize.recall_report(genome_index['genome'], quant) if quant is not None else None
+    cf_scores = None if cf_factors is None else \
+        collaborative.item_scores(cf_factors).reindex(genome_index['ids']).fillna(0.0).values.astype(np.float32)
+    popularity = reviews['product_id'].value_counts().reindex(genome_index['ids']).fillna(0).values
+    retrieval_index = retrieval.build_index(genome_index['genome'], prod_vecs.values.astype(np.float32), cf_scores,
+                                            price, match_index, popularity)
+    report('indexes', 'done')
+
+    report('neighbours', 'running')
+    prev_table = prev['arrays'].get('neighbours') if prev and plan['genome'] == 'reuse' else None
+    if prev_table is not None and np.array_equal(np.asarray(prev['arrays']['product_ids'], dtype=object), genome_index['ids']):
+        content_pairs, mode = neighbours.content_pairs(prev_table), 'reuse'
+    else:
+        content_pairs, mode = neighbours.content_neighbours(genome_index['genome']), 'full'
+    neighbour_table = neighbours.build_table(genome_index['genome'], content_pairs, pmi_graph, genome_index['ids'])
+    report('neighbours', 'done', mode)
+
+    report('write', 'running')
+    generation = persistence.write_generation({
+        'product_ids': genome_index['ids'],
+        'vectors': prod_vecs.values.astype(np.float32),
+        'genome': genome_index['genome'],
+        'ann': genome_index['ann'],
+        'quant': quant,
+        'match': match_index,
+        'price': price,
+        'cf': cf_factors,
+        'cf_scores': cf_scores,
+        'retrieval': retrieval_index,
+        'neighbours': neighbour_table,
+        'pmi': pmi_graph,
+        'cooc': cooc,
+        'fingerprints': fp,
+    }, tables={'products': products},
+       meta={'plan': {k: plan[k] for k in ('genome', 'collab', 'genome_drift', 'collab_drift')},
+             'parent': prev['generation'] if prev else None,
+             'quantization': quant_report},
+       objects={'genome_transforms': transforms})
+    report('write', 'done')
+    return generation
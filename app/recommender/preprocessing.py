@@ -1,60 +1,138 @@
+import hashlib
+import shutil
 import pandas as pd
+import numpy as np
 from typing import Tuple
 from pathlib import Path
-from ..utils import clean_text, safe_float, simple_sentiment
-from ..config import DATA_DIR
+from ..utils import clean_text, to_number, batch_sentiment
+from ..config import DATA_DIR, ARTIFACTS_DIR, PRODUCTS_CSV, REVIEWS_CSV, INGEST_CHUNK_ROWS, INGEST_CACHE_KEEP
+from . import persistence
 
 XLSX_PATH = DATA_DIR / "amazon.xlsx"
+INGEST_CACHE_DIR = ARTIFACTS_DIR / "ingest"
+# bump when the parsing below changes, so cached parses are not reused
+INGEST_VERSION = 1
 
-def load_and_split(xlsx_path: str = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    
-    path = Path(xlsx_path) if xlsx_path else XLSX_PATH
-    df = pd.read_excel(path, engine="openpyxl")  
+PROD_COLS = [
+    'product_id', 'product_name', 'category',
+    'discounted_price', 'actual_price', 'discount_percentage',
+    'rating', 'rating_count', 'about_product', 'img_link', 'product_link'
+]
+REVIEW_COLS = ['review_id', 'user_id', 'user_name', 'review_title', 'review_content', 'rating', 'product_id']
 
-    df.columns = [c.strip() for c in df.columns]
+def _read_chunks(path: Path, columns=None):
+    """Yield DataFrame chunks of a CSV / Parquet / Excel source."""
+    suffix = path.suffix.lower()
+    if suffix == '.csv':
+        yield from pd.read_csv(path, chunksize=INGEST_CHUNK_ROWS, usecols=lambda c: columns is None or c.strip() in columns)
+    elif suffix in ('.parquet', '.pq'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            yield pd.read_parquet(path)
+            return
+        pf = pq.ParquetFile(path)
+        cols = [c for c in pf.schema_arrow.names if columns is None or c.strip() in columns]
+        for batch in pf.iter_batches(batch_size=INGEST_CHUNK_ROWS, columns=cols):
+            yield batch.to_pandas()
+    else:
+        yield pd.read_excel(path, engine="openpyxl")
 
-    prod_cols = [
-        'product_id', 'product_name', 'category',
-        'discounted_price', 'actual_price', 'discount_percentage',
-        'rating', 'rating_count', 'about_product', 'img_link', 'product_link'
-    ]
-    present_prod_cols = [c for c in prod_cols if c in df.columns]
-    products = df[present_prod_cols].drop_duplicates(subset=['product_id']).set_index('product_id')
+def _product_rows(df: pd.DataFrame) -> pd.DataFrame:
+    present_prod_cols = [c for c in PROD_COLS if c in df.columns]
+    return df[present_prod_cols].drop_duplicates(subset=['product_id'])
 
-    # clean + add derived fields
-    products['product_name'] = products['product_name'].fillna('').astype(str)
-    products['about_product'] = products.get('about_product', '').fillna('').astype(str)
-    products['description'] = (products['product_name'] + ' ' + products['about_product']).map(clean_text)
-
-    def choose_price(row):
-        if 'actual_price' in row and not pd.isna(row['actual_price']):
-            return safe_float(row['actual_price'])
-        if 'discounted_price' in row and not pd.isna(row['discounted_price']):
-            return safe_float(row['discounted_price'])
-        return 0.0
-
-    products['price'] = products.apply(choose_price, axis=1)
-    products['discount'] = products.get('discount_percentage', 0).fillna(0).apply(safe_float)
-    products['rating'] = products.get('rating', 0).fillna(0).apply(safe_float)
-    products['rating_count'] = products.get('rating_count', 0).fillna(0).apply(lambda x: int(safe_float(x, 0)))
-
-    # Reviews dataframe
-    review_cols = ['review_id', 'user_id', 'user_name', 'review_title', 'review_content', 'rating', 'product_id']
-    present_review_cols = [c for c in review_cols if c in df.columns]
+def _review_rows(df: pd.DataFrame) -> pd.DataFrame:
+    present_review_cols = [c for c in REVIEW_COLS if c in df.columns]
     reviews = df[present_review_cols].copy()
     reviews = reviews.rename(columns={'review_content': 'review_text'})
     if 'review_text' not in reviews.columns:
         reviews['review_text'] = ''
 
     reviews['product_id'] = reviews['product_id'].astype(str)
-    reviews['user_id'] = reviews['user_id'].astype(str).fillna('anon')
-    reviews['rating'] = reviews.get('rating', 0).apply(safe_float)
+    reviews['user_id'] = reviews['user_id'].fillna('anon').astype(str)
+    reviews['rating'] = to_number(reviews['rating']).fillna(0.0) if 'rating' in reviews.columns else 0.0
     reviews['review_text'] = reviews['review_text'].fillna('').astype(str)
-    reviews['sentiment'] = reviews['review_text'].apply(simple_sentiment)
+    reviews['sentiment'] = batch_sentiment(reviews['review_text'])
+    return reviews
+
+def _finish_products(products: pd.DataFrame) -> pd.DataFrame:
+    products = products.drop_duplicates(subset=['product_id']).copy()
+    products['product_id'] = products['product_id'].astype(str)
+    products = products.set_index('product_id')
+
+    # clean + add derived fields
+    products['product_name'] = products['product_name'].fillna('').astype(str)
+    products['about_product'] = products.get('about_product', pd.Series('', index=products.index)).fillna('').astype(str)
+    products['description'] = (products['product_name'] + ' ' + products['about_product']).map(clean_text)
+
+    def num(col):
+        return to_number(products[col]) if col in products.columns else pd.Series(np.nan, index=products.index)
+
+    # list price when present, else the discounted price
+    products['price'] = num('actual_price').fillna(num('discounted_price')).fillna(0.0)
+    products['discount'] = num('discount_percentage').fillna(0.0)
+    products['rating'] = num('rating').fillna(0.0)
+    products['rating_count'] = num('rating_count').fillna(0.0).astype(np.int64)
+    return products
+
+def _default_sources():
+    if PRODUCTS_CSV.exists() and REVIEWS_CSV.exists():
+        return PRODUCTS_CSV, REVIEWS_CSV
+    return XLSX_PATH, None
+
+def _source_key(paths) -> str:
+    h = hashlib.sha256(f"v{INGEST_VERSION}".encode())
+    for p in paths:
+        h.update(p.name.encode())
+        with open(p, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    return h.hexdigest()[:32]
+
+def _prune_cache(keep: int):
+    entries = sorted((p for p in INGEST_CACHE_DIR.iterdir() if p.is_dir() and not p.name.startswith('.')),
+                     key=lambda p: p.stat().st_mtime)
+    for p in entries[:-keep] if keep > 0 else []:
+        shutil.rmtree(p, ignore_errors=True)
+
+def parse_sources(path: Path, reviews_path: Path = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Parse a combined source (products + reviews per row) or separate product / review sources, chunk by chunk."""
+    if reviews_path is None:
+        prod_parts, review_parts = [], []
+        for chunk in _read_chunks(path, set(PROD_COLS) | set(REVIEW_COLS)):
+            chunk.columns = [c.strip() for c in chunk.columns]
+            prod_parts.append(_product_rows(chunk))
+            review_parts.append(_review_rows(chunk))
+    else:
+        prod_parts = [_product_rows(c.rename(columns=str.strip)) for c in _read_chunks(path, set(PROD_COLS))]
+        review_parts = [_review_rows(c.rename(columns=str.strip)) for c in _read_chunks(reviews_path, set(REVIEW_COLS))]
+    products = _finish_products(pd.concat(prod_parts, ignore_index=True))
+    reviews = pd.concat(review_parts, ignore_index=True)
+    return products, reviews
+
+def load_and_split(path: str = None, reviews_path: str = None, use_cache=True) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Load products / reviews from CSV, Parquet or Excel (default: PRODUCTS_CSV + REVIEWS_CSV when both exist,
+    else data/amazon.xlsx). Parsed output is cached column by column under ARTIFACTS_DIR/ingest, keyed by
+    the hash of the source files, so repeated builds on unchanged sources skip parsing.
+    """
+    if path:
+        sources = (Path(path), Path(reviews_path) if reviews_path else None)
+    else:
+        sources = _default_sources()
+    cache_dir = INGEST_CACHE_DIR / _source_key([p for p in sources if p is not None])
+    if use_cache:
+        cached = persistence.load_tables(cache_dir)
+        if cached is not None:
+            return cached['products'], cached['reviews']
 
-    products = products.reset_index().set_index('product_id')
+    products, reviews = parse_sources(*sources)
+    if use_cache:
+        persistence.save_tables(cache_dir, {'products': products, 'reviews': reviews})
+        _prune_cache(keep=INGEST_CACHE_KEEP)
     return products, reviews
 
-def load_and_prepare(xlsx_path: str = None):
-    products, reviews = load_and_split(xlsx_path)
+def load_and_prepare(path: str = None, reviews_path: str = None):
+    products, reviews = load_and_split(path, reviews_path)
     return products, reviews
@@ -0,0 +1,129 @@
+import numpy as np
+from .ann import normalize_rows, dot_rows
+from ..config import QUANT_RERANK, PQ_SUBSPACES, PQ_CENTROIDS
+
+# Quantized copies of the unit-normalized genome, built at /build time:
+# - int8: per-dimension scale, x ~= codes * scales (4x smaller than float32)
+# - pq:   product quantization, PQ_SUBSPACES sub-vectors each coded by one of PQ_CENTROIDS centroids (uint8 codes)
+# Intent vectors stay float (asymmetric distance): int8 scores are one (blocked) matmul against the codes,
+# pq scores sum per-subspace lookup tables. rescore() replaces the top candidates by exact float scores.
+# int8 blocks are widened into one float buffer small enough to stay in cache, so memory traffic is the
+# int8 codes (a quarter of the float genome's); numpy has no fast integer matmul to skip the widening.
+
+BLOCK_ROWS = 32768
+INT8_BLOCK_BYTES = 1 << 18   # float32 widening buffer of the int8 scorer (L2-sized)
+
+def build_int8(genome: np.ndarray):
+    scales = np.abs(genome).max(axis=0) / 127.0
+    scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    codes = np.clip(np.rint(genome / scales), -127, 127).astype(np.int8)
+    return {'codes': codes, 'scales': scales}
+
+def _kmeans(X, k, n_iter, rng):
+    C = X[rng.choice(len(X), size=k, replace=len(X) < k)].copy()
+    for _ in range(n_iter):
+        assign = _nearest(X, C)
+        sums = np.zeros_like(C)
+        np.add.at(sums, assign, X)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        C = np.where(empty[:, None], X[rng.choice(len(X), size=k)], sums / np.maximum(counts, 1)[:, None])
+    return C.astype(np.float32)
+
+def _nearest(X, C):
+    out = np.empty(len(X), dtype=np.int64)
+    c2 = (C * C).sum(axis=1)
+    for s in range(0, len(X), BLOCK_ROWS):
+        out[s:s+BLOCK_ROWS] = np.argmin(c2[None, :] - 2.0 * (X[s:s+BLOCK_ROWS] @ C.T), axis=1)
+    return out
+
+def build_pq(genome: np.ndarray, m=PQ_SUBSPACES, k=PQ_CENTROIDS, n_iter=10, sample=65536, seed=42):
+    n, d = genome.shape
+    if d % m:
+        raise ValueError(f"genome dimension {d} is not divisible into {m} PQ subspaces")
+    rng = np.random.default_rng(seed)
+    train = genome[rng.choice(n, size=min(n, sample), replace=False)]
+    ds = d // m
+    codebooks = np.empty((m, min(k, len(train)), ds), dtype=np.float32)
+    codes = np.empty((n, m), dtype=np.uint8)
+    for j in range(m):
+        codebooks[j] = _kmeans(train[:, j*ds:(j+1)*ds], codebooks.shape[1], n_iter, rng)
+        codes[:, j] = _nearest(genome[:, j*ds:(j+1)*ds], codebooks[j])
+    return {'codes': codes, 'codebooks': codebooks}
+
+def build(genome: np.ndarray, kind: str):
+    """Quantized genome of `kind` ('int8' / 'pq'), or None for 'none'."""
+    if kind == 'none':
+        return None
+    if kind == 'int8':
+        return build_int8(genome)
+    if kind == 'pq':
+        return build_pq(genome)
+    raise ValueError(f"unknown genome quantization {kind!r}")
+
+def kind_of(quant) -> str:
+    if quant is None:
+        return 'none'
+    return 'pq' if 'codebooks' in quant else 'int8'
+
+def scores(quant, Q: np.ndarray) -> np.ndarray:
+    """Approximate Q @ genome.T for a (B, d) float block of query vectors."""
+    Q = np.atleast_2d(np.asarray(Q, dtype=np.float32))
+    codes = quant['codes']
+    n = len(codes)
+    out = np.empty((len(Q), n), dtype=np.float32)
+    if 'scales' in quant:
+        Qs = Q * quant['scales']
+        rows = max(1, INT8_BLOCK_BYTES // (4 * codes.shape[1]))
+        buf = np.empty((min(rows, n), codes.shape[1]), dtype=np.float32)
+        for s in range(0, n, rows):
+            block = buf[:len(codes[s:s+rows])]
+            np.copyto(block, codes[s:s+rows], casting='unsafe')
+            out[:, s:s+rows] = dot_rows(Qs, block)
+        return out
+    books = quant['codebooks']
+    m, _, ds = books.shape
+    # lookup tables (B, m, k): query sub-vector . centroid
+    lut = np.einsum('bmd,mkd->bmk', Q.reshape(len(Q), m, ds), books)
+    for s in range(0, n, BLOCK_ROWS):
+        block = codes[s:s+BLOCK_ROWS]
+        acc = np.zeros((len(Q), len(block)), dtype=np.float32)
+        for j in range(m):
+            acc += lut[:, j, :][:, block[:, j]]
+        out[:, s:s+BLOCK_ROWS] = acc
+    return out
+
+def top_rows(approx: np.ndarray, r: int) -> np.ndarray:
+    """(B, r) rows with the highest approximate scores per query (unordered)."""
+    r = min(r, approx.shape[1])
+    return np.argpartition(-approx, r - 1, axis=1)[:, :r]
+
+def rescore(approx: np.ndarray, Q: np.ndarray, genome: np.ndarray, r=QUANT_RERANK) -> np.ndarray:
+    """Approximate score matrix with each query's top-r rows replaced by exact float scores (in place)."""
+    rows = top_rows(approx, r)
+    exact = np.einsum('bd,brd->br', np.asarray(Q, dtype=np.float32), genome[rows])
+    np.put_along_axis(approx, rows, exact, axis=1)
+    return approx
+
+def recall_report(genome: np.ndarray, quant, n_queries=200, ks=(10, 100), r=QUANT_RERANK, seed=0) -> dict:
+    """
+    Recall of quantized scoring against exact cosine top-k, for intent-like queries
+    (normalized means of two random products), with and without exact re-scoring of the top r.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(genome)
+    Q = normalize_rows(genome[rng.integers(n, size=n_queries)] + genome[rng.integers(n, size=n_queries)])
+    exact = dot_rows(Q, genome)
+    approx = scores(quant, Q)
+    reranked = rescore(approx.copy(), Q, genome, r)
+    report = {'kind': kind_of(quant), 'queries': n_queries, 'rerank': int(min(r, n)),
+              'bytes': int(sum(v.nbytes for v in quant.values())), 'float32_bytes': int(genome.astype(np.float32).nbytes)}
+    report['compression'] = round(report['float32_bytes'] / report['bytes'], 2)
+    for k in ks:
+        k = min(k, n)
+        truth = top_rows(exact, k)
+        for name, S in (('adc', approx), ('rescored', reranked)):
+            got = top_rows(S, k)
+            hits = [len(np.intersect1d(a, b, assume_unique=True)) for a, b in zip(truth, got)]
+            report[f"recall@{k}_{name}"] = round(float(np.mean(hits)) / k, 4)
+    return report
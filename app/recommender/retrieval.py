@@ -0,0 +1,196 @@
+import numpy as np
+from . import demographic, matching, neighbours
+from .ann import normalize_rows, search
+from ..config import (RETRIEVAL_CONTENT_TOP, RETRIEVAL_CATEGORY_TOP, RETRIEVAL_NEIGHBOURS, RETRIEVAL_POPULAR,
+                      RERANK_POOL)
+
+# Two-stage /recommend for large catalogs:
+# 1) cheap retrievers produce a bounded, de-duplicated candidate row set per query: content top-M (IVF search),
+#    category postings (most reviewed first), explicit favorites and their content / PMI neighbours (neighbour
+#    table), globally popular rows
+# 2) content / CF / compatibility are scored on the candidates only and z-scored with catalog-wide statistics
+#    derived from build-time sums (genome mean and Gram matrix, per category x price bucket moments), so the
+#    blend matches the exhaustive one; the top RERANK_POOL rows (ties by row) are picked by a partition and MMR
+#    runs on those.
+
+def build_index(genome, vectors, cf_scores, price: dict, match_index: dict, popularity):
+    """
+    Build-time sums and postings behind two-stage serving, row-aligned with the genome.
+    popularity: review count per product row
+    returns: dict of arrays
+    """
+    codes = match_index['cat_codes'].astype(np.int64)
+    n_cats = matching.category_count(match_index)
+    G = np.asarray(genome, dtype=np.float64)
+    n = len(G)
+
+    cat_vec_sum = np.zeros((n_cats, vectors.shape[1]))
+    np.add.at(cat_vec_sum, codes, np.asarray(vectors, dtype=np.float64))
+    # price moments per (category, price bucket): count, sum of price_norm, sum of price_norm^2
+    norm = price['price_norm'].astype(np.float64)
+    cell = codes * len(demographic.PRICE_BUCKETS) + price['price_bucket']
+    size = n_cats * len(demographic.PRICE_BUCKETS)
+    moments = np.stack([np.bincount(cell, weights=w, minlength=size) for w in (np.ones(n), norm, norm * norm)], axis=1)
+
+    popularity = np.asarray(popularity, dtype=np.float64)
+    by_pop = np.lexsort((np.arange(n), -popularity))
+    cat_rows = by_pop[np.argsort(codes[by_pop], kind='stable')]
+    popular = [by_pop[:RETRIEVAL_POPULAR]]
+    if cf_scores is not None:
+        popular.append(np.argsort(-np.asarray(cf_scores), kind='stable')[:RETRIEVAL_POPULAR])
+        cf = np.asarray(cf_scores, dtype=np.float64)
+        cf_stats = np.array([cf.mean(), cf.std()])
+    else:
+        cf_stats = np.array([np.nan, np.nan])
+    return {
+        'genome_mean': G.mean(axis=0),
+        'genome_gram': (G.T @ G) / max(n, 1),
+        'cf_stats': cf_stats,
+        'cat_counts': np.bincount(codes, minlength=n_cats).astype(np.int64),
+        'cat_vec_sum': cat_vec_sum,
+        'cat_price_moments': moments.reshape(n_cats, len(demographic.PRICE_BUCKETS), 3),
+        'cat_indptr': np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=n_cats))]).astype(np.int64),
+        'cat_rows': cat_rows.astype(np.int32),
+        'popularity': popularity.astype(np.float32),
+        'popular': np.unique(np.concatenate(popular)).astype(np.int32),
+    }
+
+def _std(mean, ex2):
+    """Population std from E[x] / E[x^2]; spreads lost in rounding count as zero (as in hybrid.zscore_rows)."""
+    var = ex2 - mean * mean
+    return float(np.sqrt(var)) if var > 1e-12 * max(abs(ex2), 1e-300) else 0.0
+
+def intent(snap, q: dict):
+    """
+    Matched category codes, rows matching explicit favorites, and the mean genome vector of the
+    intent products (catalog mean when none match), from per-category sums instead of a catalog mask.
+    """
+    mi, st = snap.match_index, snap.retrieval
+    codes = matching.category_codes(mi, q['favorite_categories']) if q.get('favorite_categories') \
+        else np.empty(0, dtype=np.int64)
+    favs = set(e.lower() for e in q.get('explicit_favorites') or [])
+    named = np.unique(np.concatenate([matching.name_rows(mi, p) for p in favs] or [np.empty(0, np.int64)]))
+    extra = named[~np.isin(mi['cat_codes'][named], codes)]
+    count = st['cat_counts'][codes].sum() + len(extra)
+    if count == 0:
+        return codes, named, snap.vector_mean
+    total = st['cat_vec_sum'][codes].sum(axis=0) + snap.vectors[extra].sum(axis=0, dtype=np.float64)
+    return codes, named, (total / count).astype(np.float32)
+
+def content_stats(st, unit_intent) -> tuple:
+    """Catalog mean / std of genome . intent."""
+    q = np.asarray(unit_intent, dtype=np.float64)
+    mean = float(q @ st['genome_mean'])
+    return mean, _std(mean, float(q @ st['genome_gram'] @ q))
+
+def compat_stats(st, q: dict, codes, n) -> tuple:
+    """
+    Catalog mean / std of the compatibility score. Within a (category hit, price bucket) cell the score is
+    linear in price_norm, so it follows from the per-cell moments; None when clipping breaks linearity.
+    """
+    B = len(demographic.PRICE_BUCKETS)
+    hits = np.repeat([True, False], B)[None, :]
+    buckets = np.tile(np.arange(B, dtype=np.int8), 2)
+    f0, fh, f1 = (demographic.compatibility_matrix([q], {'price_bucket': buckets, 'price_norm': np.full(2 * B, x)}, hits)[0]
+                  for x in (0.0, 0.5, 1.0))
+    if not np.allclose(fh, (f0 + f1) / 2, rtol=0, atol=1e-9):
+        return None
+    moments = st['cat_price_moments']
+    hit = moments[codes].sum(axis=0)
+    m = np.concatenate([hit, moments.sum(axis=0) - hit])   # (2B, 3): hit cells, then the rest
+    a, c = f0, f1 - f0
+    total = (m[:, 0] * a + m[:, 1] * c).sum()
+    sq = (m[:, 0] * a * a + 2 * a * c * m[:, 1] + c * c * m[:, 2]).sum()
+    mean = total / n
+    return mean, _std(mean, sq / n)
+
+def seed_rows(match_index, q: dict) -> np.ndarray:
+    """Rows whose product name contains one of the (non-blank) explicit favorites."""
+    seeds = [s.lower() for s in q.get('explicit_favorites', []) if s.strip()]
+    return np.unique(np.concatenate([matching.name_rows(match_index, s) for s in seeds] or [np.empty(0, np.int64)]))
+
+def pmi_neighbours(snap, q: dict):
+    """Product rows reachable by PMI from the explicit favorites, with their fallback CF score (max PMI weight)."""
+    return neighbours.seed_scores(snap.neighbours, seed_rows(snap.match_index, q))
+
+def _top(rows, scores, cap):
+    if len(rows) > cap:
+        rows = rows[np.argpartition(-scores, cap - 1)[:cap]]
+    return rows
+
+def pmi_at(pmi, rows) -> np.ndarray:
+    """Fallback CF score of sorted `rows` given pmi_neighbours() (0 outside the neighbours)."""
+    n_rows, n_scores = pmi
+    if not len(n_rows):
+        return np.zeros(len(rows), dtype=np.float32)
+    pos = np.clip(np.searchsorted(n_rows, rows), 0, len(n_rows) - 1)
+    return np.where(n_rows[pos] == rows, n_scores[pos], 0.0).astype(np.float32)
+
+def prepare(snap, q: dict) -> dict:
+    """
+    Query-level inputs of candidate scoring: matched category codes, favorite rows, unit intent vector,
+    PMI neighbours of the favorites and the catalog-wide (mean, std) of content / CF / compatibility.
+    """
+    st, n = snap.retrieval, len(snap)
+    codes, named, intent_vec = intent(snap, q)
+    unit = normalize_rows(intent_vec[None, :])[0]
+    pmi = pmi_neighbours(snap, q)
+    if snap.cf_item_scores is not None:
+        cf = tuple(st['cf_stats'])
+    else:
+        v = pmi[1].astype(np.float64)
+        cf = (v.sum() / n, _std(v.sum() / n, (v * v).sum() / n))
+    compat = compat_stats(st, q, codes, n)
+    if compat is None:
+        # clipped scores: statistics from an exhaustive pass
+        hits = np.isin(snap.match_index['cat_codes'], codes)[None, :]
+        full = demographic.compatibility_matrix([q], snap.price_features, hits)[0]
+        compat = (full.mean(), full.std())
+    return {'q': q, 'codes': codes, 'named': named, 'unit': unit, 'pmi': pmi,
+            'stats': (content_stats(st, unit), cf, compat)}
+
+def category_rows(st, codes, cap=RETRIEVAL_CATEGORY_TOP):
+    """Most reviewed rows of the matched categories (at most `cap`)."""
+    if not len(codes):
+        return np.empty(0, dtype=np.int64)
+    indptr, rows = st['cat_indptr'], st['cat_rows']
+    out = np.concatenate([rows[indptr[c]:min(indptr[c + 1], indptr[c] + cap)] for c in codes])
+    if len(out) > cap:
+        out = out[np.argpartition(-st['popularity'][out], cap - 1)[:cap]]
+    return out.astype(np.int64)
+
+def candidates(snap, unit_intent, codes, named, pmi) -> np.ndarray:
+    """Union of the retrievers' rows, sorted and de-duplicated. pmi: pmi_neighbours() of the query"""
+    st = snap.retrieval
+    content_rows, _ = search(snap.ann, snap.genome, unit_intent, top_m=RETRIEVAL_CONTENT_TOP)
+    similar = neighbours.seed_scores(snap.neighbours, named[:RETRIEVAL_NEIGHBOURS], kind=neighbours.CONTENT)
+    return np.unique(np.concatenate([
+        content_rows.astype(np.int64), category_rows(st, codes), named[:RETRIEVAL_NEIGHBOURS].astype(np.int64),
+        _top(*similar, RETRIEVAL_NEIGHBOURS), _top(*pmi, RETRIEVAL_NEIGHBOURS), st['popular'].astype(np.int64)]))
+
+def select(blended, pool=RERANK_POOL) -> np.ndarray:
+    """
+    Positions of the top `pool` blended scores, best first, ties by position (as a stable sort): all
+    positions above the pool-th score, then the lowest-position ties at that score fill the pool.
+    """
+    n = len(blended)
+    if n > pool:
+        kth = np.partition(blended, n - pool)[n - pool]
+        above = np.flatnonzero(blended > kth)
+        top = np.concatenate([above, np.flatnonzero(blended == kth)[:pool - len(above)]])
+    else:
+        top = np.arange(n)
+    return top[np.lexsort((top, -blended[top]))]
+
+def select_rows(blended: np.ndarray, pool=RERANK_POOL) -> np.ndarray:
+    """select() for every row of a (queries x n) score matrix; returns (queries, min(pool, n)) positions."""
+    q, n = blended.shape
+    if n > pool:
+        kth = np.partition(blended, n - pool, axis=1)[:, n - pool, None]
+        above = blended > kth
+        tied = blended == kth
+        keep = above | (tied & (np.cumsum(tied, axis=1) <= pool - above.sum(axis=1, keepdims=True)))
+        top = np.nonzero(keep)[1].reshape(q, pool)
+    else:
+        top = np.broadcast_to(np.arange(n), (q, n))
+    return np.take_along_axis(top, np.lexsort((top, -np.take_along_axis(blended, top, axis=1))), axis=1)
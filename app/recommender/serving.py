@@ -0,0 +1,166 @@
+import numpy as np
+from . import demographic, hybrid, matching, neighbours, quantize, retrieval, sharded
+from .ann import normalize_rows, dot_rows
+from .. import metrics
+from ..config import RECOMMEND_BATCH_CHUNK, RETRIEVAL_MIN_PRODUCTS, SCORING_BACKEND
+
+# Matrix-level scoring shared by /recommend and /recommend/batch: a single request is a batch of one,
+# so both endpoints return identical results. Queries are scored in chunks of RECOMMEND_BATCH_CHUNK
+# to bound the (queries x products) working set. Catalogs of RETRIEVAL_MIN_PRODUCTS or more are served
+# two-stage (see retrieval.py): only a bounded candidate set per query is scored. With
+# SCORING_BACKEND='sharded' every product is scored, in parallel over shared-memory shards (see sharded.py).
+
+def intent_mask(match_index, q: dict) -> np.ndarray:
+    """Products in favorite categories or matching explicit favorites."""
+    mask = np.zeros(len(match_index['cat_codes']), dtype=bool)
+    if q.get('favorite_categories'):
+        mask = matching.category_mask(match_index, q['favorite_categories'])
+    if q.get('explicit_favorites'):
+        mask |= matching.name_mask(match_index, set(e.lower() for e in q['explicit_favorites']))
+    return mask
+
+def intent_matrix(snap, masks) -> np.ndarray:
+    """Mean genome vector of each query's intent products (catalog mean when none match)."""
+    vecs = snap.vectors
+    return np.vstack([vecs[m].mean(axis=0) if m.any() else snap.vector_mean for m in masks])
+
+def pmi_scores(snap, q: dict) -> np.ndarray:
+    """fallback: PMI co-occurrence from explicit favorites (neighbour table rows of the seeds), per product row"""
+    rows, weights = neighbours.seed_scores(snap.neighbours, retrieval.seed_rows(snap.match_index, q))
+    scores = np.zeros(len(snap), dtype=np.float32)
+    scores[rows] = weights
+    return scores
+
+def _score_chunk(snap, reqs):
+    qs = [r.questionnaire.dict() for r in reqs]
+    with metrics.stage('recommend', 'intent_mask'):
+        masks = [intent_mask(snap.match_index, q) for q in qs]
+
+    # content scores: one matmul of the stacked intent vectors against the pre-normalized genome
+    with metrics.stage('recommend', 'content'):
+        intents = normalize_rows(intent_matrix(snap, masks))
+        if snap.quant is None:
+            content_m = dot_rows(intents, snap.genome)
+        else:
+            # asymmetric scores against the quantized genome, exact float scores for each query's top candidates
+            content_m = quantize.rescore(quantize.scores(snap.quant, intents), intents, snap.genome)
+
+    # collaborative / cf scores (query independent unless we fall back to PMI)
+    with metrics.stage('recommend', 'cf'):
+        if snap.cf_item_scores is not None:
+            cf_m = snap.cf_item_scores[None, :]
+            metrics.count('recsys_cf_path_total', len(reqs), path='svd')
+        else:
+            cf_m = np.vstack([pmi_scores(snap, q) for q in qs])
+            metrics.count('recsys_cf_path_total', len(reqs), path='pmi')
+
+    # demographic/compatibility
+    with metrics.stage('recommend', 'compatibility'):
+        hits = np.vstack([demographic.category_hits(q, None, snap.match_index) for q in qs])
+        compat_m = demographic.compatibility_matrix(qs, snap.price_features, hits)
+
+    # blend
+    with metrics.stage('recommend', 'blend'):
+        blended = hybrid.blend_matrix(content_m, cf_m, compat_m, [r.weights for r in reqs])
+    with metrics.stage('recommend', 'sort'):
+        order = np.argsort(-blended, axis=1, kind='stable')
+
+    # rerank using MMR with content as relevance
+    k = max(r.top_k for r in reqs)
+    with metrics.stage('recommend', 'mmr'):
+        sim = None if snap.quant is None else (lambda rows: quantize.scores(snap.quant, snap.genome[rows]))
+        picks = hybrid.mmr_indices(content_m, snap.genome, k=k,
+                                   lam=[r.mmr_lambda for r in reqs], order=order, sim=sim)
+
+    cf_m = np.broadcast_to(cf_m, content_m.shape)
+    results = []
+    for i, r in enumerate(reqs):
+        rows = [p for p in picks[i, :r.top_k] if p >= 0]
+        results.append([{
+            'product_id': str(snap.ids[p]),
+            'product_name': snap.name(p),
+            'score': float(blended[i, p]),
+            'content': float(content_m[i, p]),
+            'cf': float(cf_m[i, p]),
+            'compatibility': float(compat_m[i, p]),
+        } for p in rows])
+    return results
+
+def _rerank(snap, r, rows, blended, content, cf, compat):
+    """Top RERANK_POOL candidates by blended score, then MMR (content relevance) over that pool."""
+    with metrics.stage('recommend', 'sort'):
+        pool = retrieval.select(blended)
+    with metrics.stage('recommend', 'mmr'):
+        picks = hybrid.mmr_indices(content[pool], snap.genome[rows[pool]], k=r.top_k, lam=r.mmr_lambda)[0]
+    return [{
+        'product_id': str(snap.ids[rows[p]]),
+        'product_name': snap.name(rows[p]),
+        'score': float(blended[p]),
+        'content': float(content[p]),
+        'cf': float(cf[p]),
+        'compatibility': float(compat[p]),
+    } for p in pool[picks[picks >= 0]]]
+
+def _score_two_stage(snap, r):
+    with metrics.stage('recommend', 'prepare'):
+        p = retrieval.prepare(snap, r.questionnaire.dict())
+    with metrics.stage('recommend', 'retrieve'):
+        rows = retrieval.candidates(snap, p['unit'], p['codes'], p['named'], p['pmi'])
+    with metrics.stage('recommend', 'content'):
+        content = np.einsum('d,rd->r', p['unit'], snap.genome[rows])
+    with metrics.stage('recommend', 'cf'):
+        if snap.cf_item_scores is not None:
+            cf = snap.cf_item_scores[rows]
+            metrics.count('recsys_cf_path_total', path='svd')
+        else:
+            cf = retrieval.pmi_at(p['pmi'], rows)
+            metrics.count('recsys_cf_path_total', path='pmi')
+    with metrics.stage('recommend', 'compatibility'):
+        hits = np.isin(snap.match_index['cat_codes'][rows], p['codes'])[None, :]
+        features = {k: v[rows] for k, v in snap.price_features.items()}
+        compat = demographic.compatibility_matrix([p['q']], features, hits)[0]
+    with metrics.stage('recommend', 'blend'):
+        blended = hybrid.blend_with_stats((content, cf, compat), p['stats'], r.weights)
+    return _rerank(snap, r, rows, blended, content, cf, compat)
+
+def _score_sharded(snap, reqs):
+    with metrics.stage('recommend', 'prepare'):
+        prepared = [retrieval.prepare(snap, r.questionnaire.dict()) for r in reqs]
+    with metrics.stage('recommend', 'shards'):
+        found = sharded.score(snap, prepared, [r.weights for r in reqs])
+    metrics.count('recsys_cf_path_total', len(reqs), path='svd' if snap.cf_item_scores is not None else 'pmi')
+    return [_rerank(snap, r, *cand) for r, cand in zip(reqs, found)]
+
+def scoring_path(snap) -> str:
+    """How recommend_batch scores `snap`: 'sharded', 'two_stage' or 'exhaustive' (MMR over the whole catalog)."""
+    if snap.retrieval is not None and SCORING_BACKEND == 'sharded':
+        return 'sharded'
+    if snap.retrieval is not None and len(snap) >= RETRIEVAL_MIN_PRODUCTS:
+        return 'two_stage'
+    return 'exhaustive'
+
+def recommend_batch(snap, reqs) -> list:
+    """Recommendations for a list of RecommendRequest; one list of item dicts per request."""
+    path = scoring_path(snap)
+    if path == 'sharded':
+        return [res for s in range(0, len(reqs), RECOMMEND_BATCH_CHUNK)
+                for res in _score_sharded(snap, reqs[s:s+RECOMMEND_BATCH_CHUNK])]
+    if path == 'two_stage':
+        return [_score_two_stage(snap, r) for r in reqs]
+    results = []
+    for s in range(0, len(reqs), RECOMMEND_BATCH_CHUNK):
+        results.extend(_score_chunk(snap, reqs[s:s+RECOMMEND_BATCH_CHUNK]))
+    return results
+
+def warm_up(snap) -> list:
+    """
+    One synthetic query through the serving path of `snap` (first category, a token of the first product name):
+    faults in the mapped arrays it scans and starts lazily created state (e.g. the sharded worker pool).
+    """
+    from ..models import Questionnaire, RecommendRequest
+    if not len(snap):
+        return []
+    q = Questionnaire(avg_price_level='mid', favorite_categories=[matching.category_path(snap.match_index, 0).split('|')[0]],
+                      explicit_favorites=snap.name(0).split()[:1])
+    neighbours.row(snap.neighbours, 0)
+    return recommend_batch(snap, [RecommendRequest(questionnaire=q)])[0]
@@ -0,0 +1,170 @@
+import atexit
+import os
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+from . import demographic, hybrid, retrieval
+from .ann import dot_rows
+from ..config import SCORING_WORKERS, SCORING_SHARDS, RERANK_POOL
+
+# Multi-core scoring backend (SCORING_BACKEND='sharded'):
+# the scoring arrays of the serving snapshot (genome, CF scores, price features, category codes) are copied once
+# per generation into shared memory, one segment per row-range shard. A persistent process pool scores
+# every product of a shard for a chunk of queries (content, CF, compatibility, blend with the catalog-wide
+# z-statistics of retrieval.prepare) and returns its RERANK_POOL best rows per query; shard results are
+# merged into the global pool that MMR re-ranks. Workers attach to a segment once and keep it mapped.
+
+ALIGN = 64
+
+class ShardStore:
+    """Shared-memory copy of one generation's scoring arrays; released once retired and no request uses it."""
+
+    def __init__(self, snap, n_shards):
+        self.generation = snap.generation
+        arrays = {
+            'genome': snap.genome,
+            'cf': snap.cf_item_scores,
+            'price_bucket': snap.price_features['price_bucket'],
+            'price_norm': snap.price_features['price_norm'],
+            'cat_codes': snap.match_index['cat_codes'],
+        }
+        arrays = {k: v for k, v in arrays.items() if v is not None}
+        bounds = np.linspace(0, len(snap), max(1, min(n_shards, len(snap))) + 1).astype(np.int64)
+        self.specs, self._segments = [], []
+        for s, e in zip(bounds[:-1], bounds[1:]):
+            layout, size = {}, 0
+            for name, a in arrays.items():
+                size = -(-size // ALIGN) * ALIGN
+                layout[name] = (size, np.asarray(a).dtype.str, (int(e - s),) + tuple(np.shape(a)[1:]))
+                size += int(e - s) * int(np.prod(np.shape(a)[1:], dtype=np.int64)) * np.asarray(a).dtype.itemsize
+            shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+            for name, view in _views(shm, layout).items():
+                view[...] = arrays[name][s:e]
+            self._segments.append(shm)
+            self.specs.append({'generation': self.generation, 'segment': shm.name, 'start': int(s), 'stop': int(e),
+                               'layout': layout})
+        self._users = 0
+        self._retired = False
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            self._users += 1
+        return self
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+            done = self._retired and self._users == 0
+        if done:
+            self._free()
+
+    def retire(self):
+        with self._lock:
+            self._retired = True
+            done = self._users == 0
+        if done:
+            self._free()
+
+    def _free(self):
+        for shm in self._segments:
+            shm.close()
+            shm.unlink()
+        self._segments = []
+
+def _views(shm, layout) -> dict:
+    return {name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            for name, (offset, dtype, shape) in layout.items()}
+
+# worker side: segment name -> (SharedMemory, views), for the generation last scored
+_attached = {}
+
+def _shard_arrays(spec) -> dict:
+    hit = _attached.get(spec['segment'])
+    if hit is None:
+        for name in [k for k, (gen, _, _) in _attached.items() if gen != spec['generation']]:
+            _, shm, views = _attached.pop(name)
+            del views   # no exported buffers may remain when the mapping is closed
+            shm.close()
+        shm = shared_memory.SharedMemory(name=spec['segment'])
+        hit = _attached[spec['segment']] = (spec['generation'], shm, _views(shm, spec['layout']))
+    return hit[2]
+
+def _score_shard(args):
+    """Top `pool` rows of one shard per query: (rows, blended, content, cf, compat) arrays."""
+    spec, batch, pool = args
+    a = _shard_arrays(spec)
+    lo, hi = spec['start'], spec['stop']
+    content = dot_rows(np.vstack([p['unit'] for p in batch]), a['genome'])
+    hits = np.vstack([np.isin(a['cat_codes'], p['codes']) for p in batch])
+    compat = demographic.compatibility_matrix([p['q'] for p in batch], {'price_bucket': a['price_bucket'],
+                                                                         'price_norm': a['price_norm']}, hits)
+    out = []
+    for i, p in enumerate(batch):
+        if 'cf' in a:
+            cf = a['cf']
+        else:
+            rows, scores = p['pmi']
+            cf = np.zeros(hi - lo, dtype=np.float32)
+            sel = (rows >= lo) & (rows < hi)
+            cf[rows[sel] - lo] = scores[sel]
+        blended = hybrid.blend_with_stats((content[i], cf, compat[i]), p['stats'], p['weights'])
+        top = np.sort(retrieval.select(blended, pool))
+        out.append((top + lo, blended[top], content[i, top], np.array(cf[top]), compat[i, top]))
+    return out
+
+# parent side
+_lock = threading.Lock()
+_executor = None
+_store = None
+
+def _pool(n_workers) -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: the serving process is multi-threaded, fork would copy its locks mid-use
+        _executor = ProcessPoolExecutor(max_workers=n_workers, mp_context=get_context('spawn'))
+    return _executor
+
+def _current_store(snap) -> ShardStore:
+    global _store
+    with _lock:
+        if _store is None or _store.generation != snap.generation:
+            old = _store
+            _store = ShardStore(snap, SCORING_SHARDS or _workers())
+            if old is not None:
+                old.retire()
+        return _store.acquire()
+
+def _workers() -> int:
+    return SCORING_WORKERS or os.cpu_count() or 1
+
+def score(snap, prepared, weights, pool=RERANK_POOL) -> list:
+    """
+    Blended scores of every product for a chunk of queries, scored shard by shard in the worker pool.
+    prepared: retrieval.prepare() per query; weights: request weights per query
+    returns: per query (rows, blended, content, cf, compat) of the best candidates, rows ascending
+    """
+    store = _current_store(snap)
+    try:
+        with _lock:
+            executor = _pool(_workers())
+        batch = [{'q': p['q'], 'codes': p['codes'], 'unit': p['unit'], 'pmi': p['pmi'], 'stats': p['stats'],
+                  'weights': w} for p, w in zip(prepared, weights)]
+        parts = list(executor.map(_score_shard, [(spec, batch, pool) for spec in store.specs]))
+    finally:
+        store.release()
+    # shards cover ascending row ranges: concatenating keeps rows (and select's tie order) ascending
+    return [tuple(np.concatenate([part[i][j] for part in parts]) for j in range(5)) for i in range(len(prepared))]
+
+def shutdown():
+    global _executor, _store
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(cancel_futures=True)
+            _executor = None
+        if _store is not None:
+            _store.retire()
+            _store = None
+
+atexit.register(shutdown)
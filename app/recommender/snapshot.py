@@ -0,0 +1,146 @@
+import sys
+import mmap
+import numpy as np
+from scipy import sparse
+from . import persistence
+
+# arrays of a generation that serving reads (no tables, no review-derived build state)
+SERVING_ARRAYS = ('vectors', 'genome', 'quant', 'ann', 'match', 'price', 'cf_scores', 'neighbours', 'retrieval')
+# attributes measured by Snapshot.footprint()
+FOOTPRINT_ATTRS = ('ids', 'row_of', 'vectors', 'vector_mean', 'genome', 'quant', 'ann', 'match_index', 'price_features',
+                   'cf_item_scores', 'neighbours', 'retrieval', 'name_utf8', 'name_offsets')
+
+def _mapped(a) -> bool:
+    while a is not None:
+        if isinstance(a, (np.memmap, mmap.mmap)):
+            return True
+        a = getattr(a, 'base', None)
+    return False
+
+def _sizeof(value):
+    """(heap bytes, mapped bytes) held by an attribute value."""
+    if value is None:
+        return 0, 0
+    if sparse.issparse(value):
+        parts = [_sizeof(getattr(value, p)) for p in ('data', 'indices', 'indptr')]
+        return sum(h for h, _ in parts), sum(m for _, m in parts)
+    if isinstance(value, np.ndarray):
+        if _mapped(value):
+            return 0, value.nbytes
+        extra = sum(sys.getsizeof(x) for x in value.ravel()) if value.dtype == object else 0
+        return value.nbytes + extra, 0
+    if isinstance(value, dict):
+        heap, mapped = sys.getsizeof(value), 0
+        for k, v in value.items():
+            if isinstance(v, (np.ndarray, dict)) or sparse.issparse(v):
+                h, m = _sizeof(v)
+            else:
+                h, m = sys.getsizeof(k) + sys.getsizeof(v), 0
+            heap, mapped = heap + h, mapped + m
+        return heap, mapped
+    return sys.getsizeof(value), 0
+
+class Snapshot:
+    """
+    Read-only view of one artifact generation, as used by /recommend (never mutated after load).
+    Serving code grabs the current snapshot once per request; a finished build
+    replaces it with a single reference assignment, so readers never see a mix of generations.
+    Holds only what scoring needs, row-aligned with `ids`: float32 vectors, category codes and
+    price arrays (in match_index / price_features), CF scores, the item neighbour table (content + PMI), the two-stage retrieval
+    sums / postings (None for generations built without them); product names stay
+    utf-8 encoded (memory-mapped) and are decoded only for the rows returned in a response.
+    """
+
+    __slots__ = ('generation', 'ids', 'row_of', 'vectors', 'vector_mean', 'genome', 'quant', 'ann', 'match_index',
+                 'price_features', 'cf_item_scores', 'neighbours', 'retrieval', 'name_utf8', 'name_offsets',
+                 'meta', '_footprint')
+
+    def __init__(self, generation, ids, vectors, genome, ann, match_index, price_features, cf_item_scores, neighbour_table,
+                 name_utf8, name_offsets, quant=None, retrieval=None, meta=None):
+        self.generation = generation
+        self.ids = np.asarray(ids, dtype=str)
+        self.row_of = {pid: row for row, pid in enumerate(self.ids.tolist())}
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.vector_mean = self.vectors.mean(axis=0)
+        self.genome = np.asarray(genome, dtype=np.float32)
+        self.quant = quant
+        self.ann = ann
+        self.match_index = match_index
+        self.price_features = price_features
+        self.cf_item_scores = None if cf_item_scores is None else np.asarray(cf_item_scores, dtype=np.float32)
+        self.neighbours = neighbour_table
+        self.retrieval = retrieval
+        self.name_utf8 = name_utf8
+        self.name_offsets = name_offsets
+        self.meta = meta or {}
+        self._footprint = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def name(self, row) -> str:
+        return bytes(self.name_utf8[self.name_offsets[row]:self.name_offsets[row + 1]]).decode('utf-8')
+
+    def footprint(self) -> dict:
+        """Bytes held per attribute: heap (private to this worker) vs mapped (shared page cache)."""
+        if self._footprint is None:
+            parts = {}
+            for attr in FOOTPRINT_ATTRS:
+                heap, mapped = _sizeof(getattr(self, attr))
+                parts[attr] = {'heap_bytes': heap, 'mapped_bytes': mapped}
+            self._footprint = {
+                'generation': self.generation,
+                'products': len(self),
+                'heap_bytes': sum(p['heap_bytes'] for p in parts.values()),
+                'mapped_bytes': sum(p['mapped_bytes'] for p in parts.values()),
+                'parts': parts,
+                'quantization': self.meta.get('quantization'),
+            }
+        return self._footprint
+
+    def validate(self):
+        """Check that the row-aligned arrays agree on the catalog size; raises ValueError otherwise."""
+        n = len(self)
+        rows = {
+            'vectors': self.vectors, 'genome': self.genome, 'cat_codes': self.match_index['cat_codes'],
+            'price_bucket': self.price_features['price_bucket'], 'price_norm': self.price_features['price_norm'],
+            'cf_item_scores': self.cf_item_scores, 'name_offsets[:-1]': self.name_offsets[:-1],
+            'neighbours.indptr[:-1]': self.neighbours['indptr'][:-1],
+        }
+        if self.quant is not None:
+            rows['quant.codes'] = self.quant['codes']
+        bad = {name: len(a) for name, a in rows.items() if a is not None and len(a) != n}
+        if bad:
+            raise ValueError(f"generation {self.generation}: {n} products, but row counts {bad}")
+        if self.genome.shape[1:] != self.vectors.shape[1:]:
+            raise ValueError(f"generation {self.generation}: genome {self.genome.shape} vs vectors {self.vectors.shape}")
+        return self
+
+    @classmethod
+    def load(cls, generation=None):
+        art = persistence.load_generation(generation, arrays=SERVING_ARRAYS, tables=False)
+        gen, a = art['generation'], art['arrays']
+        match = a['match']
+        ids = match.pop('ids')
+        missing = [name for name in ('cf_scores', 'neighbours') if name not in a]
+        if 'names_utf8' not in match:
+            missing.append('encoded match index')
+        if missing:
+            raise ValueError(f"generation {gen} has no {', '.join(missing)} (written by an older build): run /build")
+        name_utf8, name_offsets = persistence.open_strings('products.product_name', gen)
+        return cls(
+            generation=gen,
+            ids=ids,
+            vectors=a['vectors'],
+            genome=a['genome'],
+            quant=a.get('quant'),
+            ann=a['ann'],
+            match_index=match,
+            price_features=a['price'],
+            cf_item_scores=a['cf_scores'],
+            neighbour_table=a['neighbours'],
+            retrieval=a.get('retrieval'),
+            name_utf8=name_utf8,
+            name_offsets=name_offsets,
+            meta=art['meta'],
+        )
@@ -35,3 +35,31 @@ def simple_sentiment(text: str) -> float:
     neg = len(tokens & NEG_TOKENS)
     score = (pos - neg) / (1 + pos + neg)
     return float(score)
+
+def batch_sentiment(texts: pd.Series) -> pd.Series:
+    """Vectorized simple_sentiment over a whole column (same token sets and formula)."""
+    n = len(texts)
+    tokens = (pd.Series(np.asarray(texts, dtype=object), index=np.arange(n))
+              .fillna('').astype(str).str.lower()
+              .str.replace(_punc_re.pattern, " ", regex=True)
+              .str.split().explode().dropna())
+    hits = tokens[tokens.isin(POS_TOKENS | NEG_TOKENS)]
+    hits = pd.DataFrame({'row': hits.index.values, 'tok': hits.values}).drop_duplicates()
+    is_pos = hits['tok'].isin(POS_TOKENS)
+    pos = np.bincount(hits['row'][is_pos], minlength=n)
+    neg = np.bincount(hits['row'][~is_pos], minlength=n)
+    score = (pos - neg) / (1 + pos + neg)
+    return pd.Series(score.astype(float), index=texts.index)
+
+_number_re = r"(-?\d+(?:\.\d+)?)"
+
+def to_number(s: pd.Series) -> pd.Series:
+    """
+    Vectorized numeric coercion: strips currency symbols, thousands separators and text,
+    percentages ('64%') become fractions (0.64). Unparseable values become NaN.
+    """
+    if pd.api.types.is_numeric_dtype(s):
+        return s.astype(float)
+    txt = s.astype(object).where(s.notna(), '').astype(str).str.replace(",", "", regex=False)
+    out = pd.to_numeric(txt.str.extract(_number_re, expand=False), errors='coerce')
+    return out.where(~txt.str.contains("%", regex=False), out / 100.0)
@@ -0,0 +1,59 @@
+import json
+
+# Regression check of a benchmark report against a stored baseline.
+# Only cost metrics are compared (seconds, *_ms latencies, peak_rss_mb); a metric regresses when it is
+# both `tolerance` (relative) and its absolute floor worse than the baseline, so tiny stages do not flap.
+
+FLOORS = {'seconds': 0.05, '_ms': 1.0, 'peak_rss_mb': 32.0}
+
+def _floor(name):
+    for suffix, floor in FLOORS.items():
+        if name.endswith(suffix):
+            return floor
+    return None
+
+def flatten(obj, prefix=''):
+    for key, value in obj.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from flatten(value, name + '.')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, float(value)
+
+def compare(baseline: dict, current: dict, tolerance=0.2) -> list:
+    """
+    baseline / current: reports written by benchmarks.run (their 'results' sections are compared)
+    returns: list of dicts (metric, baseline, current, ratio, regression) for metrics present in both
+    """
+    base = dict(flatten(baseline.get('results', baseline)))
+    rows = []
+    for name, value in flatten(current.get('results', current)):
+        floor = _floor(name)
+        if floor is None or name not in base:
+            continue
+        old = base[name]
+        rows.append({
+            'metric': name,
+            'baseline': old,
+            'current': value,
+            'ratio': round(value / old, 3) if old else None,
+            'regression': value > old * (1 + tolerance) and value - old > floor,
+        })
+    return rows
+
+def report(rows, only_regressions=False) -> str:
+    lines = []
+    for r in rows:
+        if only_regressions and not r['regression']:
+            continue
+        ratio = f"{r['ratio']:.2f}x" if r['ratio'] is not None else '   n/a'
+        flag = 'REGRESSION' if r['regression'] else ''
+        lines.append(f"{r['metric']:<60} {r['baseline']:>12.3f} {r['current']:>12.3f} {ratio:>8} {flag}")
+    return '\n'.join(lines)
+
+def compare_files(baseline_path, current_path, tolerance=0.2) -> list:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+    return compare(baseline, current, tolerance)
@@ -0,0 +1,79 @@
+import os
+import resource
+import threading
+import time
+import numpy as np
+
+# Wall-clock + resident-memory measurement for benchmark stages.
+# A background thread samples RSS every `interval` seconds; a stage's peak is the
+# largest sample taken while it ran (so work done in other threads, e.g. a /build job, is covered).
+
+_PAGE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def rss_mb() -> float:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE / 2**20
+    except OSError:
+        # no procfs: lifetime peak is the best available figure (KiB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if peak > 2**32 else peak / 2**10
+
+class RssSampler:
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []   # (time, rss_mb)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.samples.append((time.time(), rss_mb()))
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def window(self, start, end) -> list:
+        return [m for t, m in self.samples if start <= t <= end]
+
+class Recorder:
+    """Collects {stage: {seconds, rss_start_mb, peak_rss_mb}} from timed calls or external timestamps."""
+
+    def __init__(self, sampler: RssSampler):
+        self.sampler = sampler
+        self.stages = {}
+
+    def add(self, name, start, end, rss_start=None, rss_end=None, **extra):
+        inside = self.sampler.window(start, end)
+        known = [m for m in (rss_start, rss_end) if m is not None]
+        first = rss_start if rss_start is not None else (inside[0] if inside else rss_mb())
+        self.stages[name] = {
+            'seconds': round(end - start, 6),
+            'rss_start_mb': round(first, 1),
+            'peak_rss_mb': round(max(inside + known + [first]), 1),
+            **extra,
+        }
+        return self.stages[name]
+
+    def time(self, name, fn, *args, **kwargs):
+        rss0, t0 = rss_mb(), time.time()
+        out = fn(*args, **kwargs)
+        self.add(name, t0, time.time(), rss_start=rss0, rss_end=rss_mb())
+        return out
+
+def latency_summary(seconds) -> dict:
+    ms = np.asarray(seconds, dtype=float) * 1000.0
+    return {
+        'n': int(len(ms)),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'max_ms': round(float(ms.max()), 3),
+    }
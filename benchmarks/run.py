@@ -0,0 +1,265 @@
+"""
+Build / serve benchmarks on synthetic data.
+
+    python -m benchmarks.run 10k 100k --out bench.json
+    python -m benchmarks.run 10k --baseline bench.json            # exit code 1 on regressions
+    python -m benchmarks.run --compare old.json new.json
+
+Each size runs in its own process against a scratch data / artifacts directory
+(RECSYS_DATA_DIR / RECSYS_ARTIFACTS_DIR), so peak memory figures are per size and the
+repository's artifacts are left alone.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from . import compare, synthetic
+from .profiling import Recorder, RssSampler, latency_summary, rss_mb
+
+BASE = Path(__file__).resolve().parents[1]
+
+def make_queries(products, n, seed=0):
+    """Questionnaires drawn from the catalog: category path segments, name tokens as explicit favorites."""
+    rng = np.random.default_rng(seed)
+    segments = sorted({s.lower() for path in products['category'].unique() for s in path.split('|')})
+    names = products['product_name'].values
+    levels = [None, 'low', 'mid', 'high']
+    queries = []
+    for _ in range(n):
+        picks = names[rng.integers(len(names), size=rng.integers(0, 3))]
+        queries.append({
+            'questionnaire': {
+                'avg_price_level': levels[rng.integers(len(levels))],
+                'favorite_categories': list(rng.choice(segments, size=rng.integers(0, 3), replace=False)),
+                'price_sensitivity': round(float(rng.uniform(0, 2)), 3),
+                'explicit_favorites': [str(p).split()[rng.integers(1, 3)] for p in picks],
+            },
+            'top_k': 10,
+            'mmr_lambda': 0.7,
+        })
+    return queries
+
+def server_timing(header: str) -> dict:
+    """'a;dur=1.2, b;dur=3' -> {'a': 1.2, 'b': 3.0} (milliseconds)"""
+    out = {}
+    for part in filter(None, (p.strip() for p in header.split(','))):
+        name, *params = part.split(';')
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'dur':
+                out[name.strip()] = float(value)
+    return out
+
+def _build(client, rec, prefix, force):
+    t0 = time.time()
+    job = client.post('/api/build', json={'force': force}).json()
+    while job.get('status') in ('queued', 'running'):
+        time.sleep(0.05)
+        job = client.get(f"/api/build/{job['job_id']}").json()
+    if job.get('status') != 'done':
+        raise RuntimeError(f"build failed: {job.get('error')}")
+    for stage, info in job['stages'].items():
+        if info['started'] and info['finished']:
+            rec.add(f"{prefix}.{stage}", info['started'], info['finished'], mode=info.get('mode'))
+    rec.add(f"{prefix}.total", t0, time.time())
+
+def _serve(client, queries, batch_queries, batch):
+    out = {}
+    t0 = time.time()
+    r = client.post('/api/recommend', json=queries[0])
+    r.raise_for_status()
+    out['first_request_ms'] = round((time.time() - t0) * 1000.0, 3)
+    lat, stages = [], {}
+    for q in queries[1:]:
+        t0 = time.time()
+        r = client.post('/api/recommend', json=q)
+        r.raise_for_status()
+        lat.append(time.time() - t0)
+        for name, ms in server_timing(r.headers.get('server-timing', '')).items():
+            stages.setdefault(name, []).append(ms / 1000.0)
+    out['recommend'] = latency_summary(lat)
+    # per-stage split as reported by the service itself (Server-Timing)
+    out['recommend_stages'] = {name: latency_summary(v) for name, v in stages.items()}
+
+    lat = []
+    for s in range(0, len(batch_queries), batch):
+        chunk = batch_queries[s:s + batch]
+        t0 = time.time()
+        client.post('/api/recommend/batch', json={'requests': chunk}).raise_for_status()
+        lat.append((time.time() - t0) / len(chunk))
+    out['recommend_batch_per_query'] = latency_summary(lat)
+    out['cache'] = client.get('/api/cache/stats').json()
+    fp = client.get('/api/snapshot').json()
+    out['snapshot'] = {'heap_mb': round(fp['heap_bytes'] / 2**20, 1), 'mapped_mb': round(fp['mapped_bytes'] / 2**20, 1)}
+    return out
+
+# cold start in a fresh interpreter: app import, lifespan startup (artifact load + warm-up), first /recommend
+_COLD_START = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app.main
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+t2 = time.perf_counter()
+with TestClient(app.main.app) as client:
+    t3 = time.perf_counter()
+    client.post('/api/recommend', json=json.loads(sys.argv[1])).raise_for_status()
+    t4 = time.perf_counter()
+    ready = client.get('/readyz').status_code
+print(json.dumps({'import_ms': (t1 - t0) * 1000.0, 'startup_ms': (t3 - t2) * 1000.0,
+                  'first_response_ms': (t4 - t3) * 1000.0, 'ready_status': ready}))
+"""
+
+def _cold_start(query) -> dict:
+    out = subprocess.run([sys.executable, '-c', _COLD_START, json.dumps(query)], cwd=BASE, env=os.environ,
+                         capture_output=True, text=True, check=True)
+    return {k: round(v, 3) for k, v in json.loads(out.stdout.strip().splitlines()[-1]).items()}
+
+def _components(rec, products, reviews, queries):
+    """Scaling of the individual build / scoring functions, called directly."""
+    from app.recommender import collaborative, content, demographic, hybrid
+    from app.config import USER_ITEM_DIM
+    prod_vecs = rec.time('build_product_genome', content.build_product_genome,
+                         products.reset_index(), reviews.reset_index(), force=True)[0]
+    R, user_ids, item_ids = rec.time('build_user_item_matrix', collaborative.build_user_item_matrix, reviews)
+    factors = rec.time('fit_svd_factors', collaborative.fit_svd_factors, R, user_ids, item_ids, n_components=USER_ITEM_DIM)
+    rec.time('item_scores', collaborative.item_scores, factors)
+    rec.time('build_item_pmi', collaborative.build_item_pmi, reviews)
+    q = queries[0]['questionnaire']
+    rec.time('compatibility_score', demographic.compatibility_score, q, products)
+    rel = prod_vecs.values @ prod_vecs.values.mean(axis=0)
+    candidates = list(prod_vecs.index[np.argsort(-rel)[:200]])
+    rec.time('mmr', hybrid.mmr, candidates, pd.Series(rel, index=prod_vecs.index), prod_vecs, k=10, lam=0.7)
+
+def run_size(size, seed=0, reviews_per_product=5.0, n_queries=200, batch=64, components=True) -> dict:
+    """Benchmark one catalog size in this process (data / artifacts dirs come from the environment)."""
+    from fastapi.testclient import TestClient
+    from app.config import DATA_DIR
+    from app.main import app
+    from app.recommender import preprocessing
+
+    n = synthetic.parse_size(size)
+    sampler = RssSampler().start()
+    data, build, comps = (Recorder(sampler) for _ in range(3))
+    raw = data.time('generate', synthetic.make_raw, n, reviews_per_product=reviews_per_product, seed=seed)
+    data.time('write_sources', synthetic.write_sources, *raw, DATA_DIR)
+    del raw
+
+    client = TestClient(app)
+    _build(client, build, 'full', force=True)
+    _build(client, build, 'unchanged', force=False)
+
+    products, reviews = preprocessing.load_and_split()
+    queries = make_queries(products, n_queries, seed=seed)
+    # a second, disjoint query set for the batch endpoint, so it is not answered from the response cache
+    serve_stats = _serve(client, queries, make_queries(products, n_queries, seed=seed + 1), batch)
+    serve_stats['cold_start'] = _cold_start(queries[0])
+    if components:
+        _components(comps, products, reviews, queries)
+    sampler.stop()
+    return {
+        'dataset': {'products': int(len(products)), 'reviews': int(len(reviews)), 'users': int(reviews['user_id'].nunique()),
+                    'categories': int(products['category'].nunique())},
+        'data': data.stages,
+        'build': build.stages,
+        'serve': serve_stats,
+        'components': comps.stages,
+        'final_rss_mb': round(rss_mb(), 1),
+    }
+
+def _meta(args):
+    def version(mod):
+        try:
+            return __import__(mod).__version__
+        except Exception:
+            return None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'versions': {m: version(m) for m in ('numpy', 'scipy', 'pandas', 'sklearn')},
+        'seed': args.seed,
+        'reviews_per_product': args.reviews_per_product,
+        'queries': args.queries,
+    }
+
+def _run_in_subprocess(size, args) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix=f"bench-{size}-", dir=args.workdir))
+    env = {**os.environ, 'RECSYS_DATA_DIR': str(workdir / 'data'), 'RECSYS_ARTIFACTS_DIR': str(workdir / 'artifacts'),
+           'PYTHONPATH': os.pathsep.join(filter(None, [str(BASE), os.environ.get('PYTHONPATH')]))}
+    cmd = [sys.executable, '-m', 'benchmarks.run', '--worker', size, '--out', str(workdir / 'result.json'),
+           '--seed', str(args.seed), '--reviews-per-product', str(args.reviews_per_product),
+           '--queries', str(args.queries), '--batch', str(args.batch)]
+    if args.skip_components:
+        cmd.append('--skip-components')
+    try:
+        subprocess.run(cmd, cwd=BASE, env=env, check=True)
+        with open(workdir / 'result.json') as f:
+            return json.load(f)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog='python -m benchmarks.run', description=__doc__.strip().splitlines()[0])
+    p.add_argument('sizes', nargs='*', default=['10k'], help="catalog sizes, e.g. 10k 100k 1m")
+    p.add_argument('--out', help="write the JSON report here (default: stdout)")
+    p.add_argument('--baseline', help="compare against this report; exit code 1 on regressions")
+    p.add_argument('--tolerance', type=float, default=0.2, help="relative slack before a metric counts as regressed")
+    p.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help="only compare two existing reports")
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--reviews-per-product', type=float, default=5.0)
+    p.add_argument('--queries', type=int, default=200, help="/recommend requests per size")
+    p.add_argument('--batch', type=int, default=64, help="requests per /recommend/batch call")
+    p.add_argument('--skip-components', action='store_true', help="skip the direct per-function timings")
+    p.add_argument('--workdir', help="parent directory for scratch data / artifacts")
+    p.add_argument('--keep', action='store_true', help="keep scratch directories")
+    p.add_argument('--worker', help=argparse.SUPPRESS)
+    args = p.parse_args(argv)
+
+    if args.compare:
+        rows = compare.compare_files(*args.compare, tolerance=args.tolerance)
+        print(compare.report(rows))
+        return 1 if any(r['regression'] for r in rows) else 0
+
+    if args.worker:
+        result = run_size(args.worker, seed=args.seed, reviews_per_product=args.reviews_per_product,
+                          n_queries=args.queries, batch=args.batch, components=not args.skip_components)
+        with open(args.out, 'w') as f:
+            json.dump(result, f, indent=1)
+        return 0
+
+    report = {'meta': _meta(args), 'results': {}}
+    for size in args.sizes:
+        print(f"benchmark {size} ...", file=sys.stderr)
+        report['results'][size] = _run_in_subprocess(size, args)
+    text = json.dumps(report, indent=1)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.baseline:
+        rows = compare.compare_files(args.baseline, args.out, args.tolerance) if args.out else \
+            compare.compare(json.load(open(args.baseline)), report, args.tolerance)
+        print(compare.report(rows, only_regressions=True) or "no regressions", file=sys.stderr)
+        return 1 if any(r['regression'] for r in rows) else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
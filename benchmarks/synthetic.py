@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from app.recommender import preprocessing
+from app.config import PRODUCTS_CSV, REVIEWS_CSV
+from app.utils import POS_TOKENS, NEG_TOKENS
+
+# Seeded synthetic catalogs / review streams in the raw source schema (PRODUCTS_CSV + REVIEWS_CSV).
+# Parsing them with preprocessing.parse_sources gives frames with the same schema as load_and_split.
+# Skew: product popularity and user activity are Zipf-like, users review mostly inside a home category,
+# and text is drawn from per-category topic words so TF-IDF / PMI see realistic structure.
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+_SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'tu', 've', 'xo', 'zen', 'pa', 'qui', 'dor', 'sil', 'bra', 'nok', 'fe', 'gal']
+_BRANDS = ['boat', 'samsung', 'philips', 'syska', 'wayona', 'ambrane', 'redmi', 'oneplus', 'noise', 'zebronics',
+           'portronics', 'pigeon', 'prestige', 'havells', 'bajaj', 'lg', 'sony', 'jbl', 'hp', 'logitech']
+
+def parse_size(size) -> int:
+    """'10k' / '1m' / '2500' -> number of products"""
+    s = str(size).lower()
+    if s in SIZES:
+        return SIZES[s]
+    mult = {'k': 1_000, 'm': 1_000_000}.get(s[-1], 1)
+    return int(float(s.rstrip('km')) * mult)
+
+def _words(n, rng):
+    """n distinct pseudo-words"""
+    syl = np.asarray(_SYLLABLES, dtype=object)
+    words, seen = [], set()
+    while len(words) < n:
+        w = ''.join(syl[rng.integers(len(syl), size=rng.integers(2, 5))])
+        if w not in seen:
+            seen.add(w)
+            words.append(w)
+    return np.asarray(words, dtype=object)
+
+def _zipf_weights(n, a, rng):
+    w = 1.0 / np.arange(1, n + 1) ** a
+    return rng.permutation(w / w.sum())
+
+def _join(tokens: np.ndarray) -> list:
+    return [' '.join(row) for row in tokens]
+
+def make_raw(n_products: int, reviews_per_product=5.0, basket_size=5.0, home_affinity=0.8, seed=0):
+    """
+    Raw product and review frames (PROD_COLS / REVIEW_COLS, string-typed like the Amazon export).
+    reviews_per_product: mean reviews per product; basket_size: mean reviews per user
+    home_affinity: share of a user's reviews that fall in their home category
+    returns: (products_raw, reviews_raw)
+    """
+    rng = np.random.default_rng(seed)
+    n = int(n_products)
+    vocab = _words(4000, rng)
+
+    # category tree: top | mid | leaf, leaf sizes skewed
+    n_leaf = max(20, n // 500)
+    n_top = max(4, int(np.sqrt(n_leaf) / 2))
+    tops, mids, leaves = vocab[:n_top], vocab[n_top:n_top + 4 * n_top], vocab[5 * n_top:5 * n_top + n_leaf]
+    leaf_top = rng.integers(n_top, size=n_leaf)
+    leaf_mid = leaf_top * 4 + rng.integers(4, size=n_leaf)
+    leaf_paths = np.asarray([f"{tops[t].title()}|{mids[m].title()}|{l.title()}"
+                             for t, m, l in zip(leaf_top, leaf_mid, leaves)], dtype=object)
+    leaf_weights = _zipf_weights(n_leaf, 0.8, rng)
+    prod_leaf = np.sort(rng.choice(n_leaf, size=n, p=leaf_weights))
+
+    # per-leaf topic words: a contiguous window of the vocabulary, Zipf-distributed inside the window
+    topic_words = 60
+    topic_start = rng.integers(len(vocab) - topic_words, size=n_leaf)
+
+    def topic_tokens(leaf, k):
+        ranks = np.minimum(rng.zipf(1.3, size=(len(leaf), k)) - 1, topic_words - 1)
+        return vocab[topic_start[leaf][:, None] + ranks]
+
+    brands = np.asarray(_BRANDS, dtype=object)[rng.integers(len(_BRANDS), size=n)]
+    names = pd.Series(brands).str.title() + ' ' + pd.Series(_join(topic_tokens(prod_leaf, 3))).str.title() + \
+        ' ' + pd.Series(rng.integers(100, 9999, size=n)).astype(str)
+    about = _join(topic_tokens(prod_leaf, 25))
+
+    popularity = _zipf_weights(n, 1.05, rng)
+    quality = np.clip(rng.normal(4.0, 0.4, size=n), 1.5, 5.0)
+    actual = np.round(np.exp(rng.normal(6.5 + 0.5 * (leaf_top[prod_leaf] % 4), 0.8)), -1) + 99
+    discount = rng.integers(0, 80, size=n)
+    discounted = np.round(actual * (1 - discount / 100.0))
+    rating_count = np.round(popularity * n * 40 * rng.uniform(0.5, 1.5, size=n)).astype(np.int64)
+
+    ids = np.char.mod('SP%08d', np.arange(n)).astype(object)
+    products = pd.DataFrame({
+        'product_id': ids,
+        'product_name': names.values,
+        'category': leaf_paths[prod_leaf],
+        'discounted_price': [f"₹{v:,.0f}" for v in discounted],
+        'actual_price': [f"₹{v:,.0f}" for v in actual],
+        'discount_percentage': [f"{v}%" for v in discount],
+        'rating': np.round(quality, 1).astype(str),
+        'rating_count': [f"{v:,}" for v in rating_count],
+        'about_product': about,
+        'img_link': np.char.add('https://img.example/', ids.astype(str)).astype(object),
+        'product_link': np.char.add('https://shop.example/dp/', ids.astype(str)).astype(object),
+    })
+
+    # review stream: Zipf user activity, home-category affinity, popularity-ranked picks inside a category
+    n_reviews = int(n * reviews_per_product)
+    n_users = max(1, int(n_reviews / basket_size))
+    user_of = rng.choice(n_users, size=n_reviews, p=_zipf_weights(n_users, 0.7, rng))
+    user_home = rng.choice(n_leaf, size=n_users, p=leaf_weights)
+    leaf_of = np.where(rng.random(n_reviews) < home_affinity, user_home[user_of],
+                       rng.choice(n_leaf, size=n_reviews, p=leaf_weights))
+    leaf_offsets = np.concatenate([[0], np.cumsum(np.bincount(prod_leaf, minlength=n_leaf))])
+    # inside each leaf, products ordered by popularity; picks skewed towards the head
+    by_pop = np.lexsort((-popularity, prod_leaf))
+    sizes = np.diff(leaf_offsets)
+    empty = sizes[leaf_of] == 0
+    leaf_of[empty] = prod_leaf[rng.integers(n, size=int(empty.sum()))]
+    pos = np.minimum((sizes[leaf_of] * rng.random(n_reviews) ** 2.5).astype(np.int64), sizes[leaf_of] - 1)
+    prod_of = by_pop[leaf_offsets[leaf_of] + pos]
+
+    rating = np.clip(np.rint(quality[prod_of] + rng.normal(0, 0.9, size=n_reviews)), 1, 5).astype(int)
+    pos_tok, neg_tok = np.asarray(sorted(POS_TOKENS), dtype=object), np.asarray(sorted(NEG_TOKENS), dtype=object)
+    mood = np.where(rating >= 4, pos_tok[rng.integers(len(pos_tok), size=n_reviews)],
+                    np.where(rating <= 2, neg_tok[rng.integers(len(neg_tok), size=n_reviews)], ''))
+    text = pd.Series(_join(topic_tokens(prod_leaf[prod_of], 8))) + ' ' + mood
+    user_ids = np.char.mod('SU%08d', user_of).astype(object)
+
+    reviews = pd.DataFrame({
+        'review_id': np.char.mod('SR%09d', np.arange(n_reviews)).astype(object),
+        'user_id': user_ids,
+        'user_name': np.char.add('user ', user_ids.astype(str)).astype(object),
+        'review_title': mood,
+        'review_content': text.values,
+        'rating': rating.astype(str),
+        'product_id': ids[prod_of],
+    })
+    return products, reviews
+
+def write_sources(products_raw: pd.DataFrame, reviews_raw: pd.DataFrame, data_dir) -> tuple:
+    """Write raw frames where PRODUCTS_CSV / REVIEWS_CSV expect them; returns the two paths"""
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    paths = data_dir / PRODUCTS_CSV.name, data_dir / REVIEWS_CSV.name
+    products_raw.to_csv(paths[0], index=False)
+    reviews_raw.to_csv(paths[1], index=False)
+    return paths
+
+def make_dataset(n_products: int, data_dir, seed=0, **kwargs):
+    """
+    Generate, write and parse a synthetic dataset.
+    returns: (products, reviews) in the load_and_split schema
+    """
+    paths = write_sources(*make_raw(n_products, seed=seed, **kwargs), data_dir)
+    return preprocessing.parse_sources(*paths)
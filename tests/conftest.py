@@ -0,0 +1,38 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# app.config reads these at import: every test session works on its own synthetic data and artifacts
+_ROOT = Path(tempfile.mkdtemp(prefix='recsys-tests-'))
+os.environ['RECSYS_DATA_DIR'] = str(_ROOT / 'data')
+os.environ['RECSYS_ARTIFACTS_DIR'] = str(_ROOT / 'artifacts')
+
+import pytest
+from benchmarks import synthetic
+from app.config import DATA_DIR
+
+N_PRODUCTS = 1500
+
+@pytest.fixture(scope='session')
+def dataset():
+    """(products, reviews) of a seeded synthetic catalog, written where the pipeline reads its sources."""
+    return synthetic.make_dataset(N_PRODUCTS, DATA_DIR, seed=0)
+
+@pytest.fixture(scope='session')
+def snapshot(dataset):
+    """Snapshot of a full build over `dataset`."""
+    from app.recommender import pipeline
+    from app.recommender.snapshot import Snapshot
+    return Snapshot.load(pipeline.run_build(force=True))
+
+@pytest.fixture
+def isolated_artifacts(tmp_path, monkeypatch):
+    """Point artifact generations at a scratch directory (builds here leave the session snapshot current)."""
+    from app.recommender import persistence
+    monkeypatch.setattr(persistence, 'ARTIFACTS_DIR', tmp_path)
+    monkeypatch.setattr(persistence, 'GENERATIONS_DIR', tmp_path / 'generations')
+    monkeypatch.setattr(persistence, 'CURRENT', tmp_path / 'CURRENT')
+    return tmp_path
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+@pytest.fixture(scope='module')
+def client(snapshot):
+    from app.main import app
+    with TestClient(app) as c:
+        yield c
+
+def _request(**extra):
+    return {'questionnaire': {'avg_price_level': 'mid'}, **extra}
+
+@pytest.mark.parametrize('top_k', [0, -1, None])
+def test_recommend_rejects_invalid_top_k(client, top_k):
+    assert client.post('/api/recommend', json=_request(top_k=top_k)).status_code == 422
+    assert client.post('/api/recommend/batch', json={'requests': [_request(top_k=top_k)]}).status_code == 422
+
+@pytest.mark.parametrize('extra', [{'mmr_lambda': None}, {'mmr_lambda': -0.1}, {'mmr_lambda': 1.5},
+                                   {'weights': []}, {'weights': [0.5, 0.5]}, {'weights': [0.4, 0.3, 0.2, 0.1]}])
+def test_recommend_rejects_invalid_blend_parameters(client, extra):
+    assert client.post('/api/recommend', json=_request(**extra)).status_code == 422
+    assert client.post('/api/recommend/batch', json={'requests': [_request(**extra)]}).status_code == 422
+
+def test_recommend_top_k(client):
+    r = client.post('/api/recommend', json=_request(top_k=3))
+    assert r.status_code == 200 and len(r.json()['recommendations']) == 3
+
+def test_similar(client, snapshot):
+    row = int(np.argmax(np.diff(snapshot.neighbours['indptr'])))
+    pid = str(snapshot.ids[row])
+    r = client.get(f'/api/similar/{pid}', params={'k': 5})
+    assert r.status_code == 200
+    body = r.json()
+    assert body['product_id'] == pid and len(body['similar']) == 5
+    assert [it['content'] for it in body['similar']] == sorted((it['content'] for it in body['similar']), reverse=True)
+
+    for source in ('content', 'pmi'):
+        items = client.get(f'/api/similar/{pid}', params={'k': 500, 'source': source}).json()['similar']
+        assert items and all(source in it['source'] for it in items)
+        if source == 'pmi':
+            assert all(it['pmi'] > 0 for it in items)
+    everything = client.get(f'/api/similar/{pid}', params={'k': 500}).json()['similar']
+    assert len(everything) == np.diff(snapshot.neighbours['indptr'])[row]
+
+def test_similar_errors(client, snapshot):
+    assert client.get('/api/similar/NO-SUCH-PRODUCT').status_code == 404
+    assert client.get(f'/api/similar/{snapshot.ids[0]}', params={'source': 'popular'}).status_code == 422
+
+def test_readiness_and_metrics_follow_the_current_generation(client, snapshot, monkeypatch):
+    from types import SimpleNamespace
+    from app.api import routes
+    from app.recommender import persistence
+    current = persistence.current_generation()
+    monkeypatch.setattr(routes, '_snapshot', SimpleNamespace(generation='stale'))   # another worker built since
+    r = client.get('/readyz')
+    assert r.status_code == 200 and r.json()['generation'] == current
+    assert f'generation="{current}"' in client.get('/api/metrics').text
+
+    monkeypatch.setattr(routes, '_snapshot', SimpleNamespace(generation='stale'))
+    monkeypatch.setattr(persistence, 'current_generation', lambda: 'gone')
+    r = client.get('/readyz')
+    assert r.status_code == 503 and r.json()['reason']
+    assert 'recsys_serving_generation_info' not in client.get('/api/metrics').text
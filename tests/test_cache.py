@@ -0,0 +1,37 @@
+from app.cache import canonical_request
+from app.models import RecommendRequest
+
+def _req(weights=(0.45, 0.35, 0.20), **q):
+    questionnaire = {'avg_price_level': 'Mid', 'favorite_categories': ['Audio', 'cables'],
+                     'explicit_favorites': ['boAt'], **q}
+    return RecommendRequest(questionnaire=questionnaire, weights=list(weights), top_k=5, mmr_lambda=0.7)
+
+def test_equivalent_requests_share_a_key():
+    key, _ = canonical_request(_req())
+    same = [
+        _req(favorite_categories=['cables', 'AUDIO', 'audio']),   # case, duplicates, order
+        _req(avg_price_level='mid', explicit_favorites=['BOAT', 'boat']),
+        _req(weights=(0.9, 0.7, 0.4)),                              # proportional weights
+        _req(weights=(0.45, 0.35, 0.2000001)),                      # within rounding
+    ]
+    assert all(canonical_request(r)[0] == key for r in same)
+
+def test_different_requests_get_different_keys():
+    key, _ = canonical_request(_req())
+    other = [
+        _req(favorite_categories=['audio']),
+        _req(weights=(0.5, 0.3, 0.2)),
+        _req(price_sensitivity=0.5),
+        _req(preferred_brands=['sony']),
+        RecommendRequest(**{**_req().dict(), 'top_k': 6}),
+        RecommendRequest(**{**_req().dict(), 'mmr_lambda': 0.5}),
+    ]
+    keys = {canonical_request(r)[0] for r in other}
+    assert key not in keys and len(keys) == len(other)
+
+def test_canonical_request_is_a_fixed_point():
+    key, canon = canonical_request(_req(weights=(9, 7, 4), favorite_categories=['Cables', 'audio']))
+    again, canon2 = canonical_request(canon)
+    assert again == key and canon2 == canon
+    assert canon.questionnaire.favorite_categories == ['audio', 'cables']
+    assert canon.weights == [0.45, 0.35, 0.2]
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from app.recommender import evaluation, serving
+
+def _reviews():
+    return pd.DataFrame({
+        'user_id': ['a', 'a', 'a', 'a', 'b', 'b', 'c'],
+        'product_id': ['p1', 'p2', 'p2', 'p3', 'p1', 'p4', 'p1'],
+        'rating': [5, 4, 3, 2, 5, 1, 4],
+        'ts': [1, 5, 2, 3, 9, 7, 1],
+    })
+
+def test_split_reviews_leave_one_out():
+    reviews = _reviews()
+    train, test = evaluation.split_reviews(reviews, 'leave_one_out', seed=3)
+    assert sorted(test['user_id']) == ['a', 'b']   # c has a single reviewed product
+    held = set(zip(test['user_id'], test['product_id']))
+    assert not held & set(zip(train['user_id'], train['product_id']))
+    assert len(train) + len(reviews.merge(test)) == len(reviews)
+
+def test_split_reviews_temporal_holds_out_latest():
+    train, test = evaluation.split_reviews(_reviews(), 'temporal', time_col='ts')
+    assert dict(zip(test['user_id'], test['product_id'])) == {'a': 'p2', 'b': 'p1'}
+    assert len(train) == 4   # both reviews of (a, p2) leave the training set
+
+def test_hit_metrics_hand_computed():
+    T = csr_matrix(np.array([[0, 1, 0, 1, 0, 0], [0, 0, 0, 0, 0, 1]], dtype=np.float32))
+    recs = np.array([[3, 0, 1], [2, 4, -1]])
+    recall, ndcg = evaluation.hit_metrics(recs, T, 3)
+    assert np.allclose(recall, [1.0, 0.0])
+    ideal = 1 + 1 / np.log2(3)
+    assert np.allclose(ndcg, [(1 + 1 / np.log2(4)) / ideal, 0.0])
+
+def test_weight_grid():
+    grid = evaluation.weight_grid(0.5)
+    assert len(grid) == 6 and len(set(grid)) == 6
+    assert all(min(w) >= 0 and np.isclose(sum(w), 1) for w in grid)
+    assert len(evaluation.weight_grid(0.25)) == 15
+
+def test_pruned_candidates_match_full_blend(snapshot, dataset, monkeypatch):
+    products, reviews = dataset
+    monkeypatch.setattr(serving, 'RETRIEVAL_MIN_PRODUCTS', 0)
+    train, test = evaluation.split_reviews(reviews)
+    args = dict(weights=evaluation.weight_grid(0.25), lambdas=(0.5, 0.9), pool=40, chunk=64, n_jobs=1,
+                refit_genome=False)
+    monkeypatch.setattr(evaluation, 'CANDIDATE_DEPTH', 60)
+    pruned = evaluation.evaluate(snapshot, products, train, test, **args)
+    monkeypatch.setattr(evaluation, 'CANDIDATE_DEPTH', 0)
+    full = evaluation.evaluate(snapshot, products, train, test, **args)
+    assert pruned['users'] > 100 and pruned['path'] == 'two_stage'
+    assert pruned['results'] == full['results']
+    assert pruned['leakage'] == ['genome']
+
+def test_small_catalog_is_evaluated_on_the_exhaustive_path(snapshot, dataset, monkeypatch):
+    products, reviews = dataset
+    train, test = evaluation.split_reviews(reviews)
+    args = dict(weights=evaluation.weight_grid(0.5), lambdas=(1.0,), chunk=256, n_jobs=1, refit_genome=False)
+    report = evaluation.evaluate(snapshot, products, train, test, **args)
+    assert serving.scoring_path(snapshot) == 'exhaustive'
+    assert report['path'] == 'exhaustive' and report['pool'] is None
+    # lambda 1 over the whole catalog ranks by content relevance alone, whatever the blend weights;
+    # within a blended pool the weights decide which products are ranked at all
+    assert len({(r['recall@10'], r['ndcg@10']) for r in report['results']}) == 1
+    monkeypatch.setattr(serving, 'RETRIEVAL_MIN_PRODUCTS', 0)
+    pooled = evaluation.evaluate(snapshot, products, train, test, **args)
+    assert pooled['path'] == 'two_stage' and pooled['pool'] == evaluation.RERANK_POOL
+    assert len({(r['recall@10'], r['ndcg@10']) for r in pooled['results']}) > 1
@@ -0,0 +1,12 @@
+import numpy as np
+from app.config import SVD_DIM
+from app.recommender.genome_stream import build_product_genome_streaming
+
+def test_process_pool_build_matches_in_process(dataset):
+    products, reviews = dataset
+    args = (products.reset_index(), reviews.reset_index())
+    serial = build_product_genome_streaming(*args, n_jobs=1, block_rows=400, n_features=2 ** 16)[0]
+    pooled = build_product_genome_streaming(*args, n_jobs=2, block_rows=400, n_features=2 ** 16)[0]
+    assert serial.shape == (len(products), SVD_DIM)
+    assert list(pooled.index) == list(serial.index)
+    assert np.allclose(pooled.values, serial.values, atol=1e-6)
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+from sklearn.metrics.pairwise import cosine_similarity
+from app.recommender import hybrid
+
+def _mmr_loop(candidates, relevance, item_vecs, k=10, lam=0.7):
+    """The original per-candidate MMR loop that hybrid.mmr replaced."""
+    selected, pool = [], list(candidates)
+    while pool and len(selected) < k:
+        best, best_val = None, -1e9
+        for pid in pool:
+            rel = float(relevance.get(pid, 0.0))
+            div = cosine_similarity(item_vecs.loc[[pid]].values, item_vecs.loc[selected].values).max() if selected else 0.0
+            val = lam * rel - (1 - lam) * div
+            if val > best_val:
+                best_val, best = val, pid
+        selected.append(best)
+        pool.remove(best)
+    return selected
+
+def _data(seed=0, n=120):
+    rng = np.random.default_rng(seed)
+    ids = [f"p{i}" for i in range(n)]
+    return ids, pd.DataFrame(rng.normal(size=(n, 8)), index=ids), pd.Series(rng.random(n), index=ids)
+
+def test_mmr_matches_original_loop():
+    ids, vecs, rel = _data()
+    for lam in (0.0, 0.3, 0.7, 1.0):
+        cands = ids[::2]
+        assert hybrid.mmr(cands, rel, vecs, k=10, lam=lam) == _mmr_loop(cands, rel, vecs, k=10, lam=lam)
+    assert hybrid.mmr(ids[:4], rel, vecs, k=10) == _mmr_loop(ids[:4], rel, vecs, k=10)
+    assert hybrid.mmr([], rel, vecs) == []
+
+def test_mmr_batch_matches_per_query_loop():
+    ids, vecs, rel = _data(seed=1)
+    rng = np.random.default_rng(2)
+    cands = [list(rng.choice(ids, size=size, replace=False)) for size in (5, 40, 90)]
+    rels = [rel * (i + 1) - i * 0.1 for i in range(3)]
+    got = hybrid.mmr_batch(cands, rels, vecs, k=8, lam=0.6)
+    assert got == [_mmr_loop(c, r, vecs, k=8, lam=0.6) for c, r in zip(cands, rels)]
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.recommender import collaborative, content, persistence, pipeline
+
+def _low_rank_reviews(n_users=300, n_items=121, k=4, density=0.3, seed=0):
+    rng = np.random.default_rng(seed)
+    ratings = np.clip(np.round(3 + rng.normal(size=(n_users, k)) @ rng.normal(size=(n_items, k)).T / 2), 1, 5)
+    u, i = np.nonzero(rng.random((n_users, n_items)) < density)
+    return pd.DataFrame({'user_id': [f"u{x:04d}" for x in u], 'product_id': [f"p{x:04d}" for x in i],
+                         'rating': ratings[u, i]})
+
+def test_update_svd_factors_scores_new_items_like_a_refit():
+    reviews = _low_rank_reviews()
+    new = reviews['product_id'] == reviews['product_id'].max()
+    R0, u0, i0 = collaborative.build_user_item_matrix(reviews[~new])
+    prev = collaborative.fit_svd_factors(R0, u0, i0, n_components=4)
+
+    R, user_ids, item_ids = collaborative.build_user_item_matrix(reviews)
+    delta = collaborative.update_svd_factors(prev, R, user_ids, item_ids, set(reviews.loc[new, 'user_id']))
+    full = collaborative.fit_svd_factors(R, user_ids, item_ids, n_components=4)
+
+    row = len(item_ids) - 1
+    got = delta['user_factors'] @ delta['item_factors'][row]
+    want = full['user_factors'] @ full['item_factors'][row]
+    assert np.linalg.norm(delta['item_factors'][row]) > 0
+    assert np.corrcoef(got, want)[0, 1] > 0.9
+    assert abs(collaborative.item_scores(delta).iloc[-1] / collaborative.item_scores(full).iloc[-1] - 1) < 0.1
+
+def test_update_item_cooccurrence_matches_full_count():
+    reviews = _low_rank_reviews(density=0.1)
+    rng = np.random.default_rng(1)
+    changed = set(rng.choice(reviews['user_id'].unique(), 20, replace=False))
+    prev = collaborative.build_item_cooccurrence(reviews)
+    edited = reviews[~(reviews['user_id'].isin(changed) & (rng.random(len(reviews)) < 0.5))]
+    edited = pd.concat([edited, pd.DataFrame({'user_id': sorted(changed), 'product_id': 'p9999', 'rating': 4.0})])
+
+    delta = collaborative.update_item_cooccurrence(prev, edited, changed)
+    full = collaborative.build_item_cooccurrence(edited)
+    assert np.array_equal(delta['item_ids'], full['item_ids'])
+    assert (delta['cooc'] != full['cooc']).nnz == 0
+
+def test_incremental_build_matches_full_build(dataset, isolated_artifacts, monkeypatch):
+    products, reviews = dataset
+    monkeypatch.setattr(pipeline.preprocessing, 'load_and_prepare', lambda: (products, reviews))
+    pipeline.run_build(force=True)
+
+    # one new product, reviewed by a few existing users
+    new_products = pd.concat([products, products.iloc[[0]].rename(index={products.index[0]: 'SPNEW'})])
+    users = reviews['user_id'].drop_duplicates().iloc[:15]
+    added = reviews.iloc[:len(users)].assign(user_id=users.values, product_id='SPNEW', rating=5.0)
+    new_reviews = pd.concat([reviews, added], ignore_index=True)
+    monkeypatch.setattr(pipeline.preprocessing, 'load_and_prepare', lambda: (new_products, new_reviews))
+
+    delta = persistence.load_generation(pipeline.run_build())
+    full = persistence.load_generation(pipeline.run_build(force=True))
+    assert delta['meta']['plan']['genome'] == 'delta' and delta['meta']['plan']['collab'] == 'delta'
+
+    d, f = delta['arrays'], full['arrays']
+    assert np.array_equal(d['product_ids'], f['product_ids'])
+    assert (d['cooc']['cooc'] != f['cooc']['cooc']).nnz == 0
+    assert (d['pmi']['adj'] != f['pmi']['adj']).nnz == 0
+    row = list(d['product_ids']).index('SPNEW')
+    assert d['cf_scores'][row] != 0
+    assert np.corrcoef(d['cf_scores'], f['cf_scores'])[0, 1] > 0.9
+
+@pytest.mark.parametrize('drop_reviews', [False, True])
+def test_removal_only_build_reindexes_previous_vectors(dataset, isolated_artifacts, monkeypatch, drop_reviews):
+    products, reviews = dataset
+    monkeypatch.setattr(pipeline.preprocessing, 'load_and_prepare', lambda: (products, reviews))
+    prev = persistence.load_generation(pipeline.run_build(force=True))
+
+    gone = reviews['product_id'].value_counts().index[-1]
+    kept = products.drop(index=gone)
+    kept_reviews = reviews[reviews['product_id'] != gone] if drop_reviews else reviews
+    monkeypatch.setattr(pipeline.preprocessing, 'load_and_prepare', lambda: (kept, kept_reviews))
+    delta = persistence.load_generation(pipeline.run_build())
+
+    assert delta['meta']['plan']['genome'] == 'delta'
+    ids = list(delta['arrays']['product_ids'])
+    assert gone not in ids and len(ids) == len(products) - 1
+    rows = pd.Index(prev['arrays']['product_ids']).get_indexer(ids)
+    assert np.array_equal(delta['arrays']['vectors'], np.asarray(prev['arrays']['vectors'])[rows])
+
+    transforms = persistence.load_object('genome_transforms', prev['generation'])
+    empty = content.project_products(kept.reset_index(), kept_reviews.reset_index(), [], transforms)
+    assert empty.shape == (0, np.asarray(prev['arrays']['vectors']).shape[1])
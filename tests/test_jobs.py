@@ -0,0 +1,30 @@
+import time
+from app.jobs import BuildJobs
+
+def _wait(jobs, job):
+    for _ in range(500):
+        if jobs.get(job.id).status in ('done', 'failed'):
+            return jobs.get(job.id).to_dict()
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+def test_failing_stage_is_reported_failed():
+    def build(progress):
+        progress('load', 'running')
+        progress('load', 'done')
+        progress('genome', 'running')
+        raise ValueError("boom")
+
+    jobs = BuildJobs()
+    job = _wait(jobs, jobs.submit(build, stages=('load', 'genome', 'write')))
+    assert job['status'] == 'failed' and job['error'] == "ValueError: boom"
+    assert [job['stages'][s]['status'] for s in ('load', 'genome', 'write')] == ['done', 'failed', 'pending']
+
+def test_swap_failure_keeps_the_build_result():
+    def swap(generation):
+        raise OSError("cannot map")
+
+    jobs = BuildJobs()
+    job = _wait(jobs, jobs.submit(lambda progress: 'gen-1', stages=(), on_done=swap))
+    assert job['status'] == 'done' and job['generation'] == 'gen-1'
+    assert job['error'] is None and job['swap_error'] == "OSError: cannot map"
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+from app.recommender import matching
+
+def _products():
+    names = ['Aba Cream', 'xab', 'abay Lotion', 'Crème Brûlée Balm', '', 'aa', 'Sérum', 'ab', 'Cream Cream']
+    cats = ['skincare|face|cream', 'skincare|body', 'makeup|lips', 'skincare|face|cream', None, 'fragrance',
+            'skincare|face|serum', 'makeup', 'skincare|body']
+    return pd.DataFrame({'product_name': names, 'category': cats}, index=[f"p{i}" for i in range(len(names))])
+
+def test_name_rows_match_a_substring_scan():
+    products = _products()
+    index = matching.build_match_index(products)
+    names = products['product_name'].str.lower().tolist()
+    for p in ('', 'a', 'ab', 'aba', 'ABA', 'cream', 'am c', 'rème', 'brûl', 'é', 'bab', 'bx', 'zzz', 'cream cream'):
+        want = [r for r, n in enumerate(names) if p.lower() in n]
+        assert matching.name_rows(index, p).tolist() == want, p
+
+def test_category_codes_match_a_substring_scan():
+    products = _products()
+    index = matching.build_match_index(products)
+    cats = products['category'].fillna('').str.lower()
+    vocab = [matching.category_path(index, c) for c in range(matching.category_count(index))]
+    assert vocab == list(pd.unique(cats))
+    for p in ('face', 'Body', 'ream', 'skincare|face', 'e|b', 'makeup', 'nothing'):
+        want = [c for c, path in enumerate(vocab) if any(p.lower() in s for s in path.split('|'))] \
+            if '|' not in p else [c for c, path in enumerate(vocab) if p.lower() in path]
+        assert matching.category_codes(index, [p]).tolist() == want, p
+
+def test_match_index_is_numeric(snapshot):
+    index = snapshot.match_index
+    assert all(v.dtype != object for v in index.values())
+    assert snapshot.footprint()['parts']['match_index']['heap_bytes'] < 4096
@@ -0,0 +1,41 @@
+import numpy as np
+from app.recommender import collaborative, neighbours, persistence, serving
+from app.recommender.ann import normalize_rows
+
+def test_content_neighbours_match_brute_force():
+    rng = np.random.default_rng(0)
+    genome = normalize_rows(rng.normal(size=(700, 16))).astype(np.float32)
+    src, dst, cos = neighbours.content_neighbours(genome, top_n=10, block_mb=0.5, n_jobs=2)
+
+    sims = genome @ genome.T
+    np.fill_diagonal(sims, -np.inf)
+    want = np.argsort(-sims, axis=1, kind='stable')[:, :10]
+    assert np.array_equal(src, np.repeat(np.arange(700), 10))
+    assert np.array_equal(dst.reshape(700, 10), want)
+    assert np.allclose(cos.reshape(700, 10), np.take_along_axis(sims, want, axis=1), atol=1e-6)
+
+def _pmi_scores_from_graph(snap, pmi, q):
+    """The PMI fallback as computed from the PMI adjacency, before the neighbour table."""
+    pmi_rows = collaborative.rows_of(pmi['item_ids'], np.asarray(snap.ids, dtype=object))
+    seed_rows = serving.retrieval.seed_rows(snap.match_index, q)
+    items = pmi_rows[seed_rows]
+    items = items[items >= 0]
+    adj = pmi['adj']
+    scores = np.zeros(adj.shape[1], dtype=np.float32)
+    if len(items):
+        sub = adj[items]
+        np.maximum.at(scores, sub.indices, sub.data)
+    return np.where(pmi_rows >= 0, scores[pmi_rows], 0.0)
+
+def test_pmi_fallback_matches_pmi_graph(snapshot):
+    pmi = persistence.load_generation(snapshot.generation, arrays=('pmi',), tables=False)['arrays']['pmi']
+    names = [snapshot.name(r).split()[1] for r in range(0, len(snapshot), 97)]
+    queries = [{'explicit_favorites': [name]} for name in names] + [{'explicit_favorites': names[:3]},
+                                                                    {'explicit_favorites': [' ']}, {}]
+    nonzero = 0
+    for q in queries:
+        got = serving.pmi_scores(snapshot, q)
+        want = _pmi_scores_from_graph(snapshot, pmi, q)
+        assert got.dtype == want.dtype and np.array_equal(got, want)
+        nonzero += bool(got.any())
+    assert nonzero > 5
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+from app.recommender import quantize
+from app.recommender.ann import dot_rows, normalize_rows
+
+@pytest.mark.parametrize('kind', ['int8', 'pq'])
+def test_rescored_recall(snapshot, kind):
+    quant = quantize.build(snapshot.genome, kind)
+    report = quantize.recall_report(snapshot.genome, quant)
+    assert report['kind'] == kind and report['compression'] > 3.9
+    assert report['recall@10_rescored'] >= 0.98
+    assert report['recall@100_rescored'] >= 0.9
+    assert report['recall@100_adc'] >= 0.6
+
+def test_int8_scores_approximate_exact_cosine(monkeypatch):
+    rng = np.random.default_rng(0)
+    genome = normalize_rows(rng.normal(size=(2000, 32))).astype(np.float32)
+    Q = normalize_rows(rng.normal(size=(20, 32))).astype(np.float32)
+    quant = quantize.build(genome, 'int8')
+    assert quant['codes'].dtype == np.int8
+    assert np.abs(quantize.scores(quant, Q) - dot_rows(Q, genome)).max() < 0.05
+    widened = dot_rows(Q * quant['scales'], quant['codes'].astype(np.float32))
+    monkeypatch.setattr(quantize, 'INT8_BLOCK_BYTES', 4 * 32 * 300)   # 300-row widening blocks, a partial last one
+    assert np.allclose(quantize.scores(quant, Q), widened, atol=1e-6)
+    assert np.allclose(quantize.scores(quant, Q[:1]), widened[:1], atol=1e-6)
+    assert quantize.build(genome, 'none') is None
+    with pytest.raises(ValueError):
+        quantize.build(genome, 'fp8')
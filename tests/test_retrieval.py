@@ -0,0 +1,34 @@
+import numpy as np
+from app.models import Questionnaire
+from app.recommender import demographic, hybrid, matching, retrieval
+
+def test_select_breaks_ties_by_position():
+    rng = np.random.default_rng(0)
+    for n, pool in ((1000, 300), (301, 300), (50, 300)):
+        blended = rng.integers(0, 5, size=n).astype(np.float64)   # large tie blocks at the cut
+        want = np.argsort(-blended, kind='stable')[:pool]
+        assert np.array_equal(retrieval.select(blended, pool), want)
+
+def test_select_rows_matches_select():
+    rng = np.random.default_rng(1)
+    blended = rng.integers(0, 4, size=(16, 500)).astype(np.float32)
+    blended[3] = 0.0
+    blended[5, ::2] = -np.inf
+    got = retrieval.select_rows(blended, 120)
+    assert got.shape == (16, 120)
+    for row, top in zip(blended, got):
+        assert np.array_equal(top, retrieval.select(row, 120))
+    assert retrieval.select_rows(blended[:, :50], 120).shape == (16, 50)
+
+def test_catalog_statistics_match_exhaustive_blend(snapshot):
+    snap = snapshot
+    q = Questionnaire(avg_price_level='high', favorite_categories=[matching.category_path(snap.match_index, 0).split('|')[0]],
+                      explicit_favorites=snap.name(0).split()[:1]).dict()
+    p = retrieval.prepare(snap, q)
+    content = snap.genome @ p['unit']
+    hits = np.isin(snap.match_index['cat_codes'], p['codes'])[None, :]
+    compat = demographic.compatibility_matrix([q], snap.price_features, hits)[0]
+    weights = (0.45, 0.35, 0.20)
+    got = hybrid.blend_with_stats((content, snap.cf_item_scores, compat), p['stats'], weights)
+    want = hybrid.blend_matrix(content[None, :], snap.cf_item_scores[None, :], compat[None, :], [weights])[0]
+    assert np.allclose(got, want, atol=1e-4)
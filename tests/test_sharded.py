@@ -0,0 +1,49 @@
+import copy
+import numpy as np
+import pytest
+from multiprocessing import shared_memory
+from benchmarks.run import make_queries
+from app.models import RecommendRequest
+from app.recommender import retrieval, serving, sharded
+
+@pytest.fixture
+def shards(monkeypatch):
+    monkeypatch.setattr(sharded, 'SCORING_WORKERS', 2)
+    monkeypatch.setattr(sharded, 'SCORING_SHARDS', 3)
+    yield
+    sharded.shutdown()
+
+def _alive(name) -> bool:
+    try:
+        shared_memory.SharedMemory(name=name).close()
+    except FileNotFoundError:
+        return False
+    return True
+
+def test_sharded_matches_two_stage_over_all_rows(snapshot, dataset, shards, monkeypatch):
+    # pure compatibility weights: large tie blocks at the pool cut
+    reqs = [RecommendRequest(**q, weights=[0.45, 0.35, 0.2] if i % 2 else [0, 0, 1])
+            for i, q in enumerate(make_queries(dataset[0], 30, seed=1))]
+    got = serving._score_sharded(snapshot, reqs)
+    monkeypatch.setattr(retrieval, 'candidates', lambda snap, *args: np.arange(len(snap)))
+    want = [serving._score_two_stage(snapshot, r) for r in reqs]
+    for g, w in zip(got, want):
+        assert [it['product_id'] for it in g] == [it['product_id'] for it in w]
+        assert np.allclose([it['score'] for it in g], [it['score'] for it in w], rtol=0, atol=1e-5)
+
+def test_segments_outlive_a_swap_until_released(snapshot, shards):
+    old = sharded._current_store(snapshot)
+    names = [spec['segment'] for spec in old.specs]
+    assert len(names) == 3
+
+    newer = copy.copy(snapshot)
+    newer.generation = 'newer'
+    new = sharded._current_store(newer)   # retires the old store, still in use here
+    assert all(_alive(n) for n in names)
+    old.release()
+    assert not any(_alive(n) for n in names)
+
+    new.release()
+    assert all(_alive(spec['segment']) for spec in new.specs)   # current store stays until shutdown
+    sharded.shutdown()
+    assert not any(_alive(spec['segment']) for spec in new.specs)
@@ -0,0 +1,14 @@
+import numpy as np
+import pytest
+from app.recommender import persistence
+from app.recommender.snapshot import Snapshot, FOOTPRINT_ATTRS
+
+def test_footprint_covers_serving_attributes(snapshot):
+    fp = snapshot.footprint()
+    assert tuple(fp['parts']) == FOOTPRINT_ATTRS
+    assert fp['heap_bytes'] + fp['mapped_bytes'] >= snapshot.genome.nbytes
+
+def test_generation_without_neighbour_table_needs_a_rebuild(isolated_artifacts):
+    gen = persistence.write_generation({'match': {'ids': np.array(['p1', 'p2'], dtype=object)}, 'cf_scores': None})
+    with pytest.raises(ValueError, match="neighbours"):
+        Snapshot.load(gen)